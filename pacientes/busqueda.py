@@ -0,0 +1,134 @@
+"""
+Búsqueda de pacientes por prefijo sobre términos normalizados (minúsculas, sin tildes)
+"""
+
+import re
+import unicodedata
+
+from django.conf import settings
+from pymongo import UpdateOne
+
+from .models import Paciente
+
+# Términos de la consulta que se tienen en cuenta
+MAX_TERMINOS_CONSULTA = 5
+
+
+def normalizar_texto(texto):
+    """
+    Minúsculas y sin tildes ni diacríticos ('Muñoz Ángel' -> 'munoz angel')
+    """
+    descompuesto = unicodedata.normalize('NFKD', texto or '')
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c)).lower()
+
+
+def tokenizar(texto):
+    """
+    Palabras alfanuméricas del texto normalizado
+    """
+    return re.findall(r'[0-9a-z]+', normalizar_texto(texto))
+
+
+def terminos_busqueda(nombre, apellido, identificacion):
+    """
+    Términos indexados de un paciente
+
+    Cada palabra del nombre, del apellido y de la identificación, más la
+    identificación compacta (sin puntos, guiones ni espacios), para que
+    '1234' encuentre '1.234.567'.
+
+    Returns:
+        list: Términos únicos ordenados
+    """
+    terminos = set(tokenizar(nombre)) | set(tokenizar(apellido))
+    partes = tokenizar(identificacion)
+    terminos.update(partes)
+    if partes:
+        terminos.add(''.join(partes))
+    return sorted(terminos)
+
+
+def consulta_busqueda(q, con_valoraciones=False):
+    """
+    QuerySet de los pacientes cuyos términos empiezan por cada palabra de `q`
+
+    Cada palabra es un prefijo anclado (`^...`) sobre `terminos_busqueda`, que
+    MongoDB resuelve como un rango del índice multiclave; con varias palabras
+    el planificador recorre el rango de una de ellas (la más larga va primero)
+    y filtra el resto sobre los pocos documentos encontrados.
+
+    Args:
+        q (str): Texto escrito por el usuario
+        con_valoraciones (bool): Solo pacientes con al menos una valoración
+
+    Returns:
+        QuerySet | None: None si la consulta no tiene términos
+    """
+    terminos = sorted(set(tokenizar(q)), key=len, reverse=True)[:MAX_TERMINOS_CONSULTA]
+    if not terminos:
+        return None
+
+    filtro = {'$and': [{'terminos_busqueda': re.compile('^' + re.escape(termino))} for termino in terminos]}
+    if con_valoraciones:
+        filtro['resumen.total_valoraciones'] = {'$gt': 0}
+    return Paciente.objects(__raw__=filtro)
+
+
+def buscar_pacientes(q, limite=None, con_valoraciones=False):
+    """
+    Pacientes para los selectores con búsqueda incremental
+
+    Args:
+        q (str): Texto escrito por el usuario
+        limite (int): Máximo de resultados (por defecto PACIENTES_SEARCH_LIMIT)
+        con_valoraciones (bool): Solo pacientes con al menos una valoración
+
+    Returns:
+        list: Diccionarios con id, nombre, apellido, identificación y total de valoraciones, por nombre
+    """
+    queryset = consulta_busqueda(q, con_valoraciones)
+    if queryset is None:
+        return []
+
+    documentos = queryset.only(
+        'id', 'nombre', 'apellido', 'identificacion', 'resumen__total_valoraciones'
+    ).limit(limite or settings.PACIENTES_SEARCH_LIMIT).as_pymongo()
+
+    resultados = [
+        {
+            'id': str(documento['_id']),
+            'nombre': documento.get('nombre'),
+            'apellido': documento.get('apellido'),
+            'identificacion': documento.get('identificacion'),
+            'total_valoraciones': (documento.get('resumen') or {}).get('total_valoraciones', 0),
+        }
+        for documento in documentos
+    ]
+    # El índice devuelve los resultados por término; se muestran por nombre
+    return sorted(resultados, key=lambda p: (normalizar_texto(p['nombre']), normalizar_texto(p['apellido']), p['id']))
+
+
+def reconstruir_terminos(batch_size=1000):
+    """
+    Recalcula `terminos_busqueda` de todos los pacientes (pacientes creados antes de la búsqueda)
+
+    Returns:
+        int: Pacientes actualizados
+    """
+    coleccion = Paciente._get_collection()
+    cursor = coleccion.find({}, {'nombre': 1, 'apellido': 1, 'identificacion': 1}).batch_size(batch_size)
+
+    actualizados = 0
+    lote = []
+    for documento in cursor:
+        lote.append(UpdateOne({'_id': documento['_id']}, {'$set': {'terminos_busqueda': terminos_busqueda(
+            documento.get('nombre'), documento.get('apellido'), documento.get('identificacion')
+        )}}))
+        if len(lote) >= batch_size:
+            coleccion.bulk_write(lote, ordered=False)
+            actualizados += len(lote)
+            lote = []
+    if lote:
+        coleccion.bulk_write(lote, ordered=False)
+        actualizados += len(lote)
+    return actualizados
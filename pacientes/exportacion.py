@@ -0,0 +1,53 @@
+"""
+Exportación de pacientes con el resumen de sus valoraciones
+"""
+
+from django.conf import settings
+
+from .models import Paciente
+from psybot.utils.mongo import analytics_collection
+
+PACIENTE_EXPORT_FIELDS = [
+    'id', 'identificacion', 'nombre', 'apellido', 'fecha_nacimiento', 'fecha_creacion',
+    'total_valoraciones', 'ultimo_puntaje', 'nivel_severidad', 'ultima_valoracion',
+]
+
+
+def iter_paciente_rows(date_from=None, date_to=None, batch_size=None):
+    """
+    Recorre los pacientes con un cursor de pymongo en lotes de `batch_size`,
+    leídos por la conexión de analítica
+
+    Args:
+        date_from, date_to: Rango opcional de fecha_creacion (inclusive)
+
+    Yields:
+        dict: Una fila por paciente (columnas de PACIENTE_EXPORT_FIELDS)
+    """
+    query = {}
+    if date_from or date_to:
+        query['fecha_creacion'] = {}
+        if date_from:
+            query['fecha_creacion']['$gte'] = date_from
+        if date_to:
+            query['fecha_creacion']['$lte'] = date_to
+
+    cursor = analytics_collection(Paciente).find(query).sort(
+        [('fecha_creacion', 1), ('_id', 1)]
+    ).batch_size(batch_size or settings.EXPORT_BATCH_SIZE)
+
+    for document in cursor:
+        resumen = document.get('resumen') or {}
+        fecha_nacimiento = document.get('fecha_nacimiento')
+        yield {
+            'id': str(document['_id']),
+            'identificacion': document.get('identificacion'),
+            'nombre': document.get('nombre'),
+            'apellido': document.get('apellido'),
+            'fecha_nacimiento': fecha_nacimiento.date() if fecha_nacimiento else None,
+            'fecha_creacion': document.get('fecha_creacion'),
+            'total_valoraciones': resumen.get('total_valoraciones', 0),
+            'ultimo_puntaje': resumen.get('ultimo_puntaje'),
+            'nivel_severidad': resumen.get('nivel_severidad'),
+            'ultima_valoracion': resumen.get('ultima_valoracion'),
+        }
@@ -0,0 +1,25 @@
+"""
+Consultas frecuentes de pacientes verificadas por `manage.py check_query_plans`
+"""
+
+from psybot.utils.query_plans import register_hot_query
+from .busqueda import consulta_busqueda
+from .models import Paciente
+
+
+@register_hot_query('pacientes.listado')
+def listado():
+    # Página de pacientes y GET /api/pacientes/
+    return Paciente.objects.order_by('-fecha_creacion', '-id').limit(50)
+
+
+@register_hot_query('pacientes.busqueda')
+def busqueda():
+    # GET /api/pacientes/search/ y selectores de paciente (prefijo sobre terminos_busqueda)
+    return consulta_busqueda('mar gonz').limit(10)
+
+
+@register_hot_query('pacientes.busqueda_con_valoraciones')
+def busqueda_con_valoraciones():
+    # Selectores de la página de análisis
+    return consulta_busqueda('mar', con_valoraciones=True).limit(10)
@@ -0,0 +1,238 @@
+"""
+Importación masiva de pacientes desde archivos CSV o NDJSON
+"""
+
+import csv
+import io
+import json
+import logging
+import uuid
+
+from django.conf import settings
+from django.utils.dateparse import parse_date
+from mongoengine import ValidationError
+from pymongo.errors import BulkWriteError
+
+from .models import Paciente
+
+logger = logging.getLogger(__name__)
+
+FORMATOS = ('csv', 'ndjson')
+CAMPOS = ('nombre', 'apellido', 'identificacion', 'fecha_nacimiento')
+DUPLICATE_KEY_ERROR = 11000
+
+
+def detectar_formato(nombre_archivo):
+    """
+    Formato del archivo según su extensión (.csv, .ndjson o .jsonl)
+
+    Returns:
+        str | None: 'csv', 'ndjson' o None si no se reconoce
+    """
+    nombre = (nombre_archivo or '').lower()
+    if nombre.endswith('.csv'):
+        return 'csv'
+    if nombre.endswith(('.ndjson', '.jsonl')):
+        return 'ndjson'
+    return None
+
+
+def leer_filas(archivo, formato):
+    """
+    Recorre las filas del archivo de forma perezosa, sin cargarlo completo en memoria
+
+    Args:
+        archivo: Archivo binario (subida de Django o archivo abierto en modo 'rb')
+        formato (str): 'csv' (con encabezados) o 'ndjson'
+
+    Yields:
+        tuple: (número de línea, fila como dict o None, mensaje de error o None)
+    """
+    texto = io.TextIOWrapper(archivo, encoding='utf-8-sig', newline='')
+    try:
+        if formato == 'csv':
+            reader = csv.DictReader(texto)
+            for fila in reader:
+                yield reader.line_num, fila, None
+        else:
+            for numero, linea in enumerate(texto, start=1):
+                linea = linea.strip()
+                if not linea:
+                    continue
+                try:
+                    fila = json.loads(linea)
+                except ValueError:
+                    yield numero, None, 'JSON inválido'
+                    continue
+                if not isinstance(fila, dict):
+                    yield numero, None, 'Cada línea debe ser un objeto JSON'
+                    continue
+                yield numero, fila, None
+    finally:
+        # No cerrar el archivo subyacente: lo cierra quien lo abrió
+        texto.detach()
+
+
+def cargar_identificaciones():
+    """
+    Identificaciones ya registradas, leídas con una proyección sobre el índice único
+
+    Returns:
+        set: Identificaciones existentes
+    """
+    cursor = Paciente._get_collection().find({}, {'identificacion': 1, '_id': 0}).batch_size(10000)
+    return {documento['identificacion'] for documento in cursor if 'identificacion' in documento}
+
+
+def _construir_paciente(fila):
+    """
+    Valida una fila y la convierte en el documento a insertar
+
+    Returns:
+        tuple: (documento para MongoDB o None, errores por campo)
+    """
+    valores = {campo: fila.get(campo) for campo in CAMPOS}
+    for campo in CAMPOS:
+        if isinstance(valores[campo], str):
+            valores[campo] = valores[campo].strip()
+
+    errores = {campo: ['Este campo es requerido'] for campo in CAMPOS if not valores[campo]}
+    if errores:
+        return None, errores
+
+    try:
+        fecha_nacimiento = parse_date(valores['fecha_nacimiento']) if isinstance(valores['fecha_nacimiento'], str) else None
+    except ValueError:
+        fecha_nacimiento = None
+    if fecha_nacimiento is None:
+        return None, {'fecha_nacimiento': ['Debe ser una fecha AAAA-MM-DD']}
+    valores['fecha_nacimiento'] = fecha_nacimiento
+
+    paciente = Paciente(id=uuid.uuid4(), **valores)
+    try:
+        paciente.validate()
+    except ValidationError as e:
+        return None, {campo: [str(error)] for campo, error in (e.errors or {}).items()} or {'non_field_errors': [str(e)]}
+    return paciente.to_mongo().to_dict(), {}
+
+
+class ResultadoImportacion:
+    """
+    Totales de una importación y una muestra acotada de los errores
+    """
+
+    def __init__(self, max_errores):
+        self.procesadas = 0
+        self.insertadas = 0
+        self.duplicadas = 0
+        self.invalidas = 0
+        self.errores = []
+        self.max_errores = max_errores
+
+    def agregar_error(self, linea, errores, identificacion=None):
+        if len(self.errores) < self.max_errores:
+            self.errores.append({'linea': linea, 'identificacion': identificacion, 'errores': errores})
+
+    def to_dict(self):
+        return {
+            'procesadas': self.procesadas,
+            'insertadas': self.insertadas,
+            'duplicadas': self.duplicadas,
+            'invalidas': self.invalidas,
+            'errores': self.errores,
+        }
+
+
+def _escribir_lote(lote, resultado):
+    """
+    Inserta un lote sin orden; las claves duplicadas (pacientes creados mientras
+    tanto por otra vía) se cuentan como duplicadas
+
+    Returns:
+        list: Documentos efectivamente insertados
+    """
+    documentos = [documento for _, documento in lote]
+    fallidos = set()
+    try:
+        Paciente._get_collection().insert_many(documentos, ordered=False)
+    except BulkWriteError as e:
+        for error in e.details.get('writeErrors', []):
+            fallidos.add(error['index'])
+            linea, documento = lote[error['index']]
+            if error.get('code') == DUPLICATE_KEY_ERROR:
+                resultado.duplicadas += 1
+                resultado.agregar_error(linea, {'identificacion': ['Ya existe un paciente con esta identificación']},
+                                        documento['identificacion'])
+            else:
+                resultado.invalidas += 1
+                resultado.agregar_error(linea, {'non_field_errors': [error.get('errmsg', 'Error de escritura')]},
+                                        documento['identificacion'])
+
+    insertados = [documento for posicion, documento in enumerate(documentos) if posicion not in fallidos]
+    resultado.insertadas += len(insertados)
+    return insertados
+
+
+def importar_pacientes(archivo, formato, batch_size=None, max_errores=None):
+    """
+    Importa pacientes desde un archivo recorriéndolo por lotes
+
+    Las identificaciones duplicadas (contra la base o dentro del mismo archivo)
+    se descartan antes de escribir usando un conjunto cargado con una
+    proyección de la colección. Cada lote se escribe con un `insert_many` no
+    ordenado, así que la memoria usada depende del tamaño del lote y no del
+    archivo.
+
+    Args:
+        archivo: Archivo binario CSV o NDJSON
+        formato (str): 'csv' o 'ndjson'
+        batch_size (int): Pacientes por escritura (por defecto PACIENTES_IMPORT_BATCH_SIZE)
+        max_errores (int): Errores a incluir en el resumen (por defecto PACIENTES_IMPORT_MAX_ERRORS)
+
+    Returns:
+        dict: Filas procesadas, insertadas, duplicadas, inválidas y una muestra de errores
+    """
+    from valoraciones.rollups import record_new_patients
+
+    batch_size = batch_size or settings.PACIENTES_IMPORT_BATCH_SIZE
+    resultado = ResultadoImportacion(max_errores or settings.PACIENTES_IMPORT_MAX_ERRORS)
+    identificaciones = cargar_identificaciones()
+
+    def escribir(lote):
+        insertados = _escribir_lote(lote, resultado)
+        record_new_patients(documento['fecha_creacion'] for documento in insertados)
+
+    lote = []
+    for linea, fila, error in leer_filas(archivo, formato):
+        resultado.procesadas += 1
+        if error:
+            resultado.invalidas += 1
+            resultado.agregar_error(linea, {'non_field_errors': [error]})
+            continue
+
+        documento, errores = _construir_paciente(fila)
+        if errores:
+            resultado.invalidas += 1
+            resultado.agregar_error(linea, errores, fila.get('identificacion'))
+            continue
+
+        if documento['identificacion'] in identificaciones:
+            resultado.duplicadas += 1
+            resultado.agregar_error(linea, {'identificacion': ['Ya existe un paciente con esta identificación']},
+                                    documento['identificacion'])
+            continue
+        identificaciones.add(documento['identificacion'])
+
+        lote.append((linea, documento))
+        if len(lote) >= batch_size:
+            escribir(lote)
+            lote = []
+
+    if lote:
+        escribir(lote)
+
+    logger.info(
+        f"Importación de pacientes: {resultado.insertadas} insertados, "
+        f"{resultado.duplicadas} duplicados, {resultado.invalidas} inválidos"
+    )
+    return resultado.to_dict()
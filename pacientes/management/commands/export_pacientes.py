@@ -0,0 +1,40 @@
+"""
+Comando para exportar los pacientes con el resumen de sus valoraciones
+"""
+
+import sys
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from pacientes.exportacion import PACIENTE_EXPORT_FIELDS, iter_paciente_rows
+from psybot.utils.export import EXPORT_FORMATS, encode_export
+
+
+class Command(BaseCommand):
+    help = 'Exporta los pacientes en NDJSON o CSV, en streaming'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', '-o', help='Archivo de salida (por defecto la salida estándar)')
+        parser.add_argument('--format', choices=EXPORT_FORMATS, default='ndjson', help='Formato de salida')
+        parser.add_argument('--gzip', action='store_true', help='Comprimir la salida con gzip')
+        parser.add_argument('--date-from', type=datetime.fromisoformat, help='Fecha de registro mínima (ISO 8601)')
+        parser.add_argument('--date-to', type=datetime.fromisoformat, help='Fecha de registro máxima (ISO 8601)')
+
+    def handle(self, *args, **options):
+        rows = iter_paciente_rows(date_from=options['date_from'], date_to=options['date_to'])
+        chunks = encode_export(rows, options['format'], PACIENTE_EXPORT_FIELDS, compress=options['gzip'])
+
+        if not options['output']:
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
+            return
+
+        try:
+            with open(options['output'], 'wb') as output:
+                for chunk in chunks:
+                    output.write(chunk)
+        except OSError as e:
+            raise CommandError(f'No se pudo escribir el archivo: {e}')
+        self.stdout.write(self.style.SUCCESS(f"Pacientes exportados en {options['output']}"))
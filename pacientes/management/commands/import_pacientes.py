@@ -0,0 +1,56 @@
+"""
+Comando para importar pacientes desde un archivo CSV o NDJSON
+"""
+
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from pacientes.importacion import FORMATOS, detectar_formato, importar_pacientes
+
+
+class Command(BaseCommand):
+    help = 'Importa pacientes desde un archivo CSV (con encabezados) o NDJSON, descartando duplicados'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta del archivo a importar')
+        parser.add_argument(
+            '--format', choices=FORMATOS,
+            help='Formato del archivo (por defecto según la extensión)'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=settings.PACIENTES_IMPORT_BATCH_SIZE,
+            help='Pacientes por escritura en MongoDB'
+        )
+        parser.add_argument(
+            '--json', action='store_true',
+            help='Imprimir el resumen en formato JSON'
+        )
+
+    def handle(self, *args, **options):
+        formato = options['format'] or detectar_formato(options['archivo'])
+        if not formato:
+            raise CommandError('No se reconoce el formato del archivo; use --format csv|ndjson')
+
+        try:
+            with open(options['archivo'], 'rb') as archivo:
+                resultado = importar_pacientes(archivo, formato, batch_size=options['batch_size'])
+        except OSError as e:
+            raise CommandError(f'No se pudo leer el archivo: {e}')
+
+        if options['json']:
+            self.stdout.write(json.dumps(resultado, indent=2, ensure_ascii=False))
+            return
+
+        self.stdout.write(f"Filas procesadas: {resultado['procesadas']}")
+        self.stdout.write(f"  Insertadas: {resultado['insertadas']}")
+        self.stdout.write(f"  Duplicadas: {resultado['duplicadas']}")
+        self.stdout.write(f"  Inválidas:  {resultado['invalidas']}")
+        for error in resultado['errores']:
+            self.stdout.write(self.style.WARNING(f"  Línea {error['linea']}: {error['errores']}"))
+
+        if resultado['insertadas']:
+            self.stdout.write(self.style.SUCCESS('Importación completada'))
+        else:
+            self.stdout.write(self.style.WARNING('No se importó ningún paciente'))
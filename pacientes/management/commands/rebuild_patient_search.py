@@ -0,0 +1,18 @@
+"""
+Comando para recalcular los términos de búsqueda de los pacientes
+"""
+
+from django.core.management.base import BaseCommand
+
+from pacientes.busqueda import reconstruir_terminos
+
+
+class Command(BaseCommand):
+    help = 'Recalcula terminos_busqueda (nombre, apellido e identificación normalizados) de todos los pacientes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Pacientes por escritura')
+
+    def handle(self, *args, **options):
+        total = reconstruir_terminos(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Términos de búsqueda recalculados: {total} pacientes'))
@@ -1,6 +1,25 @@
-from mongoengine import Document, StringField, DateField, DateTimeField, UUIDField
+from mongoengine import (
+    Document, EmbeddedDocument, EmbeddedDocumentField, StringField, DateField, DateTimeField, IntField, UUIDField,
+    ListField
+)
 import uuid
 from datetime import datetime
+from psybot.utils.identity_map import remember_document, forget_document
+
+class ResumenValoraciones(EmbeddedDocument):
+    """
+    Resumen de las valoraciones PHQ-9 del paciente, actualizado en cada escritura
+    """
+    total_valoraciones = IntField(default=0)
+    ultimo_puntaje = IntField()
+    puntaje_anterior = IntField()
+    nivel_severidad = StringField()
+    puntaje_minimo = IntField()
+    puntaje_maximo = IntField()
+    primera_valoracion = DateTimeField()
+    ultima_valoracion = DateTimeField()
+    ultima_valoracion_id = UUIDField()
+
 
 class Paciente(Document):
     id = UUIDField(primary_key=True, default=uuid.uuid4)
@@ -9,11 +28,43 @@ class Paciente(Document):
     identificacion = StringField(required=True, unique=True, max_length=20)
     fecha_nacimiento = DateField(required=True)
     fecha_creacion = DateTimeField(default=datetime.now)
+    resumen = EmbeddedDocumentField(ResumenValoraciones)
+    # Nombre, apellido e identificación normalizados para la búsqueda por prefijo (ver pacientes.busqueda)
+    terminos_busqueda = ListField(StringField())
 
     meta = {
-        'indexes': ['identificacion'],
+        'indexes': [
+            'identificacion',
+            # Listado por fecha de registro (página de pacientes y paginación por cursor)
+            {'fields': ['-fecha_creacion', '-id']},
+            # Selectores con búsqueda incremental (índice multiclave, prefijos anclados)
+            'terminos_busqueda',
+        ],
         'collection': 'pacientes'
     }
 
+    def clean(self):
+        # Mantener los términos de búsqueda (también en la importación, que valida antes de insertar)
+        from .busqueda import terminos_busqueda
+        self.terminos_busqueda = terminos_busqueda(self.nombre, self.apellido, self.identificacion)
+
+    def save(self, *args, **kwargs):
+        created = self._created
+        result = super().save(*args, **kwargs)
+        remember_document(self)
+        
+        # Contar el paciente nuevo en el rollup diario del dashboard
+        if created:
+            from valoraciones.rollups import record_new_patient
+            record_new_patient(self.fecha_creacion)
+        return result
+
+    def delete(self, *args, **kwargs):
+        super().delete(*args, **kwargs)
+        forget_document(Paciente, self.id)
+        
+        from valoraciones.rollups import record_new_patient
+        record_new_patient(self.fecha_creacion, sign=-1)
+
     def __str__(self):
         return f"{self.nombre} {self.apellido} - {self.identificacion}"
\ No newline at end of file
@@ -1,8 +1,58 @@
 from rest_framework_mongoengine.serializers import DocumentSerializer
+from rest_framework import serializers
+from django.conf import settings
 from .models import Paciente
 
 class PacienteSerializer(DocumentSerializer):
     class Meta:
         model = Paciente
-        fields = ['id', 'nombre', 'apellido', 'identificacion', 'fecha_nacimiento', 'fecha_creacion']
-        read_only_fields = ['id', 'fecha_creacion']
\ No newline at end of file
+        fields = ['id', 'nombre', 'apellido', 'identificacion', 'fecha_nacimiento', 'fecha_creacion', 'resumen']
+        read_only_fields = ['id', 'fecha_creacion', 'resumen']
+
+
+class PacienteListFilterSerializer(serializers.Serializer):
+    """
+    Serializer para los filtros del listado de pacientes
+    """
+    date_from = serializers.DateTimeField(required=False, help_text="Fecha de registro mínima (inclusive)")
+    date_to = serializers.DateTimeField(required=False, help_text="Fecha de registro máxima (inclusive)")
+
+
+class PacienteSearchSerializer(serializers.Serializer):
+    """
+    Serializer para los parámetros de la búsqueda de pacientes
+    """
+    q = serializers.CharField(
+        max_length=100, help_text="Prefijo del nombre, apellido o identificación (sin distinguir mayúsculas ni tildes)"
+    )
+    limit = serializers.IntegerField(
+        required=False, min_value=1, max_value=settings.PACIENTES_SEARCH_MAX_LIMIT,
+        help_text="Máximo de resultados"
+    )
+    con_valoraciones = serializers.BooleanField(
+        required=False, default=False, help_text="Solo pacientes con al menos una valoración"
+    )
+
+
+class ImportPacientesSerializer(serializers.Serializer):
+    """
+    Serializer para la importación masiva de pacientes
+    """
+    file = serializers.FileField(help_text="Archivo CSV (nombre, apellido, identificacion, fecha_nacimiento) o NDJSON")
+    format = serializers.ChoiceField(
+        choices=['csv', 'ndjson'], required=False,
+        help_text="Formato del archivo (por defecto según la extensión)"
+    )
+
+
+class PacienteExportSerializer(serializers.Serializer):
+    """
+    Serializer para los parámetros de la exportación de pacientes
+    """
+    output = serializers.ChoiceField(
+        choices=['ndjson', 'csv'], required=False, default='ndjson',
+        help_text="Formato del archivo exportado"
+    )
+    compress = serializers.BooleanField(required=False, default=False, help_text="Comprimir la descarga con gzip")
+    date_from = serializers.DateTimeField(required=False, help_text="Fecha de registro mínima (inclusive)")
+    date_to = serializers.DateTimeField(required=False, help_text="Fecha de registro máxima (inclusive)")
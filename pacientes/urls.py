@@ -1,7 +1,16 @@
 from rest_framework.routers import DefaultRouter
-from .views import PacienteViewSet
+from django.urls import path, re_path
+from .views import PacienteViewSet, search_pacientes, import_pacientes, export_pacientes
 
 router = DefaultRouter()
 router.register(r'pacientes', PacienteViewSet, basename='paciente')
 
-urlpatterns = router.urls
\ No newline at end of file
+# Rutas específicas primero (antes del router)
+urlpatterns = [
+    # Barra final opcional: la búsqueda incremental no debe pasar por una redirección
+    re_path(r'^pacientes/search/?$', search_pacientes, name='search_pacientes'),
+    path('pacientes/import/', import_pacientes, name='import_pacientes'),
+    path('pacientes/export/', export_pacientes, name='export_pacientes'),
+]
+
+urlpatterns += router.urls
\ No newline at end of file
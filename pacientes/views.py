@@ -1,9 +1,146 @@
 from rest_framework_mongoengine.viewsets import ModelViewSet
+from rest_framework.decorators import api_view, parser_classes
+from rest_framework.parsers import MultiPartParser
+from rest_framework.response import Response
+from rest_framework import status
+from drf_spectacular.utils import extend_schema, extend_schema_view
+from psybot.lean import LeanListMixin
+from psybot.pagination import KeysetPagination
+from psybot.utils.export import export_response
+from .busqueda import buscar_pacientes
+from .exportacion import PACIENTE_EXPORT_FIELDS, iter_paciente_rows
+from .importacion import FORMATOS, detectar_formato, importar_pacientes
 from .models import Paciente
-from .serializers import PacienteSerializer
+from .serializers import (
+    PacienteSerializer, PacienteListFilterSerializer, PacienteSearchSerializer, ImportPacientesSerializer,
+    PacienteExportSerializer
+)
 
-class PacienteViewSet(ModelViewSet):
+@extend_schema_view(list=extend_schema(parameters=[PacienteListFilterSerializer]))
+class PacienteViewSet(LeanListMixin, ModelViewSet):
     serializer_class = PacienteSerializer
+    pagination_class = KeysetPagination
+    keyset_field = 'fecha_creacion'
     
     def get_queryset(self):
-        return Paciente.objects.all()
\ No newline at end of file
+        queryset = Paciente.objects.all()
+        if self.action != 'list':
+            return queryset
+        
+        # Filtros del listado (resueltos con el índice de fecha_creacion)
+        filters = PacienteListFilterSerializer(data=self.request.query_params)
+        filters.is_valid(raise_exception=True)
+        if 'date_from' in filters.validated_data:
+            queryset = queryset.filter(fecha_creacion__gte=filters.validated_data['date_from'])
+        if 'date_to' in filters.validated_data:
+            queryset = queryset.filter(fecha_creacion__lte=filters.validated_data['date_to'])
+        return queryset
+
+
+@extend_schema(
+    parameters=[PacienteSearchSerializer],
+    responses={
+        200: {
+            'type': 'object',
+            'properties': {
+                'results': {
+                    'type': 'array',
+                    'items': {
+                        'type': 'object',
+                        'properties': {
+                            'id': {'type': 'string'},
+                            'nombre': {'type': 'string'},
+                            'apellido': {'type': 'string'},
+                            'identificacion': {'type': 'string'},
+                            'total_valoraciones': {'type': 'integer'}
+                        }
+                    }
+                }
+            }
+        }
+    },
+    description="Busca pacientes cuyo nombre, apellido o identificación empiezan por cada palabra de q, "
+                "sin distinguir mayúsculas ni tildes (para selectores con búsqueda incremental)"
+)
+@api_view(['GET'])
+def search_pacientes(request):
+    """
+    Búsqueda de pacientes por prefijo sobre el índice de términos normalizados
+    """
+    serializer = PacienteSearchSerializer(data=request.query_params)
+    if not serializer.is_valid():
+        return Response({
+            'status': 'error',
+            'message': 'Parámetros inválidos',
+            'errors': serializer.errors
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    params = serializer.validated_data
+    return Response({
+        'results': buscar_pacientes(params['q'], params.get('limit'), params['con_valoraciones'])
+    }, status=status.HTTP_200_OK)
+
+
+@extend_schema(
+    request={'multipart/form-data': ImportPacientesSerializer},
+    responses={
+        200: {
+            'type': 'object',
+            'properties': {
+                'procesadas': {'type': 'integer'},
+                'insertadas': {'type': 'integer'},
+                'duplicadas': {'type': 'integer'},
+                'invalidas': {'type': 'integer'},
+                'errores': {'type': 'array', 'items': {'type': 'object'}}
+            }
+        }
+    },
+    description="Importa pacientes desde un archivo CSV (con encabezados) o NDJSON. El archivo se procesa "
+                "por lotes y las identificaciones duplicadas se descartan antes de escribir"
+)
+@api_view(['POST'])
+@parser_classes([MultiPartParser])
+def import_pacientes(request):
+    """
+    Importación masiva de pacientes desde un archivo subido
+    """
+    serializer = ImportPacientesSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response({
+            'status': 'error',
+            'message': 'Parámetros inválidos',
+            'errors': serializer.errors
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    archivo = serializer.validated_data['file']
+    formato = serializer.validated_data.get('format') or detectar_formato(archivo.name)
+    if formato not in FORMATOS:
+        return Response({
+            'status': 'error',
+            'message': 'No se reconoce el formato del archivo; indique format=csv|ndjson'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    return Response(importar_pacientes(archivo, formato), status=status.HTTP_200_OK)
+
+
+@extend_schema(
+    parameters=[PacienteExportSerializer],
+    responses={200: {'type': 'string', 'format': 'binary', 'description': 'Archivo NDJSON o CSV (gzip opcional)'}},
+    description="Exporta en streaming los pacientes con el resumen de sus valoraciones"
+)
+@api_view(['GET'])
+def export_pacientes(request):
+    """
+    Exportación de pacientes (NDJSON o CSV)
+    """
+    serializer = PacienteExportSerializer(data=request.query_params)
+    if not serializer.is_valid():
+        return Response({
+            'status': 'error',
+            'message': 'Parámetros inválidos',
+            'errors': serializer.errors
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    params = serializer.validated_data
+    rows = iter_paciente_rows(date_from=params.get('date_from'), date_to=params.get('date_to'))
+    return export_response(rows, params['output'], PACIENTE_EXPORT_FIELDS, 'pacientes', compress=params['compress'])
@@ -0,0 +1,135 @@
+"""
+Lectura liviana para los listados: documentos crudos de pymongo convertidos sin instanciar mongoengine
+"""
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework import fields as drf_fields
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from psybot.utils.mongo import with_max_time
+
+
+def _nullable(convert):
+    def converter(value):
+        return None if value is None else convert(value)
+    return converter
+
+
+def _datetime_converter(field):
+    """
+    Igual que DateTimeField.to_representation de DRF; con USE_TZ en UTC y formato
+    ISO 8601 (la configuración del proyecto) se evita el ajuste de zona por valor
+    """
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    if (settings.USE_TZ and settings.TIME_ZONE == 'UTC' and
+            isinstance(output_format, str) and output_format.lower() == drf_fields.ISO_8601):
+        def converter(value):
+            if value.tzinfo is None:
+                return value.isoformat() + 'Z'
+            return field.to_representation(value)
+        return _nullable(converter)
+    return _nullable(field.to_representation)
+
+
+def _date_converter(field):
+    # MongoDB guarda las fechas como datetime a medianoche
+    def converter(value):
+        return field.to_representation(value.date() if hasattr(value, 'date') else value)
+    return _nullable(converter)
+
+
+def _field_converter(field, document_field):
+    """
+    Convertidor de un valor crudo de MongoDB a la representación del campo del serializer
+
+    Raises:
+        ImproperlyConfigured: Si el tipo de campo no tiene conversión liviana
+    """
+    if isinstance(field, drf_fields.UUIDField):
+        return _nullable(str) if field.uuid_format == 'hex_verbose' else _nullable(field.to_representation)
+    if isinstance(field, drf_fields.DateTimeField):
+        return _datetime_converter(field)
+    if isinstance(field, drf_fields.DateField):
+        return _date_converter(field)
+    if isinstance(field, drf_fields.IntegerField):
+        return _nullable(int)
+    if isinstance(field, drf_fields.FloatField):
+        return _nullable(float)
+    if isinstance(field, drf_fields.BooleanField):
+        return _nullable(bool)
+    if isinstance(field, drf_fields.CharField):
+        return _nullable(str)
+    if isinstance(field, drf_fields.ListField):
+        child = _field_converter(field.child, getattr(document_field, 'field', None))
+        return _nullable(lambda values: [child(value) for value in values])
+    if hasattr(field, 'fields') and document_field is not None and hasattr(document_field, 'document_type'):
+        return _nullable(LeanConverter(field, document_field.document_type))
+    raise ImproperlyConfigured(
+        f"El campo '{field.field_name}' ({type(field).__name__}) no tiene conversión liviana"
+    )
+
+
+class LeanConverter:
+    """
+    Convierte documentos crudos (`as_pymongo()`) en la misma salida que el serializer
+
+    Los convertidores de cada campo se preparan una sola vez a partir de los
+    campos del serializer y del documento; convertir una fila es solo recorrer
+    esa lista, sin construir el Document ni introspeccionar el serializer.
+    """
+
+    def __init__(self, serializer, document_class):
+        self.fields = []
+        self.sources = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            source = field.source if field.source not in (None, '*') else name
+            document_field = document_class._fields.get(source)
+            if document_field is None:
+                raise ImproperlyConfigured(f"'{source}' no es un campo de {document_class.__name__}")
+            self.sources.append(source)
+            self.fields.append((name, document_field.db_field, _field_converter(field, document_field)))
+
+    def __call__(self, raw):
+        return {name: convert(raw.get(db_field)) for name, db_field, convert in self.fields}
+
+
+_converters = {}
+
+
+def get_lean_converter(serializer_class):
+    """
+    Convertidor (en caché por clase) para un DocumentSerializer
+    """
+    converter = _converters.get(serializer_class)
+    if converter is None:
+        converter = LeanConverter(serializer_class(), serializer_class.Meta.model)
+        _converters[serializer_class] = converter
+    return converter
+
+
+class LeanListMixin:
+    """
+    Listado de solo lectura con `as_pymongo()` y un convertidor precompilado
+
+    La salida es idéntica a la del serializer de la vista. Se desactiva por
+    vista con `lean_list = False`.
+    """
+    lean_list = True
+
+    def list(self, request, *args, **kwargs):
+        if not self.lean_list:
+            return super().list(request, *args, **kwargs)
+
+        converter = get_lean_converter(self.get_serializer_class())
+        # La paginación por cursor necesita el campo de la clave aunque el serializer no lo incluya
+        sources = set(converter.sources) | {getattr(self, 'keyset_field', 'id')}
+        queryset = with_max_time(self.filter_queryset(self.get_queryset()).only(*sources).as_pymongo())
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response([converter(row) for row in page])
+        return Response([converter(row) for row in queryset])
@@ -0,0 +1,28 @@
+"""
+Middleware de PsyBot
+"""
+
+from django.conf import settings
+
+from psybot.utils.identity_map import identity_map_scope
+
+
+class IdentityMapMiddleware:
+    """
+    Abre un mapa de identidad por petición para que cada documento se consulte una sola vez
+
+    Con MONGO_ROUND_TRIP_HEADER activo agrega a la respuesta los comandos
+    enviados a MongoDB y los documentos servidos desde el mapa.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with identity_map_scope() as identity_map:
+            response = self.get_response(request)
+
+        if settings.MONGO_ROUND_TRIP_HEADER:
+            response['X-Mongo-Round-Trips'] = str(identity_map.round_trips)
+            response['X-Identity-Map-Hits'] = str(identity_map.hits)
+        return response
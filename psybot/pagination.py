@@ -0,0 +1,140 @@
+"""
+Paginación por cursor (keyset) para los listados de la API REST
+"""
+
+import base64
+import binascii
+import json
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+
+from django.conf import settings
+from mongoengine.queryset.visitor import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Pagina de más reciente a más antiguo usando (campo de fecha, id) como clave
+
+    En lugar de skip() cada página continúa desde la clave del último documento
+    entregado, codificada en un cursor opaco. Con un índice compuesto sobre
+    (filtros..., campo de fecha, _id) el costo de la página N no depende de N.
+
+    La vista indica el campo de fecha con el atributo `keyset_field`.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Cursor inválido'
+
+    def get_page_size(self, request):
+        page_size = getattr(settings, 'API_PAGE_SIZE', 50)
+        max_page_size = getattr(settings, 'API_MAX_PAGE_SIZE', 200)
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, page_size))
+        except ValueError:
+            pass
+        return max(1, min(page_size, max_page_size))
+
+    def encode_cursor(self, document):
+        """
+        Codifica la clave (fecha, id) del documento como un cursor opaco
+        
+        Acepta instancias de Document o documentos crudos de `as_pymongo()`.
+        """
+        if isinstance(document, dict):
+            value, document_id = document[self.keyset_field], document['_id']
+        else:
+            value, document_id = getattr(document, self.keyset_field), document.id
+        payload = json.dumps({
+            'v': value.isoformat(),
+            'id': str(document_id),
+        }, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+    def decode_cursor(self, cursor):
+        """
+        Recupera la clave (fecha, id) de un cursor
+
+        Raises:
+            NotFound: Si el cursor fue alterado o no corresponde a este listado
+        """
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+            return datetime.fromisoformat(payload['v']), uuid.UUID(payload['id'])
+        except (binascii.Error, UnicodeError, ValueError, KeyError, TypeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset_field = view.keyset_field
+        self.page_size = self.get_page_size(request)
+        self.request = request
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            value, last_id = self.decode_cursor(cursor)
+            queryset = queryset.filter(
+                Q(**{f'{self.keyset_field}__lt': value}) |
+                Q(**{self.keyset_field: value, 'id__lt': last_id})
+            )
+
+        # Un documento extra indica si hay página siguiente
+        documents = list(
+            queryset.order_by(f'-{self.keyset_field}', '-id').limit(self.page_size + 1)
+        )
+        self.has_next = len(documents) > self.page_size
+        documents = documents[:self.page_size]
+        self.next_cursor = self.encode_cursor(documents[-1]) if self.has_next else None
+        return documents
+
+    def get_next_link(self):
+        if not self.next_cursor:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_first_link(self):
+        return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('first', self.get_first_link()),
+            ('page_size', self.page_size),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'first': {'type': 'string', 'format': 'uri'},
+                'page_size': {'type': 'integer'},
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Cursor opaco devuelto en `next` por la página anterior',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.page_size_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Cantidad de resultados por página (máximo API_MAX_PAGE_SIZE)',
+                'schema': {'type': 'integer'},
+            },
+        ]
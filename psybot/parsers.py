@@ -0,0 +1,36 @@
+"""
+Parsers adicionales para la API REST
+"""
+
+import codecs
+import json
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+
+class NDJSONParser(BaseParser):
+    """
+    Interpreta un cuerpo NDJSON (un objeto JSON por línea) como una lista de objetos
+
+    Las líneas vacías se ignoran. Una línea que no es JSON válido rechaza la
+    petición indicando su número.
+    """
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+
+        rows = []
+        reader = codecs.getreader(encoding)(stream)
+        for number, line in enumerate(reader, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                rows.append(json.loads(line))
+            except ValueError as e:
+                raise ParseError(f'Línea {number}: JSON inválido ({e})')
+        return rows
@@ -59,6 +59,7 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
+    'psybot.middleware.IdentityMapMiddleware',
 ]
 
 ROOT_URLCONF = 'psybot.urls'
@@ -166,23 +167,158 @@ SPECTACULAR_SETTINGS = {
 # For development, you might want to allow all origins (NOT recommended for production)
 CORS_ALLOW_ALL_ORIGINS = True
 
-from mongoengine import connect
+from psybot.utils.mongo import ANALYTICS_ALIAS, build_read_preference, register_mongo_connection
 
 # MongoDB connection - adaptable para Docker y desarrollo local
 # En Docker, el servicio se llama 'mongo', en local es 'localhost'
 MONGO_HOST = os.getenv('MONGO_HOST', 'mongo')
 MONGO_PORT = int(os.getenv('MONGO_PORT', '27017'))
 MONGO_DB_NAME = os.getenv('MONGO_DB_NAME', 'psybot_db')
+# URI completa, p. ej. mongodb://mongo1,mongo2,mongo3/?replicaSet=rs0 (reemplaza host y puerto)
+MONGO_URI = os.getenv('MONGO_URI')
+
+# Opciones del cliente (conexión principal: escrituras y lecturas clínicas)
+MONGO_MAX_POOL_SIZE = int(os.getenv('MONGO_MAX_POOL_SIZE', '100'))
+MONGO_MIN_POOL_SIZE = int(os.getenv('MONGO_MIN_POOL_SIZE', '0'))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv('MONGO_SERVER_SELECTION_TIMEOUT_MS', '5000'))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv('MONGO_CONNECT_TIMEOUT_MS', '5000'))
+# maxTimeMS de los listados de la API (0: sin límite)
+MONGO_MAX_TIME_MS = int(os.getenv('MONGO_MAX_TIME_MS', '0'))
+
+# Conexión de analítica: exportaciones, dashboard y tendencias leen de un secundario si lo hay
+MONGO_ANALYTICS_URI = os.getenv('MONGO_ANALYTICS_URI') or MONGO_URI
+MONGO_ANALYTICS_READ_PREFERENCE = os.getenv('MONGO_ANALYTICS_READ_PREFERENCE', 'secondaryPreferred')
+MONGO_ANALYTICS_MAX_STALENESS_SECONDS = int(os.getenv('MONGO_ANALYTICS_MAX_STALENESS_SECONDS', '-1'))
+MONGO_ANALYTICS_MAX_POOL_SIZE = int(os.getenv('MONGO_ANALYTICS_MAX_POOL_SIZE', '20'))
+MONGO_ANALYTICS_MAX_TIME_MS = int(os.getenv('MONGO_ANALYTICS_MAX_TIME_MS', '30000'))
+
+# Write concern por operación ('majority', '1', '0', ...) y su tiempo máximo de espera
+MONGO_WRITE_TIMEOUT_MS = int(os.getenv('MONGO_WRITE_TIMEOUT_MS', '5000'))
+MONGO_WRITE_CONCERNS = {
+    'assessment_create': os.getenv('MONGO_WRITE_CONCERN_ASSESSMENT_CREATE', 'majority'),
+    'assessment_update': os.getenv('MONGO_WRITE_CONCERN_ASSESSMENT_UPDATE', 'majority'),
+    'assessment_delete': os.getenv('MONGO_WRITE_CONCERN_ASSESSMENT_DELETE', 'majority'),
+    'assessment_bulk': os.getenv('MONGO_WRITE_CONCERN_ASSESSMENT_BULK', '1'),
+}
+
+MONGO_CLIENT_OPTIONS = {
+    'maxPoolSize': MONGO_MAX_POOL_SIZE,
+    'minPoolSize': MONGO_MIN_POOL_SIZE,
+    'serverSelectionTimeoutMS': MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    'connectTimeoutMS': MONGO_CONNECT_TIMEOUT_MS,
+}
 
-# Configurar conexión MongoDB
-try:
-    connect(db=MONGO_DB_NAME, host=MONGO_HOST, port=MONGO_PORT)
-    print(f"Conectado a MongoDB: {MONGO_HOST}:{MONGO_PORT}/{MONGO_DB_NAME}")
-except Exception as e:
-    print(f"Error conectando a MongoDB: {e}")
+# Registrar las conexiones MongoDB (se abren en el primer uso de cada proceso, no al importar)
+register_mongo_connection(
+    db=MONGO_DB_NAME, host=MONGO_URI or MONGO_HOST, port=MONGO_PORT,
+    max_time_ms=MONGO_MAX_TIME_MS, **MONGO_CLIENT_OPTIONS
+)
+register_mongo_connection(
+    alias=ANALYTICS_ALIAS, db=MONGO_DB_NAME, host=MONGO_ANALYTICS_URI or MONGO_HOST, port=MONGO_PORT,
+    read_preference=build_read_preference(MONGO_ANALYTICS_READ_PREFERENCE, MONGO_ANALYTICS_MAX_STALENESS_SECONDS),
+    max_time_ms=MONGO_ANALYTICS_MAX_TIME_MS,
+    **{**MONGO_CLIENT_OPTIONS, 'maxPoolSize': MONGO_ANALYTICS_MAX_POOL_SIZE}
+)
 
 # Gemini AI Configuration
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
 GEMINI_MODEL = os.getenv('GEMINI_MODEL', 'gemini-1.5-flash')
 GEMINI_TEMPERATURE = float(os.getenv('GEMINI_TEMPERATURE', '0.7'))
 GEMINI_MAX_TOKENS = int(os.getenv('GEMINI_MAX_TOKENS', '1000'))
+# Transporte compartido por todos los modelos ('grpc' o 'rest') y precalentamiento al iniciar el servidor
+# (desactivado por defecto: google.generativeai se importa en el primer análisis)
+GEMINI_TRANSPORT = os.getenv('GEMINI_TRANSPORT', 'grpc')
+GEMINI_WARMUP = os.getenv('GEMINI_WARMUP', 'False').lower() in ('true', '1', 'yes')
+
+# Backend de los modelos: 'gemini' (API real), 'fake' (simulado, sin red) o 'replay' (grabaciones en disco)
+GEMINI_BACKEND = os.getenv('GEMINI_BACKEND', 'gemini')
+# Backend 'fake': latencia hasta el primer token (mediana en ms; distribución fixed, uniform o lognormal,
+# con JITTER como fracción o sigma), velocidad de salida, longitud de la respuesta y tasa de errores
+GEMINI_FAKE_LATENCY_MS = float(os.getenv('GEMINI_FAKE_LATENCY_MS', '800'))
+GEMINI_FAKE_LATENCY_DISTRIBUTION = os.getenv('GEMINI_FAKE_LATENCY_DISTRIBUTION', 'lognormal')
+GEMINI_FAKE_LATENCY_JITTER = float(os.getenv('GEMINI_FAKE_LATENCY_JITTER', '0.4'))
+GEMINI_FAKE_TOKENS_PER_SECOND = float(os.getenv('GEMINI_FAKE_TOKENS_PER_SECOND', '150'))
+GEMINI_FAKE_OUTPUT_TOKENS = int(os.getenv('GEMINI_FAKE_OUTPUT_TOKENS', '600'))
+GEMINI_FAKE_ERROR_RATE = float(os.getenv('GEMINI_FAKE_ERROR_RATE', '0'))
+GEMINI_FAKE_SEED = int(os.getenv('GEMINI_FAKE_SEED', '0'))
+# Backend 'replay': 'record' llama a Gemini y guarda cada respuesta, 'replay' solo reproduce
+GEMINI_REPLAY_MODE = os.getenv('GEMINI_REPLAY_MODE', 'replay')
+GEMINI_REPLAY_DIR = os.getenv('GEMINI_REPLAY_DIR', str(BASE_DIR / 'gemini_replay'))
+GEMINI_REPLAY_LATENCY = os.getenv('GEMINI_REPLAY_LATENCY', 'True').lower() in ('true', '1', 'yes')
+
+# Contexto del modelo y presupuesto de tokens de entrada por endpoint (se recorta el historial más antiguo)
+# GEMINI_EXACT_TOKEN_COUNT=True cuenta los tokens con la API (una llamada extra) en lugar de estimarlos
+GEMINI_CONTEXT_TOKENS = int(os.getenv('GEMINI_CONTEXT_TOKENS', '1000000'))
+GEMINI_EXACT_TOKEN_COUNT = os.getenv('GEMINI_EXACT_TOKEN_COUNT', 'False').lower() in ('true', '1', 'yes')
+GEMINI_INPUT_TOKEN_BUDGETS = {
+    'clinical': int(os.getenv('GEMINI_INPUT_BUDGET_CLINICAL', '1500')),
+    'trends': int(os.getenv('GEMINI_INPUT_BUDGET_TRENDS', '4000')),
+    'trend_summary': int(os.getenv('GEMINI_INPUT_BUDGET_TREND_SUMMARY', '3000')),
+}
+
+# Caché de respuestas de Gemini (colección gemini_cache en MongoDB)
+GEMINI_CACHE_ENABLED = os.getenv('GEMINI_CACHE_ENABLED', 'True').lower() in ('true', '1', 'yes')
+GEMINI_CACHE_TTL_SECONDS = int(os.getenv('GEMINI_CACHE_TTL_SECONDS', str(7 * 24 * 3600)))
+GEMINI_CACHE_MAX_ENTRIES = int(os.getenv('GEMINI_CACHE_MAX_ENTRIES', '5000'))
+# Segundos entre comprobaciones del tamaño de la caché (no se cuenta la colección en cada escritura)
+GEMINI_CACHE_EVICTION_INTERVAL = float(os.getenv('GEMINI_CACHE_EVICTION_INTERVAL', '30'))
+
+# Análisis clínico con datos no identificables (respuestas y rango de edad): el análisis
+# se comparte en caché entre pacientes y el nombre no se envía a Gemini
+GEMINI_DEIDENTIFIED_ANALYSIS = os.getenv('GEMINI_DEIDENTIFIED_ANALYSIS', 'False').lower() in ('true', '1', 'yes')
+
+# Resumen persistente del historial para el análisis de tendencias (colección trend_summaries):
+# el prompt lleva el resumen y como máximo WINDOW valoraciones detalladas
+TREND_SUMMARY_ENABLED = os.getenv('TREND_SUMMARY_ENABLED', 'True').lower() in ('true', '1', 'yes')
+TREND_SUMMARY_WINDOW = int(os.getenv('TREND_SUMMARY_WINDOW', '8'))
+TREND_SUMMARY_MAX_WORDS = int(os.getenv('TREND_SUMMARY_MAX_WORDS', '200'))
+TREND_SUMMARY_MAX_TOKENS = int(os.getenv('TREND_SUMMARY_MAX_TOKENS', '600'))
+# Llamadas simultáneas a Gemini al construir un resumen (trabajo 'trend_summary' de la cola)
+TREND_SUMMARY_CONCURRENCY = int(os.getenv('TREND_SUMMARY_CONCURRENCY', '4'))
+
+# Cola de trabajos de análisis asíncronos (manage.py run_analysis_workers)
+ANALYSIS_WORKERS = int(os.getenv('ANALYSIS_WORKERS', '4'))
+ANALYSIS_JOB_MAX_ATTEMPTS = int(os.getenv('ANALYSIS_JOB_MAX_ATTEMPTS', '3'))
+ANALYSIS_JOB_VISIBILITY_TIMEOUT = int(os.getenv('ANALYSIS_JOB_VISIBILITY_TIMEOUT', '120'))
+ANALYSIS_JOB_POLL_INTERVAL = float(os.getenv('ANALYSIS_JOB_POLL_INTERVAL', '1.0'))
+ANALYSIS_JOB_RETRY_DELAY = int(os.getenv('ANALYSIS_JOB_RETRY_DELAY', '5'))
+
+# Agrupación de llamadas idénticas concurrentes a Gemini (single-flight)
+# Con DISTRIBUTED=True se coordina entre procesos con un lease en MongoDB (requiere la caché)
+GEMINI_SINGLEFLIGHT_DISTRIBUTED = os.getenv('GEMINI_SINGLEFLIGHT_DISTRIBUTED', 'False').lower() in ('true', '1', 'yes')
+GEMINI_SINGLEFLIGHT_LEASE_SECONDS = int(os.getenv('GEMINI_SINGLEFLIGHT_LEASE_SECONDS', '60'))
+GEMINI_SINGLEFLIGHT_POLL_INTERVAL = float(os.getenv('GEMINI_SINGLEFLIGHT_POLL_INTERVAL', '0.25'))
+
+# Análisis por lotes (POST /api/assessments/analyze/batch/)
+ANALYSIS_BATCH_MAX_ITEMS = int(os.getenv('ANALYSIS_BATCH_MAX_ITEMS', '200'))
+ANALYSIS_BATCH_DEFAULT_CONCURRENCY = int(os.getenv('ANALYSIS_BATCH_DEFAULT_CONCURRENCY', '4'))
+ANALYSIS_BATCH_MAX_CONCURRENCY = int(os.getenv('ANALYSIS_BATCH_MAX_CONCURRENCY', '16'))
+
+# Ingesta masiva de valoraciones (POST /api/assessments/bulk/)
+ASSESSMENT_BULK_MAX_ITEMS = int(os.getenv('ASSESSMENT_BULK_MAX_ITEMS', '10000'))
+
+# Importación de pacientes (POST /api/pacientes/import/ y manage.py import_pacientes)
+PACIENTES_IMPORT_BATCH_SIZE = int(os.getenv('PACIENTES_IMPORT_BATCH_SIZE', '1000'))
+PACIENTES_IMPORT_MAX_ERRORS = int(os.getenv('PACIENTES_IMPORT_MAX_ERRORS', '100'))
+
+# Búsqueda de pacientes (GET /api/pacientes/search/)
+PACIENTES_SEARCH_LIMIT = int(os.getenv('PACIENTES_SEARCH_LIMIT', '10'))
+PACIENTES_SEARCH_MAX_LIMIT = int(os.getenv('PACIENTES_SEARCH_MAX_LIMIT', '50'))
+
+# Exportaciones en streaming: documentos por lote del cursor (y por consulta $in de pacientes)
+EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', '1000'))
+
+# Paginación de las páginas de la interfaz web
+WEB_PAGE_SIZE = int(os.getenv('WEB_PAGE_SIZE', '25'))
+WEB_MAX_PAGE_SIZE = int(os.getenv('WEB_MAX_PAGE_SIZE', '100'))
+
+# Paginación por cursor de los listados de la API REST
+API_PAGE_SIZE = int(os.getenv('API_PAGE_SIZE', '50'))
+API_MAX_PAGE_SIZE = int(os.getenv('API_MAX_PAGE_SIZE', '200'))
+
+# Dashboard: días de la serie diaria y vigencia (segundos) de la caché en memoria de los rollups
+DASHBOARD_DAYS = int(os.getenv('DASHBOARD_DAYS', '30'))
+DASHBOARD_CACHE_SECONDS = int(os.getenv('DASHBOARD_CACHE_SECONDS', '60'))
+
+# Cabeceras de depuración con los comandos enviados a MongoDB por petición (por defecto solo con DEBUG)
+MONGO_ROUND_TRIP_HEADER = os.getenv('MONGO_ROUND_TRIP_HEADER', str(DEBUG)).lower() == 'true'
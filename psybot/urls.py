@@ -25,7 +25,7 @@ from drf_spectacular.views import (
     SpectacularRedocView,
     SpectacularSwaggerView
 )
-from psybot.views.gemini_test import test_gemini_configuration, test_gemini_chat
+from psybot.views.gemini_test import test_gemini_configuration, test_gemini_chat, gemini_cache_stats
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -52,4 +52,5 @@ urlpatterns += [
 urlpatterns += [
     path('api/gemini/test/', test_gemini_configuration, name='test_gemini_configuration'),
     path('api/gemini/chat/', test_gemini_chat, name='test_gemini_chat'),
+    path('api/gemini/cache/stats/', gemini_cache_stats, name='gemini_cache_stats'),
 ]
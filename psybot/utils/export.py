@@ -0,0 +1,137 @@
+"""
+Utilidades para exportar colecciones completas en streaming (NDJSON o CSV, con gzip opcional)
+"""
+
+import csv
+import io
+import json
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+EXPORT_FORMATS = ('ndjson', 'csv')
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+# Tamaño mínimo de cada fragmento enviado (menos escrituras pequeñas al socket)
+CHUNK_BYTES = 64 * 1024
+
+
+def iter_ndjson(rows):
+    """
+    Serializa cada fila como una línea JSON
+
+    Yields:
+        bytes: Una línea por fila
+    """
+    for row in rows:
+        yield (json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n').encode('utf-8')
+
+
+def iter_csv(rows, fieldnames):
+    """
+    Serializa las filas como CSV con encabezados, sin acumular el archivo completo
+
+    Las listas se expanden en columnas numeradas por quien arma las filas; aquí
+    cada valor se escribe tal cual (fechas en ISO 8601).
+
+    Yields:
+        bytes: El encabezado y luego una línea por fila
+    """
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fieldnames, extrasaction='ignore')
+
+    def flush():
+        value = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+        return value.encode('utf-8')
+
+    writer.writeheader()
+    yield flush()
+    for row in rows:
+        writer.writerow({
+            key: value.isoformat() if hasattr(value, 'isoformat') else value
+            for key, value in row.items()
+        })
+        yield flush()
+
+
+def iter_chunks(pieces, chunk_bytes=CHUNK_BYTES):
+    """
+    Agrupa fragmentos pequeños en bloques de al menos `chunk_bytes`
+    """
+    buffer = []
+    size = 0
+    for piece in pieces:
+        buffer.append(piece)
+        size += len(piece)
+        if size >= chunk_bytes:
+            yield b''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def iter_gzip(chunks):
+    """
+    Comprime los bloques en formato gzip a medida que se generan
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def encode_export(rows, export_format, fieldnames, compress=False):
+    """
+    Convierte un iterador de filas en bloques de bytes listos para enviar o escribir
+
+    Args:
+        rows: Iterador de diccionarios
+        export_format (str): 'ndjson' o 'csv'
+        fieldnames (list): Columnas del CSV
+        compress (bool): Comprimir con gzip
+
+    Returns:
+        iterator: Bloques de bytes
+    """
+    if export_format == 'csv':
+        pieces = iter_csv(rows, fieldnames)
+    else:
+        pieces = iter_ndjson(rows)
+
+    chunks = iter_chunks(pieces)
+    return iter_gzip(chunks) if compress else chunks
+
+
+def export_response(rows, export_format, fieldnames, filename, compress=False):
+    """
+    Respuesta HTTP en streaming con las filas exportadas (memoria constante)
+
+    Args:
+        filename (str): Nombre base del archivo descargado (sin extensión)
+
+    Returns:
+        StreamingHttpResponse: Descarga NDJSON o CSV, opcionalmente gzip
+    """
+    filename = f'{filename}.{export_format}'
+    content_type = CONTENT_TYPES[export_format]
+    if compress:
+        filename += '.gz'
+        content_type = 'application/gzip'
+
+    response = StreamingHttpResponse(
+        encode_export(rows, export_format, fieldnames, compress=compress),
+        content_type=content_type
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    # Evitar que un proxy acumule la respuesta completa antes de enviarla
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,274 @@
+"""
+Caché persistente en MongoDB para las respuestas generadas por Gemini AI
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+
+from django.conf import settings
+from mongoengine import Document, StringField, DateTimeField, IntField, ListField
+
+logger = logging.getLogger(__name__)
+
+
+class GeminiCacheEntry(Document):
+    """
+    Respuesta de Gemini almacenada bajo el hash de su prompt y configuración
+    """
+    key = StringField(primary_key=True)
+    model_name = StringField()
+    response = StringField(required=True)
+    tags = ListField(StringField())
+    hits = IntField(default=0)
+    date_created = DateTimeField(default=datetime.utcnow)
+    last_accessed = DateTimeField(default=datetime.utcnow)
+    expires_at = DateTimeField(required=True)
+
+    meta = {
+        'indexes': [
+            # Índice TTL: MongoDB elimina la entrada al alcanzar expires_at
+            {'fields': ['expires_at'], 'expireAfterSeconds': 0},
+            'tags',
+            'last_accessed',
+        ],
+        'collection': 'gemini_cache'
+    }
+
+
+def build_cache_key(prompt: str, model_name: str, generation_config: Dict[str, Any]) -> str:
+    """
+    Calcula la clave de caché a partir del prompt, el modelo y los parámetros de generación
+
+    Las respuestas de los backends 'fake' y 'replay' (GEMINI_BACKEND) llevan
+    además el backend en la clave: nunca se sirven como respuestas de Gemini.
+
+    Args:
+        prompt (str): Texto completo enviado a Gemini
+        model_name (str): Nombre del modelo
+        generation_config (Dict[str, Any]): temperature, max_output_tokens, top_p, top_k
+
+    Returns:
+        str: Hash SHA-256 en hexadecimal
+    """
+    payload = {'prompt': prompt, 'model': model_name, 'config': generation_config}
+    backend = getattr(settings, 'GEMINI_BACKEND', 'gemini')
+    if backend != 'gemini':
+        payload['backend'] = backend
+    payload = json.dumps(
+        payload,
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def analysis_cache_tags(assessment_id=None, patient_id=None) -> List[str]:
+    """
+    Etiquetas que permiten invalidar los análisis asociados a una valoración o paciente
+    """
+    tags = []
+    if assessment_id:
+        tags.append(f"assessment:{assessment_id}")
+    if patient_id:
+        tags.append(f"patient:{patient_id}")
+    return tags
+
+
+def _hit_ratio(hits: int, misses: int) -> float:
+    total = hits + misses
+    return round(hits / total, 4) if total else 0.0
+
+
+class GeminiCache:
+    """
+    Caché de respuestas de Gemini con expiración (TTL) y desalojo por tamaño (LRU)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        # Aciertos/fallos por ámbito (p. ej. los análisis no identificables compartidos)
+        self.scopes: Dict[str, List[int]] = {}
+        # Momento (time.monotonic) de la próxima comprobación del tamaño
+        self._next_eviction = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return getattr(settings, 'GEMINI_CACHE_ENABLED', True)
+
+    @property
+    def ttl_seconds(self) -> int:
+        return getattr(settings, 'GEMINI_CACHE_TTL_SECONDS', 7 * 24 * 3600)
+
+    @property
+    def max_entries(self) -> int:
+        return getattr(settings, 'GEMINI_CACHE_MAX_ENTRIES', 5000)
+
+    @property
+    def eviction_interval(self) -> float:
+        return getattr(settings, 'GEMINI_CACHE_EVICTION_INTERVAL', 30)
+
+    def get(self, key: str, scope: Optional[str] = None) -> Optional[str]:
+        """
+        Obtiene una respuesta almacenada y actualiza sus contadores de uso
+
+        Args:
+            key (str): Clave de build_cache_key
+            scope (Optional[str]): Ámbito en el que además se cuenta el acierto o fallo
+
+        Returns:
+            Optional[str]: La respuesta almacenada o None si no existe o expiró
+        """
+        if not self.enabled:
+            return None
+
+        try:
+            now = datetime.utcnow()
+            entry = GeminiCacheEntry._get_collection().find_one_and_update(
+                {'_id': key, 'expires_at': {'$gt': now}},
+                {'$inc': {'hits': 1}, '$set': {'last_accessed': now}},
+                projection={'response': 1},
+            )
+        except Exception as e:
+            logger.warning(f"Error leyendo la caché de Gemini: {e}")
+            entry = None
+
+        with self._lock:
+            if entry:
+                self.hits += 1
+            else:
+                self.misses += 1
+            if scope:
+                self.scopes.setdefault(scope, [0, 0])[0 if entry else 1] += 1
+
+        return entry['response'] if entry else None
+
+    def peek(self, key: str) -> Optional[str]:
+        """
+        Lee una respuesta almacenada sin afectar contadores ni la antigüedad LRU
+        """
+        if not self.enabled:
+            return None
+
+        try:
+            entry = GeminiCacheEntry._get_collection().find_one(
+                {'_id': key, 'expires_at': {'$gt': datetime.utcnow()}},
+                {'response': 1},
+            )
+        except Exception as e:
+            logger.warning(f"Error leyendo la caché de Gemini: {e}")
+            return None
+
+        return entry['response'] if entry else None
+
+    def set(self, key: str, response: str, model_name: str, tags: Optional[Iterable[str]] = None):
+        """
+        Almacena (o reemplaza) una respuesta y aplica el límite de tamaño
+
+        El tamaño se comprueba como mucho una vez cada GEMINI_CACHE_EVICTION_INTERVAL
+        segundos por proceso, no en cada escritura.
+        """
+        if not self.enabled or not response:
+            return
+
+        try:
+            now = datetime.utcnow()
+            GeminiCacheEntry._get_collection().replace_one(
+                {'_id': key},
+                {
+                    'model_name': model_name,
+                    'response': response,
+                    'tags': list(tags or []),
+                    'hits': 0,
+                    'date_created': now,
+                    'last_accessed': now,
+                    'expires_at': now + timedelta(seconds=self.ttl_seconds),
+                },
+                upsert=True,
+            )
+            if self._eviction_due():
+                self._evict_if_needed()
+        except Exception as e:
+            logger.warning(f"Error escribiendo en la caché de Gemini: {e}")
+
+    def _eviction_due(self) -> bool:
+        """
+        Reserva la comprobación del tamaño si ya pasó el intervalo desde la anterior
+        """
+        now = time.monotonic()
+        with self._lock:
+            if now < self._next_eviction:
+                return False
+            self._next_eviction = now + self.eviction_interval
+            return True
+
+    def _evict_if_needed(self):
+        """
+        Elimina las entradas menos usadas recientemente cuando se supera el máximo
+        """
+        collection = GeminiCacheEntry._get_collection()
+        excess = collection.estimated_document_count() - self.max_entries
+        if excess <= 0:
+            return
+
+        stale_keys = [
+            doc['_id'] for doc in
+            collection.find({}, {'_id': 1}).sort('last_accessed', 1).limit(excess)
+        ]
+        if stale_keys:
+            collection.delete_many({'_id': {'$in': stale_keys}})
+
+    def invalidate(self, tags: Iterable[str]) -> int:
+        """
+        Elimina todas las entradas marcadas con alguna de las etiquetas dadas
+
+        Returns:
+            int: Número de entradas eliminadas
+        """
+        tags = list(tags)
+        if not tags:
+            return 0
+
+        try:
+            result = GeminiCacheEntry._get_collection().delete_many({'tags': {'$in': tags}})
+            return result.deleted_count
+        except Exception as e:
+            logger.warning(f"Error invalidando la caché de Gemini: {e}")
+            return 0
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Contadores de aciertos/fallos del proceso actual y tamaño de la colección
+        """
+        with self._lock:
+            hits, misses = self.hits, self.misses
+            scopes = {scope: tuple(counts) for scope, counts in self.scopes.items()}
+
+        try:
+            entries = GeminiCacheEntry._get_collection().estimated_document_count()
+        except Exception:
+            entries = None
+
+        return {
+            'enabled': self.enabled,
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': _hit_ratio(hits, misses),
+            'scopes': {
+                scope: {'hits': scope_hits, 'misses': scope_misses, 'hit_ratio': _hit_ratio(scope_hits, scope_misses)}
+                for scope, (scope_hits, scope_misses) in scopes.items()
+            },
+            'entries': entries,
+            'max_entries': self.max_entries,
+            'ttl_seconds': self.ttl_seconds,
+        }
+
+
+# Instancia global de la caché
+gemini_cache = GeminiCache()
@@ -2,14 +2,162 @@
 Utilidad para manejar la conexión y configuración de Gemini AI
 """
 
-import google.generativeai as genai
 from django.conf import settings
-from typing import Optional, Dict, Any
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, Iterable, Iterator, Callable
 import logging
+import os
+import socket
+import threading
+import time
+import uuid
+
+from mongoengine import Document, StringField, DateTimeField
+from pymongo.errors import DuplicateKeyError
+
+from psybot.utils.gemini_cache import gemini_cache, build_cache_key
+from psybot.utils.gemini_models import gemini_models
+from psybot.utils.prompts import check_context, token_usage
 
 logger = logging.getLogger(__name__)
 
 
+class GeminiLease(Document):
+    """
+    Marca en MongoDB de una generación en curso, compartida entre procesos
+    """
+    key = StringField(primary_key=True)
+    owner = StringField(required=True)
+    expires_at = DateTimeField(required=True)
+
+    meta = {
+        'indexes': [
+            {'fields': ['expires_at'], 'expireAfterSeconds': 0},
+        ],
+        'collection': 'gemini_leases'
+    }
+
+
+class SingleFlight:
+    """
+    Agrupa las llamadas concurrentes idénticas para que compartan una sola generación
+    
+    Dentro del proceso, los hilos que piden la misma clave esperan el mismo Future.
+    Opcionalmente (GEMINI_SINGLEFLIGHT_DISTRIBUTED) se coordina entre procesos con
+    un lease en MongoDB: quien no lo obtiene espera a que el resultado aparezca en la
+    caché de respuestas.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, Future] = {}
+        self._owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.leaders = 0
+        self.coalesced = 0
+        self.distributed_waits = 0
+        self.distributed_hits = 0
+    
+    def do(self, key: str, fn: Callable[[], str]) -> str:
+        """
+        Ejecuta fn una sola vez por clave entre las llamadas concurrentes
+        
+        Args:
+            key (str): Clave de la generación (hash de prompt y configuración)
+            fn (Callable[[], str]): Función que genera el texto
+            
+        Returns:
+            str: El texto generado (compartido con las llamadas agrupadas)
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+        
+        if not leader:
+            return future.result()
+        
+        try:
+            if getattr(settings, 'GEMINI_SINGLEFLIGHT_DISTRIBUTED', False):
+                result = self._do_distributed(key, fn)
+            else:
+                result = fn()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+    
+    def _do_distributed(self, key: str, fn: Callable[[], str]) -> str:
+        """
+        Coordina la generación con otros procesos mediante un lease en MongoDB
+        """
+        lease_seconds = getattr(settings, 'GEMINI_SINGLEFLIGHT_LEASE_SECONDS', 60)
+        
+        if not self._acquire_lease(key, lease_seconds):
+            with self._lock:
+                self.distributed_waits += 1
+            
+            # Otro proceso está generando: esperar su resultado en la caché
+            deadline = time.monotonic() + lease_seconds
+            while time.monotonic() < deadline:
+                cached = gemini_cache.peek(key)
+                if cached is not None:
+                    with self._lock:
+                        self.distributed_hits += 1
+                    return cached
+                if not GeminiLease.objects(key=key, expires_at__gt=datetime.utcnow()).first():
+                    break
+                time.sleep(getattr(settings, 'GEMINI_SINGLEFLIGHT_POLL_INTERVAL', 0.25))
+            
+            # El otro proceso falló o expiró su lease: generar aquí
+            self._acquire_lease(key, lease_seconds)
+        
+        try:
+            return fn()
+        finally:
+            GeminiLease._get_collection().delete_one({'_id': key, 'owner': self._owner})
+    
+    def _acquire_lease(self, key: str, lease_seconds: int) -> bool:
+        """
+        Intenta tomar el lease de la clave (o reemplazar uno vencido)
+        """
+        collection = GeminiLease._get_collection()
+        now = datetime.utcnow()
+        lease = {'owner': self._owner, 'expires_at': now + timedelta(seconds=lease_seconds)}
+        try:
+            collection.insert_one({'_id': key, **lease})
+            return True
+        except DuplicateKeyError:
+            result = collection.update_one(
+                {'_id': key, 'expires_at': {'$lt': now}},
+                {'$set': lease}
+            )
+            return result.modified_count == 1
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        Contadores de generaciones ejecutadas y llamadas agrupadas en este proceso
+        """
+        with self._lock:
+            return {
+                'distributed': getattr(settings, 'GEMINI_SINGLEFLIGHT_DISTRIBUTED', False),
+                'in_flight': len(self._calls),
+                'leaders': self.leaders,
+                'coalesced': self.coalesced,
+                'distributed_waits': self.distributed_waits,
+                'distributed_hits': self.distributed_hits,
+            }
+
+
 class GeminiClient:
     """
     Cliente para interactuar con la API de Gemini AI
@@ -23,21 +171,49 @@ class GeminiClient:
         self.model_name = settings.GEMINI_MODEL
         self.temperature = settings.GEMINI_TEMPERATURE
         self.max_tokens = settings.GEMINI_MAX_TOKENS
+        self.singleflight = SingleFlight()
         
-        # Configurar la API key
-        if self.api_key:
-            genai.configure(api_key=self.api_key)
-            self.model = genai.GenerativeModel(self.model_name)
-        else:
-            logger.error("GEMINI_API_KEY no está configurada")
-            raise ValueError("GEMINI_API_KEY no está configurada en las variables de entorno")
+        # Verificar la API key (el modelo se obtiene del registro compartido en el primer uso)
+        if not self.api_key and getattr(settings, 'GEMINI_BACKEND', 'gemini') == 'gemini':
+            logger.warning("GEMINI_API_KEY no está configurada: los análisis con Gemini no estarán disponibles")
+    
+    @property
+    def model(self):
+        """
+        Modelo compartido del proceso para settings.GEMINI_MODEL
+        """
+        return gemini_models.get_model(self.model_name)
+    
+    def build_generation_config(self, **kwargs) -> Dict[str, Any]:
+        """
+        Construye los parámetros de generación a partir de los valores por defecto
+        
+        Args:
+            **kwargs: temperature, max_tokens, top_p, top_k
+            
+        Returns:
+            Dict[str, Any]: Configuración de generación para Gemini
+        """
+        return {
+            "temperature": kwargs.get("temperature", self.temperature),
+            "max_output_tokens": kwargs.get("max_tokens", self.max_tokens),
+            "top_p": kwargs.get("top_p", 0.95),
+            "top_k": kwargs.get("top_k", 40),
+        }
     
-    def generate_text(self, prompt: str, **kwargs) -> Optional[str]:
+    def generate_text(self, prompt: str, use_cache: bool = True,
+                      cache_tags: Optional[Iterable[str]] = None,
+                      cache_scope: Optional[str] = None, endpoint: Optional[str] = None,
+                      **kwargs) -> Optional[str]:
         """
         Genera texto usando Gemini AI
         
         Args:
             prompt (str): El prompt para generar texto
+            use_cache (bool): Si es False se ignora la caché al leer (la respuesta nueva sí se almacena)
+            cache_tags (Optional[Iterable[str]]): Etiquetas para invalidar la entrada de caché
+            cache_scope (Optional[str]): Ámbito de los contadores de aciertos de la caché
+            endpoint (Optional[str]): Endpoint para el registro de tokens ('clinical', 'trends', ...)
             **kwargs: Parámetros adicionales para la generación
             
         Returns:
@@ -45,25 +221,84 @@ class GeminiClient:
         """
         try:
             # Configurar parámetros de generación
-            generation_config = {
-                "temperature": kwargs.get("temperature", self.temperature),
-                "max_output_tokens": kwargs.get("max_tokens", self.max_tokens),
-                "top_p": kwargs.get("top_p", 0.95),
-                "top_k": kwargs.get("top_k", 40),
-            }
+            generation_config = self.build_generation_config(**kwargs)
             
-            # Generar respuesta
-            response = self.model.generate_content(
-                prompt,
-                generation_config=generation_config
-            )
+            # Consultar la caché antes de llamar a Gemini
+            cache_key = build_cache_key(prompt, self.model_name, generation_config)
+            if use_cache:
+                cached = gemini_cache.get(cache_key, scope=cache_scope)
+                if cached is not None:
+                    token_usage.record_cached(endpoint)
+                    return cached
             
-            return response.text
+            def generate():
+                check_context(prompt, generation_config['max_output_tokens'], self.model)
+                response = self.model.generate_content(
+                    prompt,
+                    generation_config=generation_config
+                )
+                token_usage.record(endpoint, prompt, response.text, response)
+                gemini_cache.set(cache_key, response.text, self.model_name, tags=cache_tags)
+                return response.text
+            
+            # Generar respuesta (las llamadas concurrentes idénticas comparten la generación)
+            return self.singleflight.do(cache_key, generate)
             
         except Exception as e:
             logger.error(f"Error generando texto con Gemini: {e}")
             return None
     
+    def stream_text(self, prompt: str, use_cache: bool = True,
+                    cache_tags: Optional[Iterable[str]] = None,
+                    cache_scope: Optional[str] = None, endpoint: Optional[str] = None,
+                    **kwargs) -> Iterator[str]:
+        """
+        Genera texto usando Gemini AI entregando los fragmentos a medida que llegan
+        
+        Si la respuesta está en caché se entrega completa en un único fragmento.
+        A diferencia de generate_text, los errores se propagan al consumidor
+        porque pueden ocurrir cuando ya se enviaron fragmentos.
+        
+        Args:
+            prompt (str): El prompt para generar texto
+            use_cache (bool): Si es False se ignora la caché al leer (la respuesta nueva sí se almacena)
+            cache_tags (Optional[Iterable[str]]): Etiquetas para invalidar la entrada de caché
+            cache_scope (Optional[str]): Ámbito de los contadores de aciertos de la caché
+            endpoint (Optional[str]): Endpoint para el registro de tokens ('clinical', 'trends', ...)
+            **kwargs: Parámetros adicionales para la generación
+            
+        Yields:
+            str: Fragmentos de texto generado
+        """
+        generation_config = self.build_generation_config(**kwargs)
+        
+        cache_key = build_cache_key(prompt, self.model_name, generation_config)
+        if use_cache:
+            cached = gemini_cache.get(cache_key, scope=cache_scope)
+            if cached is not None:
+                token_usage.record_cached(endpoint)
+                yield cached
+                return
+        
+        check_context(prompt, generation_config['max_output_tokens'], self.model)
+        response = self.model.generate_content(
+            prompt,
+            generation_config=generation_config,
+            stream=True
+        )
+        
+        chunks = []
+        for chunk in response:
+            text = chunk.text
+            if text:
+                chunks.append(text)
+                yield text
+        
+        # Solo se almacena la respuesta completa
+        text = "".join(chunks)
+        token_usage.record(endpoint, prompt, text, response)
+        gemini_cache.set(cache_key, text, self.model_name, tags=cache_tags)
+    
     def generate_chat_response(self, message: str, context: Optional[str] = None) -> Optional[str]:
         """
         Genera una respuesta de chat usando Gemini AI
@@ -82,7 +317,7 @@ class GeminiClient:
             else:
                 prompt = f"Usuario: {message}\n\nAsistente:"
             
-            return self.generate_text(prompt)
+            return self.generate_text(prompt, endpoint='chat')
             
         except Exception as e:
             logger.error(f"Error generando respuesta de chat: {e}")
@@ -95,7 +330,7 @@ class GeminiClient:
         Returns:
             bool: True si está configurado, False en caso contrario
         """
-        return bool(self.api_key and self.model)
+        return bool(self.model_name) and gemini_models.is_configured()
 
 
 # Instancia global del cliente
@@ -0,0 +1,185 @@
+"""
+Registro compartido (por proceso) de los modelos de Gemini AI
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from django.conf import settings
+
+from psybot.utils.llm_backends import BACKENDS, FakeModel, ReplayModel
+
+logger = logging.getLogger(__name__)
+
+# google.generativeai (y gRPC) se importa en el primer uso: su importación es costosa
+genai = None
+genai_import_seconds = None
+
+
+def load_genai():
+    """
+    Importa `google.generativeai` una sola vez y registra cuánto tardó
+
+    Returns:
+        module: El módulo google.generativeai
+    """
+    global genai, genai_import_seconds
+    if genai is None:
+        start = time.perf_counter()
+        import google.generativeai as genai_module
+        genai_import_seconds = time.perf_counter() - start
+        genai = genai_module
+        logger.info(f"google.generativeai importado en {genai_import_seconds:.3f}s")
+    return genai
+
+
+class GeminiModelRegistry:
+    """
+    Construye cada `GenerativeModel` una sola vez por (modelo, configuración)
+
+    Todos los modelos comparten el cliente de transporte de `google.generativeai`,
+    de modo que la conexión con la API se reutiliza entre peticiones e hilos.
+    Después de un fork el proceso hijo descarta modelos y clientes heredados y
+    los vuelve a crear en su primer uso.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._models: Dict[Tuple[str, str], Any] = {}
+        self._configured = False
+        self._pid = os.getpid()
+        self.created = 0
+        self.reused = 0
+
+    @property
+    def api_key(self) -> Optional[str]:
+        return getattr(settings, 'GEMINI_API_KEY', None)
+
+    @property
+    def backend(self) -> str:
+        backend = getattr(settings, 'GEMINI_BACKEND', 'gemini')
+        if backend not in BACKENDS:
+            raise ValueError(f"GEMINI_BACKEND desconocido: '{backend}' (opciones: {', '.join(BACKENDS)})")
+        return backend
+
+    def is_configured(self) -> bool:
+        # El backend simulado y la reproducción de grabaciones no necesitan la API key
+        if self.backend == 'fake' or (self.backend == 'replay' and settings.GEMINI_REPLAY_MODE == 'replay'):
+            return True
+        return bool(self.api_key)
+
+    def _configure(self):
+        """
+        Configura `google.generativeai` una única vez (debe llamarse con el lock tomado)
+        """
+        if self._configured:
+            return
+        if not self.api_key:
+            raise ValueError("GEMINI_API_KEY no está configurada en las variables de entorno")
+        load_genai().configure(api_key=self.api_key, transport=getattr(settings, 'GEMINI_TRANSPORT', 'grpc'))
+        self._configured = True
+
+    def get_model(self, model_name: Optional[str] = None,
+                  generation_config: Optional[Dict[str, Any]] = None):
+        """
+        Obtiene el modelo compartido para el nombre y la configuración dados
+
+        Args:
+            model_name (Optional[str]): Nombre del modelo (por defecto settings.GEMINI_MODEL)
+            generation_config (Optional[Dict[str, Any]]): Configuración fija del modelo
+
+        Returns:
+            genai.GenerativeModel: Instancia reutilizable desde varios hilos (o el
+                modelo equivalente del backend de GEMINI_BACKEND)
+        """
+        model_name = model_name or settings.GEMINI_MODEL
+        backend = self.backend
+        if backend == 'replay':
+            backend = f"replay:{settings.GEMINI_REPLAY_MODE}"
+        key = (model_name, json.dumps(generation_config or {}, sort_keys=True), backend)
+
+        with self._lock:
+            model = self._models.get(key)
+            if model is not None:
+                self.reused += 1
+                return model
+
+            if backend == 'fake':
+                model = FakeModel(model_name, generation_config)
+            elif backend.startswith('replay'):
+                # Solo la grabación necesita el modelo real
+                inner = self._build_gemini_model(model_name, generation_config) \
+                    if settings.GEMINI_REPLAY_MODE == 'record' else None
+                model = ReplayModel(model_name, generation_config, inner)
+            else:
+                model = self._build_gemini_model(model_name, generation_config)
+            self._models[key] = model
+            self.created += 1
+            return model
+
+    def _build_gemini_model(self, model_name, generation_config):
+        # Debe llamarse con el lock tomado
+        self._configure()
+        return load_genai().GenerativeModel(model_name, generation_config=generation_config)
+
+    def warm_up(self, model_names=None):
+        """
+        Crea por adelantado los modelos y el cliente de transporte compartido
+
+        Args:
+            model_names: Modelos a preparar (por defecto settings.GEMINI_MODEL)
+        """
+        if not self.is_configured():
+            logger.info("Gemini no configurado: se omite el precalentamiento de modelos")
+            return
+        if self.backend != 'gemini':
+            logger.info(f"Backend '{self.backend}': no hay modelos de Gemini que precalentar")
+            return
+
+        try:
+            for model_name in model_names or [settings.GEMINI_MODEL]:
+                self.get_model(model_name)
+            # Los modelos toman este mismo cliente en su primera llamada
+            from google.generativeai import client as genai_client
+            genai_client.get_default_generative_client()
+            logger.info("Modelos de Gemini precalentados")
+        except Exception as e:
+            logger.warning(f"Error precalentando los modelos de Gemini: {e}")
+
+    def reset(self):
+        """
+        Descarta los modelos y clientes heredados (se llama en el hijo después de un fork)
+        """
+        # El lock pudo quedar tomado por un hilo del padre que no existe en el hijo
+        self._lock = threading.Lock()
+        self._models = {}
+        self._configured = False
+        self._pid = os.getpid()
+        FakeModel.reset()
+        # El próximo get_model vuelve a llamar a genai.configure, que crea clientes nuevos
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Modelos construidos y reutilizados en este proceso
+        """
+        with self._lock:
+            return {
+                'pid': self._pid,
+                'backend': getattr(settings, 'GEMINI_BACKEND', 'gemini'),
+                'genai_loaded': genai is not None,
+                'genai_import_seconds': genai_import_seconds,
+                'models': [name for name, _, _ in self._models],
+                'created': self.created,
+                'reused': self.reused,
+            }
+
+
+# Instancia global del registro
+gemini_models = GeminiModelRegistry()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=gemini_models.reset)
@@ -0,0 +1,147 @@
+"""
+Mapa de identidad por petición: cada documento se consulta a MongoDB una sola vez por petición
+"""
+
+import contextvars
+import logging
+from contextlib import contextmanager
+
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+# Mapa y contadores de la petición en curso (None fuera de una petición)
+_current = contextvars.ContextVar('psybot_identity_map', default=None)
+
+
+class IdentityMap:
+    """
+    Documentos cargados durante una petición, indexados por (clase, id)
+
+    También guarda los documentos inexistentes (como None) para que una
+    validación y la vista que le sigue no repitan la misma consulta vacía.
+    """
+
+    def __init__(self):
+        self.documents = {}
+        self.hits = 0
+        self.misses = 0
+        self.round_trips = 0
+
+    @staticmethod
+    def key(document_cls, pk):
+        return document_cls._get_collection_name(), str(pk).lower()
+
+    def get(self, document_cls, pk):
+        key = self.key(document_cls, pk)
+        if key in self.documents:
+            self.hits += 1
+            return self.documents[key]
+
+        self.misses += 1
+        document = document_cls.objects(id=pk).first()
+        self.documents[key] = document
+        return document
+
+    def remember(self, document):
+        self.documents[self.key(type(document), document.pk)] = document
+
+    def forget(self, document_cls, pk):
+        self.documents.pop(self.key(document_cls, pk), None)
+
+
+def current_identity_map():
+    """
+    Mapa de identidad activo, o None fuera de `identity_map_scope`
+    """
+    return _current.get()
+
+
+@contextmanager
+def identity_map_scope():
+    """
+    Activa un mapa de identidad nuevo durante el bloque (una petición, un trabajo, etc.)
+
+    Yields:
+        IdentityMap: El mapa activo, con sus contadores
+    """
+    identity_map = IdentityMap()
+    token = _current.set(identity_map)
+    try:
+        yield identity_map
+    finally:
+        _current.reset(token)
+
+
+def get_document(document_cls, pk):
+    """
+    Obtiene un documento por su ID pasando por el mapa de identidad de la petición
+
+    Fuera de una petición (comandos, workers) consulta directamente a MongoDB.
+
+    Args:
+        document_cls: Clase del documento (Paciente, PHQ9Assessment, ...)
+        pk: ID del documento
+
+    Returns:
+        Document: El documento, o None si no existe
+    """
+    identity_map = _current.get()
+    if identity_map is None:
+        return document_cls.objects(id=pk).first()
+    return identity_map.get(document_cls, pk)
+
+
+def get_document_or_raise(document_cls, pk):
+    """
+    Como get_document, pero lanza `DoesNotExist` igual que `objects.get()`
+
+    Raises:
+        DoesNotExist: Si el documento no existe
+    """
+    document = get_document(document_cls, pk)
+    if document is None:
+        raise document_cls.DoesNotExist(f"{document_cls._class_name} matching query does not exist.")
+    return document
+
+
+def remember_document(document):
+    """
+    Registra un documento recién guardado en el mapa de la petición (si hay uno activo)
+    """
+    identity_map = _current.get()
+    if identity_map is not None:
+        identity_map.remember(document)
+
+
+def forget_document(document_cls, pk):
+    """
+    Descarta un documento del mapa de la petición tras modificarlo o eliminarlo en la base
+    """
+    identity_map = _current.get()
+    if identity_map is not None:
+        identity_map.forget(document_cls, pk)
+
+
+class RoundTripCounter(monitoring.CommandListener):
+    """
+    Cuenta los comandos enviados a MongoDB dentro del mapa de identidad activo
+
+    pymongo notifica en el mismo hilo que ejecuta el comando, de modo que la
+    variable de contexto identifica la petición que lo originó.
+    """
+
+    def started(self, event):
+        identity_map = _current.get()
+        if identity_map is not None:
+            identity_map.round_trips += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+# Se registra antes de crear el primer cliente (la conexión con MongoDB es diferida)
+monitoring.register(RoundTripCounter())
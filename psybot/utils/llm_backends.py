@@ -0,0 +1,272 @@
+"""
+Backends alternativos a Gemini AI para pruebas de carga, benchmarks y ejecución sin red
+
+El registro de modelos (gemini_models) entrega, según GEMINI_BACKEND, un objeto
+con la misma interfaz que `genai.GenerativeModel` que usan el cliente y el
+servicio de análisis (`generate_content`, con o sin `stream`, y `count_tokens`):
+
+- 'gemini': el modelo real de google.generativeai
+- 'fake': respuestas deterministas con latencia, velocidad de tokens y tasa
+  de errores configurables, sin red
+- 'replay': pares prompt -> respuesta guardados en disco; en modo 'record' se
+  generan con Gemini y se guardan, en modo 'replay' se reproducen (con la
+  latencia registrada si GEMINI_REPLAY_LATENCY está activo)
+"""
+
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, List, Optional
+
+from django.conf import settings
+
+from psybot.utils.prompts import estimate_tokens
+
+BACKENDS = ('gemini', 'fake', 'replay')
+
+# Palabras de las respuestas simuladas
+FAKE_VOCABULARY = (
+    'paciente', 'síntomas', 'severidad', 'seguimiento', 'evaluación', 'ánimo', 'sueño', 'energía',
+    'apetito', 'concentración', 'riesgo', 'tratamiento', 'terapia', 'evolución', 'mejoría', 'control',
+    'recomendación', 'intervención', 'apoyo', 'sesiones', 'clínico', 'puntaje', 'frecuencia', 'semanas',
+)
+
+# Tokens por fragmento en las respuestas en streaming
+STREAM_CHUNK_TOKENS = 20
+
+
+class LLMBackendError(Exception):
+    """
+    Error generado por un backend alternativo (error simulado o grabación inexistente)
+    """
+
+
+def _usage(prompt: str, text: str):
+    return SimpleNamespace(prompt_token_count=estimate_tokens(prompt), candidates_token_count=estimate_tokens(text))
+
+
+def _split_chunks(text: str, tokens_per_chunk: int = STREAM_CHUNK_TOKENS) -> List[str]:
+    words = text.split(' ')
+    words_per_chunk = max(1, tokens_per_chunk * 3 // 4)
+    return [
+        ' '.join(words[start:start + words_per_chunk]) + (' ' if start + words_per_chunk < len(words) else '')
+        for start in range(0, len(words), words_per_chunk)
+    ]
+
+
+class LLMResponse:
+    """
+    Respuesta con `.text` y `usage_metadata`, como la de Gemini
+    """
+
+    def __init__(self, text: str, usage_metadata=None):
+        self.text = text
+        self.usage_metadata = usage_metadata
+
+
+class StreamedResponse:
+    """
+    Respuesta en streaming: fragmentos con `.text`, `usage_metadata` disponible al terminar
+    """
+
+    def __init__(self, chunks: Iterator[str], usage_metadata=None):
+        self._chunks = chunks
+        self.usage_metadata = usage_metadata
+
+    def __iter__(self):
+        for text in self._chunks:
+            yield LLMResponse(text)
+
+
+class FakeModel:
+    """
+    Modelo simulado: el texto depende solo del prompt; la latencia y los errores
+    siguen la distribución configurada (GEMINI_FAKE_*)
+    """
+
+    _lock = threading.Lock()
+    _random = None
+
+    def __init__(self, model_name: str, generation_config: Optional[Dict[str, Any]] = None):
+        self.model_name = model_name
+        self.generation_config = generation_config or {}
+
+    @classmethod
+    def _rng(cls) -> random.Random:
+        # Generador compartido por el proceso para latencias y errores (reproducible con GEMINI_FAKE_SEED)
+        if cls._random is None:
+            cls._random = random.Random(settings.GEMINI_FAKE_SEED)
+        return cls._random
+
+    @classmethod
+    def reset(cls):
+        """
+        Descarta el generador (se llama en el hijo después de un fork)
+        """
+        # Sin tomar el lock: pudo quedar tomado por un hilo del padre que no existe en el hijo
+        cls._lock = threading.Lock()
+        cls._random = None
+
+    def _draw(self):
+        """
+        Latencia hasta el primer token (segundos) y si la llamada falla
+        """
+        median = settings.GEMINI_FAKE_LATENCY_MS / 1000.0
+        jitter = settings.GEMINI_FAKE_LATENCY_JITTER
+        distribution = settings.GEMINI_FAKE_LATENCY_DISTRIBUTION
+        with self._lock:
+            rng = self._rng()
+            if distribution == 'fixed':
+                latency = median
+            elif distribution == 'uniform':
+                latency = rng.uniform(median * (1 - jitter), median * (1 + jitter))
+            elif distribution == 'lognormal':
+                latency = median * rng.lognormvariate(0, jitter)
+            else:
+                raise ValueError(f"GEMINI_FAKE_LATENCY_DISTRIBUTION desconocida: '{distribution}'")
+            failed = rng.random() < settings.GEMINI_FAKE_ERROR_RATE
+        return max(latency, 0.0), failed
+
+    def _output_tokens(self, generation_config: Optional[Dict[str, Any]]) -> int:
+        config = {**self.generation_config, **(generation_config or {})}
+        limit = config.get('max_output_tokens')
+        return min(settings.GEMINI_FAKE_OUTPUT_TOKENS, limit) if limit else settings.GEMINI_FAKE_OUTPUT_TOKENS
+
+    def render(self, prompt: str, tokens: int) -> str:
+        """
+        Texto determinista para el prompt (mismo prompt y longitud, mismo texto)
+        """
+        digest = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+        rng = random.Random(digest)
+        words = [f'[{self.model_name} simulado {digest[:8]}]']
+        # Unos 4 caracteres por token, como la estimación local
+        while sum(len(word) + 1 for word in words) < tokens * 4:
+            words.append(rng.choice(FAKE_VOCABULARY))
+        return ' '.join(words)
+
+    def generate_content(self, prompt: str, generation_config: Optional[Dict[str, Any]] = None, stream: bool = False):
+        latency, failed = self._draw()
+        tokens = self._output_tokens(generation_config)
+        rate = settings.GEMINI_FAKE_TOKENS_PER_SECOND
+        time.sleep(latency)
+        if failed:
+            raise LLMBackendError('Error simulado del backend fake (GEMINI_FAKE_ERROR_RATE)')
+
+        text = self.render(prompt, tokens)
+        if not stream:
+            if rate > 0:
+                time.sleep(tokens / rate)
+            return LLMResponse(text, _usage(prompt, text))
+
+        def chunks():
+            for chunk in _split_chunks(text):
+                if rate > 0:
+                    time.sleep(estimate_tokens(chunk) / rate)
+                yield chunk
+        return StreamedResponse(chunks(), _usage(prompt, text))
+
+    def count_tokens(self, prompt: str):
+        return SimpleNamespace(total_tokens=estimate_tokens(prompt))
+
+
+class ReplayModel:
+    """
+    Graba (mode='record', con el modelo real) o reproduce (mode='replay') respuestas en disco
+
+    Cada par se guarda en `<GEMINI_REPLAY_DIR>/<sha256>.json` con el prompt,
+    la respuesta, sus fragmentos si fue en streaming y la latencia medida.
+    """
+
+    def __init__(self, model_name: str, generation_config: Optional[Dict[str, Any]] = None, inner=None):
+        self.model_name = model_name
+        self.generation_config = generation_config or {}
+        self.inner = inner
+
+    @property
+    def directory(self) -> Path:
+        return Path(settings.GEMINI_REPLAY_DIR)
+
+    @property
+    def mode(self) -> str:
+        return settings.GEMINI_REPLAY_MODE
+
+    def _path(self, prompt: str, generation_config: Optional[Dict[str, Any]]) -> Path:
+        payload = json.dumps(
+            {'prompt': prompt, 'model': self.model_name, 'config': {**self.generation_config, **(generation_config or {})}},
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        return self.directory / f"{hashlib.sha256(payload.encode('utf-8')).hexdigest()}.json"
+
+    def _record(self, path: Path, prompt: str, text: str, chunks: Optional[List[str]], seconds: float):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # Escritura atómica: los procesos que reproducen nunca leen un archivo a medias
+        temporary = path.with_suffix(f'.{os.getpid()}.{threading.get_ident()}.tmp')
+        temporary.write_text(json.dumps({
+            'model': self.model_name,
+            'prompt': prompt,
+            'response': text,
+            'chunks': chunks,
+            'latency_seconds': round(seconds, 4),
+        }, ensure_ascii=False, indent=2), encoding='utf-8')
+        os.replace(temporary, path)
+
+    def _load(self, path: Path) -> Dict[str, Any]:
+        try:
+            return json.loads(path.read_text(encoding='utf-8'))
+        except FileNotFoundError:
+            raise LLMBackendError(f"No hay respuesta grabada para este prompt ({path.name}) en {self.directory}")
+
+    def generate_content(self, prompt: str, generation_config: Optional[Dict[str, Any]] = None, stream: bool = False):
+        path = self._path(prompt, generation_config)
+        if self.mode == 'record':
+            return self._generate_and_record(path, prompt, generation_config, stream)
+        if self.mode != 'replay':
+            raise ValueError(f"GEMINI_REPLAY_MODE desconocido: '{self.mode}'")
+
+        recorded = self._load(path)
+        text = recorded['response']
+        chunks = recorded.get('chunks') or _split_chunks(text)
+        latency = recorded.get('latency_seconds', 0) if settings.GEMINI_REPLAY_LATENCY else 0
+        if not stream:
+            time.sleep(latency)
+            return LLMResponse(text, _usage(prompt, text))
+
+        def replay_chunks():
+            # La latencia grabada se reparte entre los fragmentos
+            for chunk in chunks:
+                time.sleep(latency / len(chunks))
+                yield chunk
+        return StreamedResponse(replay_chunks(), _usage(prompt, text))
+
+    def _generate_and_record(self, path, prompt, generation_config, stream):
+        kwargs = {'generation_config': generation_config} if generation_config is not None else {}
+        start = time.perf_counter()
+        if not stream:
+            response = self.inner.generate_content(prompt, **kwargs)
+            self._record(path, prompt, response.text, None, time.perf_counter() - start)
+            return response
+
+        response = self.inner.generate_content(prompt, stream=True, **kwargs)
+
+        def record_chunks():
+            chunks = []
+            for chunk in response:
+                if chunk.text:
+                    chunks.append(chunk.text)
+                    yield chunk.text
+            self._record(path, prompt, ''.join(chunks), chunks, time.perf_counter() - start)
+            # Gemini completa usage_metadata al terminar el streaming
+            streamed.usage_metadata = getattr(response, 'usage_metadata', None)
+        streamed = StreamedResponse(record_chunks())
+        return streamed
+
+    def count_tokens(self, prompt: str):
+        if self.mode == 'record':
+            return self.inner.count_tokens(prompt)
+        return SimpleNamespace(total_tokens=estimate_tokens(prompt))
@@ -0,0 +1,134 @@
+"""
+Conexiones con MongoDB por alias: diferidas (el cliente se crea en el primer uso de
+cada proceso), con preferencia de lectura, límite de tiempo y write concern configurables
+"""
+
+import os
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from mongoengine import register_connection, disconnect
+from mongoengine.connection import DEFAULT_CONNECTION_NAME, get_db
+from pymongo.read_preferences import Nearest, Primary, PrimaryPreferred, Secondary, SecondaryPreferred
+
+# Alias de las lecturas pesadas (exportaciones, dashboard, tendencias)
+ANALYTICS_ALIAS = 'analytics'
+
+READ_PREFERENCES = {
+    'primary': Primary,
+    'primaryPreferred': PrimaryPreferred,
+    'secondary': Secondary,
+    'secondaryPreferred': SecondaryPreferred,
+    'nearest': Nearest,
+}
+
+# Parámetros registrados por alias, para volver a registrarlos después de un fork
+_registered = {}
+# maxTimeMS de las consultas de cada alias (None: sin límite)
+_max_time_ms = {}
+
+
+def register_mongo_connection(alias=DEFAULT_CONNECTION_NAME, max_time_ms=None, **kwargs):
+    """
+    Registra la conexión sin abrirla
+
+    mongoengine construye el MongoClient en la primera consulta y, con
+    connect=False, pymongo no abre sockets hasta la primera operación. Así
+    ningún socket se hereda a través de un fork (gunicorn, workers, etc.).
+
+    Args:
+        alias (str): Alias de la conexión en mongoengine
+        max_time_ms (int): Límite de tiempo en el servidor para las consultas del alias
+        **kwargs: db, host, port, read_preference y demás opciones de MongoClient
+    """
+    kwargs.setdefault('connect', False)
+    register_connection(alias, **kwargs)
+    _registered[alias] = kwargs
+    _max_time_ms[alias] = max_time_ms or None
+
+
+def reset_mongo_connections():
+    """
+    Descarta los clientes heredados del proceso padre y vuelve a registrar las conexiones
+    """
+    for alias, kwargs in _registered.items():
+        disconnect(alias)
+        register_connection(alias, **kwargs)
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=reset_mongo_connections)
+
+
+def build_read_preference(mode, max_staleness_seconds=-1):
+    """
+    Preferencia de lectura de pymongo a partir de su nombre
+
+    Args:
+        mode (str): 'primary', 'primaryPreferred', 'secondary', 'secondaryPreferred' o 'nearest'
+        max_staleness_seconds (int): Retraso máximo aceptado de un secundario (-1: sin límite, mínimo 90)
+
+    Raises:
+        ImproperlyConfigured: Si el modo no existe
+    """
+    if mode not in READ_PREFERENCES:
+        raise ImproperlyConfigured(
+            f"Preferencia de lectura desconocida '{mode}' (opciones: {', '.join(READ_PREFERENCES)})"
+        )
+    if mode == 'primary':
+        return Primary()
+    return READ_PREFERENCES[mode](max_staleness=max_staleness_seconds)
+
+
+def build_write_concern(value, wtimeout_ms=None):
+    """
+    Write concern a partir del valor configurado ('majority', '1', '0', ...)
+
+    Returns:
+        dict: Argumentos de WriteConcern (válidos también para save/delete de mongoengine)
+    """
+    value = str(value).strip()
+    w = int(value) if value.isdigit() else value
+    write_concern = {'w': w}
+    if wtimeout_ms and w != 0:
+        write_concern['wtimeout'] = wtimeout_ms
+    return write_concern
+
+
+def get_write_concern(operation):
+    """
+    Write concern de una operación según MONGO_WRITE_CONCERNS
+
+    Args:
+        operation (str): Clave de MONGO_WRITE_CONCERNS (p. ej. 'assessment_create')
+    """
+    return build_write_concern(settings.MONGO_WRITE_CONCERNS[operation], settings.MONGO_WRITE_TIMEOUT_MS)
+
+
+def get_max_time_ms(alias=DEFAULT_CONNECTION_NAME):
+    """
+    maxTimeMS configurado para el alias (None si no tiene límite)
+    """
+    return _max_time_ms.get(alias)
+
+
+def with_max_time(query, alias=DEFAULT_CONNECTION_NAME):
+    """
+    Aplica el maxTimeMS del alias a un QuerySet de mongoengine o a un cursor de pymongo
+    """
+    max_time_ms = get_max_time_ms(alias)
+    return query.max_time_ms(max_time_ms) if max_time_ms else query
+
+
+def analytics_collection(document_class):
+    """
+    Colección del documento leída por la conexión de analítica (secondaryPreferred por defecto)
+    """
+    return get_db(ANALYTICS_ALIAS)[document_class._get_collection_name()]
+
+
+def analytics_queryset(document_class):
+    """
+    QuerySet del documento sobre la conexión de analítica, con su maxTimeMS
+    """
+    return with_max_time(document_class.objects.using(ANALYTICS_ALIAS), ANALYTICS_ALIAS)
@@ -0,0 +1,194 @@
+"""
+Construcción de prompts para Gemini: plantillas compactas, conteo de tokens y presupuestos
+
+Las plantillas se normalizan una sola vez al importar el módulo que las
+define (sin la sangría del código fuente ni espacios al final de línea), de
+modo que cada llamada envía solo el contenido. Cada endpoint tiene un
+presupuesto de tokens de entrada (GEMINI_INPUT_TOKEN_BUDGETS) y se registra
+cuántos tokens de entrada y de salida consume cada llamada.
+"""
+
+import logging
+import math
+import re
+import textwrap
+import threading
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Estimación local: caracteres por token en texto en español (SentencePiece de Gemini)
+CHARS_PER_TOKEN = 4
+
+_BLANK_LINES = re.compile(r'\n{3,}')
+
+
+def prompt_template(text: str) -> str:
+    """
+    Normaliza una plantilla escrita como cadena triple en el código
+
+    Quita la sangría común, los espacios al final de cada línea y las líneas
+    vacías del principio y del final. Se llama al importar, no en cada prompt.
+    """
+    lines = [line.rstrip() for line in textwrap.dedent(text).splitlines()]
+    return '\n'.join(lines).strip('\n')
+
+
+def render_prompt(template: str, **values: Any) -> str:
+    """
+    Completa una plantilla de prompt_template
+
+    Las secciones opcionales vacías no dejan más de una línea en blanco seguida.
+    """
+    return _BLANK_LINES.sub('\n\n', template.format(**values)).strip()
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimación local (sin llamar a la API) de los tokens de un texto
+    """
+    return math.ceil(len(text or '') / CHARS_PER_TOKEN)
+
+
+def count_tokens(text: str, model=None) -> int:
+    """
+    Tokens de un texto: exactos con `model.count_tokens` si GEMINI_EXACT_TOKEN_COUNT
+    está activo y se indica el modelo (una llamada a la API), si no la estimación local
+    """
+    if model is not None and getattr(settings, 'GEMINI_EXACT_TOKEN_COUNT', False):
+        try:
+            return int(model.count_tokens(text).total_tokens)
+        except Exception as e:
+            logger.warning(f"Error contando tokens con Gemini, se usa la estimación local: {e}")
+    return estimate_tokens(text)
+
+
+def input_budget(endpoint: Optional[str]) -> Optional[int]:
+    """
+    Presupuesto de tokens de entrada del endpoint (None si no tiene)
+    """
+    return getattr(settings, 'GEMINI_INPUT_TOKEN_BUDGETS', {}).get(endpoint)
+
+
+def check_context(prompt: str, max_output_tokens: int, model=None) -> int:
+    """
+    Verifica que el prompt y la respuesta máxima quepan en la ventana de contexto del modelo
+
+    Returns:
+        int: Tokens del prompt
+
+    Raises:
+        ValueError: Si no caben
+    """
+    tokens = count_tokens(prompt, model)
+    context = getattr(settings, 'GEMINI_CONTEXT_TOKENS', None)
+    if context and tokens + max_output_tokens > context:
+        raise ValueError(
+            f"El prompt ({tokens} tokens) más la respuesta máxima ({max_output_tokens}) "
+            f"supera el contexto del modelo ({context} tokens)"
+        )
+    return tokens
+
+
+def fit_history(render: Callable[[Sequence, int], str], items: Sequence,
+                endpoint: str, minimum: int = 1) -> Tuple[str, int]:
+    """
+    Prompt con el historial más largo (los elementos más recientes) que cabe en el presupuesto
+
+    Args:
+        render: Función (elementos incluidos, cantidad omitida) -> prompt
+        items: Historial en orden cronológico
+        endpoint (str): Clave de GEMINI_INPUT_TOKEN_BUDGETS
+        minimum (int): Elementos que se incluyen aunque se supere el presupuesto
+
+    Returns:
+        tuple: (prompt, elementos omitidos del principio del historial)
+    """
+    budget = input_budget(endpoint)
+    prompt = render(items, 0)
+    if budget is None or estimate_tokens(prompt) <= budget:
+        return prompt, 0
+
+    # Búsqueda binaria de la mayor cantidad de elementos recientes que cabe
+    low, high = min(minimum, len(items)), len(items) - 1
+    best = low
+    while low <= high:
+        kept = (low + high) // 2
+        if estimate_tokens(render(items[len(items) - kept:], len(items) - kept)) <= budget:
+            best, low = kept, kept + 1
+        else:
+            high = kept - 1
+
+    omitted = len(items) - best
+    prompt = render(items[omitted:], omitted)
+    logger.info(f"Prompt '{endpoint}' recortado a {best} de {len(items)} elementos del historial ({budget} tokens)")
+    if estimate_tokens(prompt) > budget:
+        logger.warning(f"El prompt '{endpoint}' supera su presupuesto de {budget} tokens")
+    return prompt, omitted
+
+
+def _usage_count(usage, name):
+    value = getattr(usage, name, None)
+    return value if isinstance(value, int) else None
+
+
+class TokenUsage:
+    """
+    Tokens de entrada y de salida por endpoint en el proceso actual
+
+    Se usan los conteos que devuelve Gemini (`usage_metadata`) y, si no
+    vienen, la estimación local. Las respuestas servidas desde la caché se
+    cuentan aparte: no consumen tokens.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints: Dict[str, Dict[str, int]] = {}
+
+    def _counters(self, endpoint):
+        return self._endpoints.setdefault(endpoint or 'other', {
+            'calls': 0, 'cached': 0, 'input_tokens': 0, 'output_tokens': 0, 'max_input_tokens': 0,
+        })
+
+    def record(self, endpoint: Optional[str], prompt: str, text: Optional[str], response=None):
+        """
+        Registra una generación
+
+        Args:
+            endpoint (str): Clave del endpoint ('clinical', 'trends', ...)
+            prompt (str): Prompt enviado
+            text (str): Texto generado
+            response: Respuesta de Gemini (para leer usage_metadata si la trae)
+        """
+        usage = getattr(response, 'usage_metadata', None)
+        input_tokens = _usage_count(usage, 'prompt_token_count') or estimate_tokens(prompt)
+        output_tokens = _usage_count(usage, 'candidates_token_count') or estimate_tokens(text)
+        with self._lock:
+            counters = self._counters(endpoint)
+            counters['calls'] += 1
+            counters['input_tokens'] += input_tokens
+            counters['output_tokens'] += output_tokens
+            counters['max_input_tokens'] = max(counters['max_input_tokens'], input_tokens)
+
+    def record_cached(self, endpoint: Optional[str]):
+        with self._lock:
+            self._counters(endpoint)['cached'] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Contadores por endpoint con el promedio de tokens de entrada por llamada
+        """
+        with self._lock:
+            return {
+                endpoint: {
+                    **counters,
+                    'avg_input_tokens': round(counters['input_tokens'] / counters['calls'], 1) if counters['calls'] else 0.0,
+                }
+                for endpoint, counters in self._endpoints.items()
+            }
+
+
+# Instancia global del registro de tokens
+token_usage = TokenUsage()
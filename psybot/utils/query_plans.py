@@ -0,0 +1,72 @@
+"""
+Registro de las consultas frecuentes y verificación de sus planes de ejecución
+"""
+
+from typing import Any, Callable, Dict, List
+
+# Etapas del plan que indican que la consulta no está cubierta por un índice
+PROBLEM_STAGES = {
+    'COLLSCAN': 'recorre la colección completa',
+    'SORT': 'ordena en memoria',
+}
+
+_hot_queries: Dict[str, Callable] = {}
+
+
+def register_hot_query(name: str):
+    """
+    Decorador que registra una consulta frecuente para `manage.py check_query_plans`
+
+    La función decorada no recibe argumentos y devuelve el QuerySet de
+    mongoengine tal como lo construye la aplicación (filtros, orden y límite).
+    Los módulos `hot_queries.py` de cada app se cargan automáticamente.
+    """
+    def decorator(factory: Callable):
+        _hot_queries[name] = factory
+        return factory
+    return decorator
+
+
+def get_hot_queries() -> Dict[str, Callable]:
+    return dict(_hot_queries)
+
+
+def _collect(node: Any, key: str, found: List[str]):
+    """
+    Recorre el plan (diccionarios y listas anidados) acumulando los valores de `key`
+    """
+    if isinstance(node, dict):
+        for name, value in node.items():
+            if name == key and isinstance(value, str):
+                found.append(value)
+            else:
+                _collect(value, key, found)
+    elif isinstance(node, list):
+        for item in node:
+            _collect(item, key, found)
+
+
+def analyze_plan(explain: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Resume el plan ganador del resultado de explain()
+
+    Args:
+        explain (Dict[str, Any]): Resultado de `QuerySet.explain()`
+
+    Returns:
+        Dict[str, Any]: etapas del plan, índices usados y problemas encontrados
+    """
+    winning_plan = explain.get('queryPlanner', {}).get('winningPlan', {})
+
+    stages: List[str] = []
+    indexes: List[str] = []
+    _collect(winning_plan, 'stage', stages)
+    _collect(winning_plan, 'indexName', indexes)
+
+    return {
+        'stages': stages,
+        'indexes': indexes,
+        'problems': [
+            f"{stage}: {PROBLEM_STAGES[stage]}" for stage in stages if stage in PROBLEM_STAGES
+        ],
+    }
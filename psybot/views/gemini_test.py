@@ -6,6 +6,9 @@ from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
 from psybot.utils.gemini_client import gemini_client
+from psybot.utils.gemini_models import gemini_models
+from psybot.utils.gemini_cache import gemini_cache
+from psybot.utils.prompts import token_usage
 import logging
 
 logger = logging.getLogger(__name__)
@@ -84,3 +87,18 @@ def test_gemini_chat(request):
             'status': 'error',
             'message': f'Error interno: {str(e)}'
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['GET'])
+def gemini_cache_stats(request):
+    """
+    Endpoint para consultar los contadores de la caché de respuestas de Gemini,
+    de las llamadas concurrentes agrupadas y de los tokens por endpoint
+    """
+    return Response({
+        'status': 'success',
+        'cache': gemini_cache.stats(),
+        'singleflight': gemini_client.singleflight.stats(),
+        'models': gemini_models.stats(),
+        'tokens': token_usage.stats()
+    }, status=status.HTTP_200_OK)
@@ -14,3 +14,10 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'psybot.settings')
 
 application = get_wsgi_application()
+
+# Precalentar los modelos de Gemini compartidos antes de la primera petición
+from django.conf import settings  # noqa: E402
+from psybot.utils.gemini_models import gemini_models  # noqa: E402
+
+if settings.GEMINI_WARMUP:
+    gemini_models.warm_up()
@@ -0,0 +1,17 @@
+import pytest
+import uuid
+from datetime import datetime
+from pacientes.models import Paciente
+
+
+@pytest.fixture
+def paciente():
+    """Paciente guardado con una identificación única"""
+    paciente = Paciente(
+        nombre="Elena",
+        apellido="Suárez",
+        identificacion=str(uuid.uuid4())[:8],
+        fecha_nacimiento=datetime(1988, 4, 12)
+    )
+    paciente.save()
+    return paciente
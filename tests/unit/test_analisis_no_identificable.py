@@ -0,0 +1,125 @@
+import pytest
+import os
+import uuid
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+from datetime import datetime
+from django.test import override_settings
+from pacientes.models import Paciente
+from psybot.utils.gemini_cache import gemini_cache
+from valoraciones.analysis import (
+    analyze_assessment, analyze_assessment_web, stream_assessment_analysis, stream_assessment_web
+)
+from valoraciones.deidentified import DEIDENTIFIED_CACHE_SCOPE, DEIDENTIFIED_CACHE_TAG, age_band, reuse_report
+from valoraciones.models import PHQ9Assessment
+
+# Configurar host para testing local
+os.environ['MONGO_HOST'] = 'localhost'
+
+
+def crear_valoracion(nombre, anio_nacimiento, respuestas):
+    paciente = Paciente(
+        nombre=nombre,
+        apellido="Rivas",
+        identificacion=str(uuid.uuid4())[:8],
+        fecha_nacimiento=datetime(anio_nacimiento, 3, 15)
+    )
+    paciente.save()
+
+    assessment = PHQ9Assessment(patient_id=paciente.id, responses=respuestas)
+    assessment.save()
+    return assessment
+
+
+def test_rangos_de_edad():
+    """La edad exacta se reemplaza por un rango"""
+    assert [age_band(edad) for edad in (-1, 12, 17, 18, 24, 25, 64, 65, 90)] == [
+        '0-12', '0-12', '13-17', '18-24', '18-24', '25-34', '55-64', '65+', '65+'
+    ]
+
+
+@pytest.mark.django_db
+@override_settings(GEMINI_DEIDENTIFIED_ANALYSIS=True, GEMINI_CACHE_ENABLED=True)
+@patch('psybot.utils.gemini_client.gemini_models')
+def test_analisis_compartido_entre_pacientes(mock_gemini_models):
+    """Dos pacientes con las mismas respuestas y rango de edad comparten una sola llamada a Gemini"""
+    modelo = MagicMock()
+    modelo.generate_content.return_value = SimpleNamespace(text="Análisis del paciente")
+    mock_gemini_models.get_model.return_value = modelo
+
+    gemini_cache.invalidate([DEIDENTIFIED_CACHE_TAG])
+    respuestas = [2, 1, 3, 0, 1, 2, 0, 1, 1]
+    anio = datetime.now().year - 30
+    primera = crear_valoracion("Ana", anio, respuestas)
+    segunda = crear_valoracion("Bruno", anio - 2, respuestas)
+    antes = gemini_cache.stats()['scopes'].get(DEIDENTIFIED_CACHE_SCOPE, {'hits': 0, 'misses': 0})
+
+    resultado_primera = analyze_assessment(primera.id)
+    resultado_segunda = analyze_assessment(segunda.id)
+
+    assert modelo.generate_content.call_count == 1
+    prompt = modelo.generate_content.call_args[0][0]
+    assert 'Ana' not in prompt and 'Rivas' not in prompt
+    assert 'Rango de edad: 25-34 años' in prompt
+
+    assert resultado_primera['clinical_analysis'].startswith("Paciente: Ana Rivas\nEdad: 30 años\n")
+    assert resultado_segunda['clinical_analysis'].startswith("Paciente: Bruno Rivas\nEdad: 32 años\n")
+    assert resultado_segunda['clinical_analysis'].endswith("Análisis del paciente")
+    assert resultado_segunda['patient_info']['nombre'] == "Bruno Rivas"
+
+    despues = gemini_cache.stats()['scopes'][DEIDENTIFIED_CACHE_SCOPE]
+    assert despues['hits'] - antes['hits'] == 1
+    assert despues['misses'] - antes['misses'] == 1
+
+    metadata, fragmentos = stream_assessment_analysis(segunda.id)
+    assert ''.join(fragmentos) == resultado_segunda['clinical_analysis']
+    assert modelo.generate_content.call_count == 1
+
+
+@pytest.mark.django_db
+@override_settings(GEMINI_DEIDENTIFIED_ANALYSIS=True, GEMINI_CACHE_ENABLED=True)
+@patch('valoraciones.services.gemini_models')
+@patch('psybot.utils.gemini_client.gemini_models')
+def test_analisis_web_no_envia_datos_del_paciente(mock_gemini_models, mock_service_models):
+    """La interfaz web usa el mismo prompt no identificable y la misma entrada de caché que la API REST"""
+    modelo = MagicMock()
+    modelo.generate_content.return_value = SimpleNamespace(text="Análisis web compartido")
+    mock_gemini_models.get_model.return_value = modelo
+    mock_service_models.is_configured.return_value = True
+
+    gemini_cache.invalidate([DEIDENTIFIED_CACHE_TAG])
+    respuestas = [3, 2, 1, 0, 2, 1, 0, 3, 0]
+    anio = datetime.now().year - 50
+    web = crear_valoracion("Carmen", anio, respuestas)
+    api = crear_valoracion("Darío", anio - 1, respuestas)
+
+    resultado_web = analyze_assessment_web(web.id)
+
+    prompt = modelo.generate_content.call_args[0][0]
+    assert 'Carmen' not in prompt and 'Rivas' not in prompt and str(anio) not in prompt
+    assert 'Rango de edad: 45-54 años' in prompt
+    assert resultado_web['analisis'].startswith("Paciente: Carmen Rivas\nEdad: 50 años\n")
+    assert resultado_web['analisis'].endswith("Análisis web compartido")
+
+    metadata, fragmentos = stream_assessment_web(web.id)
+    assert ''.join(fragmentos) == resultado_web['analisis']
+    resultado_api = analyze_assessment(api.id)
+    assert resultado_api['clinical_analysis'].startswith("Paciente: Darío Rivas\n")
+    assert modelo.generate_content.call_count == 1
+
+
+@pytest.mark.django_db
+def test_informe_de_reutilizacion():
+    """La proporción esperada de aciertos cuenta una llamada por par (respuestas, rango de edad)"""
+    PHQ9Assessment.objects.delete()
+    anio = datetime.now().year - 40
+    for nombre in ("Carla", "Diego", "Elena"):
+        crear_valoracion(nombre, anio, [1] * 9)
+    crear_valoracion("Fabio", anio, [2] * 9)
+
+    report = reuse_report()
+
+    assert report['assessments'] == 4
+    assert report['distinct_keys'] == 2
+    assert report['expected_hit_ratio'] == 0.5
+    assert report['top_keys'][0] == {'responses': [1] * 9, 'age_band': '35-44', 'assessments': 3}
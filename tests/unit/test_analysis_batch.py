@@ -0,0 +1,64 @@
+import pytest
+import os
+import threading
+import time
+import uuid
+from unittest.mock import patch
+from datetime import datetime
+from pacientes.models import Paciente
+from valoraciones.models import PHQ9Assessment
+from valoraciones.analysis import analyze_assessments_batch
+
+# Configurar host para testing local
+os.environ['MONGO_HOST'] = 'localhost'
+
+
+def crear_valoracion(puntaje):
+    paciente = Paciente(
+        nombre="Laura",
+        apellido="Méndez",
+        identificacion=str(uuid.uuid4())[:8],
+        fecha_nacimiento=datetime(1992, 7, 20)
+    )
+    paciente.save()
+
+    assessment = PHQ9Assessment(
+        patient_id=str(paciente.id),
+        responses=[puntaje] * 9
+    )
+    assessment.save()
+    return assessment
+
+
+@pytest.mark.django_db
+@patch('valoraciones.analysis.gemini_client')
+def test_lote_con_exito_parcial_y_concurrencia_acotada(mock_gemini_client):
+    """Cada valoración informa su resultado y nunca se superan las llamadas simultáneas pedidas"""
+    lock = threading.Lock()
+    activas = {'actual': 0, 'maximo': 0}
+
+    def generar(prompt, **kwargs):
+        with lock:
+            activas['actual'] += 1
+            activas['maximo'] = max(activas['maximo'], activas['actual'])
+        time.sleep(0.05)
+        with lock:
+            activas['actual'] -= 1
+        return None if 'Puntaje total: 27/27' in prompt else "Análisis clínico simulado"
+
+    mock_gemini_client.generate_text.side_effect = generar
+    valoraciones = [crear_valoracion(1) for _ in range(5)]
+    fallida = crear_valoracion(3)
+    inexistente = uuid.uuid4()
+
+    ids = [v.id for v in valoraciones] + [fallida.id, inexistente, valoraciones[0].id]
+    result = analyze_assessments_batch(ids, concurrency=2)
+
+    assert activas['maximo'] <= 2
+    assert result['total'] == 7
+    assert result['succeeded'] == 5
+    assert result['failed'] == 2
+    assert [item['assessment_id'] for item in result['results']] == [str(i) for i in ids[:-1]]
+    assert result['results'][0]['clinical_analysis'] == "Análisis clínico simulado"
+    assert result['results'][5]['status_code'] == 500
+    assert result['results'][6]['status_code'] == 404
@@ -0,0 +1,117 @@
+import pytest
+import os
+import time
+import uuid
+from unittest.mock import patch
+from datetime import datetime
+from pacientes.models import Paciente
+from valoraciones.models import PHQ9Assessment, AnalysisJob
+from valoraciones.jobs import enqueue_job, claim_next_job, execute_job
+
+# Configurar host para testing local
+os.environ['MONGO_HOST'] = 'localhost'
+
+
+def crear_valoracion():
+    paciente = Paciente(
+        nombre="Laura",
+        apellido="Méndez",
+        identificacion=str(uuid.uuid4())[:8],
+        fecha_nacimiento=datetime(1992, 7, 20)
+    )
+    paciente.save()
+
+    assessment = PHQ9Assessment(
+        patient_id=str(paciente.id),
+        responses=[1, 2, 1, 0, 1, 2, 1, 0, 0]
+    )
+    assessment.save()
+    return assessment
+
+
+@pytest.mark.django_db
+@patch('valoraciones.analysis.gemini_client')
+def test_trabajo_de_analisis_exitoso(mock_gemini_client):
+    """Un trabajo encolado se reserva, se ejecuta y guarda el resultado"""
+    mock_gemini_client.generate_text.return_value = "Análisis clínico simulado"
+    assessment = crear_valoracion()
+
+    job = enqueue_job('assessment_analysis', {'assessment_id': assessment.id})
+    AnalysisJob.objects(id__ne=job.id, status=AnalysisJob.STATUS_PENDING).delete()
+
+    claimed = claim_next_job('worker-test', visibility_timeout=60)
+    assert claimed.id == job.id
+    assert claimed.status == AnalysisJob.STATUS_RUNNING
+    assert claimed.attempts == 1
+
+    execute_job(claimed, 'worker-test')
+    job.reload()
+    assert job.status == AnalysisJob.STATUS_SUCCEEDED
+    assert job.result['clinical_analysis'] == "Análisis clínico simulado"
+
+
+@pytest.mark.django_db
+@patch('valoraciones.analysis.gemini_client')
+def test_trabajo_de_analisis_reintenta_y_falla(mock_gemini_client):
+    """Un error de Gemini reprograma el trabajo hasta agotar los intentos"""
+    mock_gemini_client.generate_text.return_value = None
+    assessment = crear_valoracion()
+
+    job = enqueue_job('assessment_analysis', {'assessment_id': assessment.id})
+    AnalysisJob.objects(id__ne=job.id, status=AnalysisJob.STATUS_PENDING).delete()
+
+    for intento in range(1, job.max_attempts + 1):
+        AnalysisJob.objects(id=job.id).update_one(set__available_at=datetime.utcnow())
+        claimed = claim_next_job('worker-test', visibility_timeout=60)
+        assert claimed.attempts == intento
+        execute_job(claimed, 'worker-test')
+
+    job.reload()
+    assert job.status == AnalysisJob.STATUS_FAILED
+    assert job.error == 'Error al generar el análisis con Gemini AI'
+
+
+@pytest.mark.django_db
+def test_trabajo_largo_conserva_la_reserva():
+    """Un handler más largo que el tiempo de visibilidad no se reasigna a otro worker"""
+    assessment = crear_valoracion()
+    job = enqueue_job('assessment_analysis', {'assessment_id': assessment.id})
+    AnalysisJob.objects(id__ne=job.id, status__in=[AnalysisJob.STATUS_PENDING, AnalysisJob.STATUS_RUNNING]).delete()
+    reclamado_por_otro = []
+
+    def handler_lento(params):
+        time.sleep(1.5)
+        reclamado_por_otro.append(claim_next_job('worker-otro', visibility_timeout=1))
+        return {'status': 'success'}
+
+    claimed = claim_next_job('worker-test', visibility_timeout=1)
+    with patch.dict('valoraciones.jobs.JOB_HANDLERS', {'assessment_analysis': handler_lento}):
+        execute_job(claimed, 'worker-test', visibility_timeout=1)
+
+    assert reclamado_por_otro == [None]
+    job.reload()
+    assert job.status == AnalysisJob.STATUS_SUCCEEDED
+    assert job.attempts == 1
+
+
+@pytest.mark.django_db
+def test_trabajo_reasignado_no_sobrescribe_el_resultado():
+    """Si otro worker tomó el trabajo, el resultado del worker anterior se descarta"""
+    assessment = crear_valoracion()
+    job = enqueue_job('assessment_analysis', {'assessment_id': assessment.id})
+    AnalysisJob.objects(id__ne=job.id, status__in=[AnalysisJob.STATUS_PENDING, AnalysisJob.STATUS_RUNNING]).delete()
+
+    def handler_reasignado(params):
+        # Otro worker tomó el trabajo tras vencer la visibilidad
+        AnalysisJob.objects(id=job.id).update_one(set__locked_until=datetime(2000, 1, 1))
+        claim_next_job('worker-otro', visibility_timeout=60)
+        return {'status': 'success'}
+
+    claimed = claim_next_job('worker-test', visibility_timeout=60)
+    with patch.dict('valoraciones.jobs.JOB_HANDLERS', {'assessment_analysis': handler_reasignado}):
+        execute_job(claimed, 'worker-test', visibility_timeout=60)
+
+    job.reload()
+    assert job.status == AnalysisJob.STATUS_RUNNING
+    assert job.worker_id == 'worker-otro'
+    assert job.attempts == 2
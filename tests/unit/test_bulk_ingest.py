@@ -0,0 +1,60 @@
+import pytest
+import os
+import uuid
+import json
+from datetime import datetime
+from django.test import Client
+from valoraciones.models import PHQ9Assessment
+from valoraciones.ingest import ingest_assessments
+
+# Configurar host para testing local
+os.environ['MONGO_HOST'] = 'localhost'
+
+
+@pytest.mark.django_db
+def test_ingesta_inserta_validas_e_informa_errores_por_fila(paciente):
+    """Las filas válidas se insertan y cada fila inválida informa su error por índice"""
+    filas = [
+        {'patient_id': str(paciente.id), 'responses': [1] * 9},
+        {'patient_id': str(paciente.id), 'responses': [1] * 8},
+        {'patient_id': str(paciente.id), 'responses': [0, 0, 0, 0, 4, 0, 0, 0, 0]},
+        {'patient_id': str(uuid.uuid4()), 'responses': [2] * 9},
+        {'patient_id': 'no-es-uuid', 'responses': [2] * 9},
+        {'patient_id': str(paciente.id), 'responses': [3] * 9, 'date_created': '2024-03-01T08:00:00Z'},
+        'no es un objeto',
+    ]
+
+    resultado = ingest_assessments(filas)
+
+    assert (resultado['received'], resultado['inserted'], resultado['failed']) == (7, 2, 5)
+    assert [item['index'] for item in resultado['ids']] == [0, 5]
+    errores = {item['index']: item['errors'] for item in resultado['errors']}
+    assert set(errores) == {1, 2, 3, 4, 6}
+    assert errores[2]['responses'] == ['La respuesta 5 debe estar entre 0 y 3']
+    assert errores[3]['patient_id'] == ['El paciente especificado no existe']
+    assert 'patient_id' in errores[4]
+
+    creada = PHQ9Assessment.objects.get(id=resultado['ids'][1]['id'])
+    assert creada.total_score == 27
+    assert creada.date_created == datetime(2024, 3, 1, 8, 0)
+
+    # El resumen del paciente incluye las valoraciones ingeridas
+    paciente.reload()
+    assert paciente.resumen.total_valoraciones == 2
+    assert paciente.resumen.puntaje_maximo == 27
+
+
+@pytest.mark.django_db
+def test_endpoint_bulk_acepta_ndjson(paciente):
+    """POST /api/assessments/bulk/ acepta un cuerpo NDJSON y rechaza cuerpos que no son listas"""
+    client = Client()
+    cuerpo = '\n'.join(
+        json.dumps({'patient_id': str(paciente.id), 'responses': [puntaje] * 9}) for puntaje in (0, 1, 2)
+    ) + '\n'
+
+    response = client.post('/api/assessments/bulk/', cuerpo, content_type='application/x-ndjson')
+    assert response.status_code == 201
+    assert response.json()['inserted'] == 3
+
+    response = client.post('/api/assessments/bulk/', {'patient_id': str(paciente.id)}, content_type='application/json')
+    assert response.status_code == 400
@@ -0,0 +1,94 @@
+import pytest
+import io
+import os
+import uuid
+from datetime import datetime
+from django.test import Client
+from pacientes.busqueda import buscar_pacientes, reconstruir_terminos, terminos_busqueda
+from pacientes.importacion import importar_pacientes
+from pacientes.models import Paciente
+from valoraciones.models import PHQ9Assessment
+
+# Configurar host para testing local
+os.environ['MONGO_HOST'] = 'localhost'
+
+
+def crear_paciente(nombre, apellido, identificacion=None):
+    paciente = Paciente(
+        nombre=nombre,
+        apellido=apellido,
+        identificacion=identificacion or str(uuid.uuid4())[:8],
+        fecha_nacimiento=datetime(1990, 6, 6)
+    )
+    paciente.save()
+    return paciente
+
+
+def test_terminos_normalizados():
+    """Los términos van en minúsculas, sin tildes, por palabra y con la identificación compacta"""
+    assert terminos_busqueda('José Ángel', 'Muñoz-Peña', '1.234.567') == [
+        '1', '1234567', '234', '567', 'angel', 'jose', 'munoz', 'pena'
+    ]
+
+
+@pytest.mark.django_db
+def test_busqueda_por_prefijo_sin_tildes_ni_mayusculas():
+    """Cada palabra de la consulta es un prefijo de algún término del paciente"""
+    sufijo = uuid.uuid4().hex[:6]
+    buscado = crear_paciente(f'Mónica{sufijo}', 'Álvarez')
+    crear_paciente(f'Mónica{sufijo}', 'Beltrán')
+
+    resultados = buscar_pacientes(f'MONICA{sufijo} alv')
+
+    assert [p['id'] for p in resultados] == [str(buscado.id)]
+    assert resultados[0]['nombre'] == f'Mónica{sufijo}'
+    assert len(buscar_pacientes(f'monica{sufijo}')) == 2
+    assert buscar_pacientes(f'nadie{sufijo}') == []
+    assert buscar_pacientes('¡¿?!') == []
+
+
+@pytest.mark.django_db
+def test_busqueda_solo_pacientes_con_valoraciones():
+    """Los selectores de análisis solo muestran pacientes con valoraciones"""
+    sufijo = uuid.uuid4().hex[:6]
+    con_valoraciones = crear_paciente(f'Zoe{sufijo}', 'Vargas')
+    crear_paciente(f'Zoe{sufijo}', 'Vélez')
+    PHQ9Assessment(patient_id=con_valoraciones.id, responses=[1] * 9).save()
+
+    resultados = buscar_pacientes(f'zoe{sufijo}', con_valoraciones=True)
+
+    assert [p['id'] for p in resultados] == [str(con_valoraciones.id)]
+    assert resultados[0]['total_valoraciones'] == 1
+
+
+@pytest.mark.django_db
+def test_endpoint_de_busqueda_con_limite():
+    """GET /api/pacientes/search?q= responde sin redirección y respeta el límite"""
+    sufijo = uuid.uuid4().hex[:6]
+    for apellido in ('Ruiz', 'Rojas', 'Ríos'):
+        crear_paciente(f'Lía{sufijo}', apellido)
+    client = Client()
+
+    response = client.get('/api/pacientes/search', {'q': f'lia{sufijo}', 'limit': 2})
+
+    assert response.status_code == 200
+    assert len(response.json()['results']) == 2
+    assert client.get('/api/pacientes/search/', {'q': ''}).status_code == 400
+    assert client.get('/api/pacientes/search/', {'q': 'x', 'limit': 1000}).status_code == 400
+
+
+@pytest.mark.django_db
+def test_importacion_y_reconstruccion_mantienen_los_terminos():
+    """Los pacientes importados quedan indexados y el comando recalcula los anteriores"""
+    identificacion = uuid.uuid4().hex[:10]
+    archivo = io.BytesIO(f'nombre,apellido,identificacion,fecha_nacimiento\nÍñigo,Sáez,{identificacion},1980-01-01\n'.encode())
+
+    importar_pacientes(archivo, 'csv')
+
+    assert [p['identificacion'] for p in buscar_pacientes(f'inigo {identificacion[:4]}')] == [identificacion]
+
+    # Paciente creado antes de que existieran los términos de búsqueda
+    Paciente._get_collection().update_one({'identificacion': identificacion}, {'$unset': {'terminos_busqueda': 1}})
+    assert buscar_pacientes(identificacion) == []
+    assert reconstruir_terminos() >= 1
+    assert [p['identificacion'] for p in buscar_pacientes(identificacion)] == [identificacion]
@@ -0,0 +1,70 @@
+import pytest
+import os
+import csv
+import gzip
+import io
+import json
+import uuid
+from datetime import datetime
+from django.test import Client
+from pacientes.models import Paciente
+from valoraciones.models import PHQ9Assessment
+from valoraciones.export import iter_assessment_rows
+
+# Configurar host para testing local
+os.environ['MONGO_HOST'] = 'localhost'
+
+
+def crear_paciente_con_valoraciones(puntajes):
+    paciente = Paciente(
+        nombre="Iván",
+        apellido="Castro",
+        identificacion=str(uuid.uuid4())[:8],
+        fecha_nacimiento=datetime(1991, 11, 11)
+    )
+    paciente.save()
+    for dia, puntaje in enumerate(puntajes, start=1):
+        PHQ9Assessment(patient_id=paciente.id, responses=[puntaje] * 9, date_created=datetime(2022, 6, dia)).save()
+    return paciente
+
+
+@pytest.mark.django_db
+def test_filas_incluyen_paciente_y_respetan_filtros():
+    """Cada fila une la valoración con su paciente; los lotes pequeños no pierden filas"""
+    paciente = crear_paciente_con_valoraciones([0, 1, 2, 3])
+
+    filas = list(iter_assessment_rows(patient_id=paciente.id, batch_size=3))
+    assert [fila['total_score'] for fila in filas] == [0, 9, 18, 27]
+    assert filas[0]['identificacion'] == paciente.identificacion
+    assert filas[0]['respuesta_9'] == 0
+    assert filas[3]['severity_level'] == 'Severo'
+
+    severas = list(iter_assessment_rows(patient_id=paciente.id, severity='severo'))
+    assert [fila['total_score'] for fila in severas] == [27]
+
+    rango = list(iter_assessment_rows(
+        patient_id=paciente.id, date_from=datetime(2022, 6, 2), date_to=datetime(2022, 6, 3)
+    ))
+    assert len(rango) == 2
+
+
+@pytest.mark.django_db
+def test_endpoint_exporta_csv_gzip_y_ndjson():
+    """La exportación se descarga como CSV comprimido o NDJSON"""
+    paciente = crear_paciente_con_valoraciones([1, 2])
+    client = Client()
+
+    response = client.get(f'/api/assessments/export/?patient_id={paciente.id}&output=csv&compress=true')
+    assert response.status_code == 200
+    assert response['Content-Type'] == 'application/gzip'
+    contenido = gzip.decompress(b''.join(response.streaming_content)).decode('utf-8')
+    filas = list(csv.DictReader(io.StringIO(contenido)))
+    assert [fila['total_score'] for fila in filas] == ['9', '18']
+    assert filas[0]['date_created'] == '2022-06-01T00:00:00'
+
+    response = client.get('/api/pacientes/export/')
+    assert response.status_code == 200
+    filas = [json.loads(linea) for linea in b''.join(response.streaming_content).decode('utf-8').splitlines()]
+    exportado = next(fila for fila in filas if fila['id'] == str(paciente.id))
+    assert exportado['total_valoraciones'] == 2
+    assert exportado['fecha_nacimiento'] == '1991-11-11'
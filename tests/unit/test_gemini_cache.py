@@ -0,0 +1,57 @@
+import pytest
+from unittest.mock import patch
+from django.test import override_settings
+from psybot.utils.gemini_cache import GeminiCache, build_cache_key, analysis_cache_tags
+
+
+CONFIG = {"temperature": 0.7, "max_output_tokens": 1000, "top_p": 0.95, "top_k": 40}
+
+
+def test_clave_cache_determinista():
+    """La misma combinación de prompt, modelo y configuración produce la misma clave"""
+    clave1 = build_cache_key("prompt", "gemini-1.5-flash", CONFIG)
+    clave2 = build_cache_key("prompt", "gemini-1.5-flash", dict(reversed(list(CONFIG.items()))))
+
+    assert clave1 == clave2
+    assert len(clave1) == 64
+
+
+@pytest.mark.parametrize("prompt, modelo, cambios", [
+    ("otro prompt", "gemini-1.5-flash", {}),
+    ("prompt", "gemini-1.5-pro", {}),
+    ("prompt", "gemini-1.5-flash", {"temperature": 0.2}),
+    ("prompt", "gemini-1.5-flash", {"max_output_tokens": 500}),
+    ("prompt", "gemini-1.5-flash", {"top_k": 10}),
+])
+def test_clave_cache_cambia_con_parametros(prompt, modelo, cambios):
+    """Cualquier cambio en el prompt, el modelo o la configuración cambia la clave"""
+    base = build_cache_key("prompt", "gemini-1.5-flash", CONFIG)
+
+    assert build_cache_key(prompt, modelo, {**CONFIG, **cambios}) != base
+
+
+def test_etiquetas_invalidacion():
+    """Las etiquetas identifican la valoración y el paciente del análisis"""
+    assert analysis_cache_tags("a1", "p1") == ["assessment:a1", "patient:p1"]
+    assert analysis_cache_tags(patient_id="p1") == ["patient:p1"]
+
+
+@pytest.mark.django_db
+def test_tamano_cache_se_comprueba_por_intervalo():
+    """Las escrituras dentro del intervalo no vuelven a contar la colección"""
+    cache = GeminiCache()
+
+    with override_settings(GEMINI_CACHE_EVICTION_INTERVAL=60), \
+            patch.object(cache, '_evict_if_needed') as evict:
+        for index in range(5):
+            cache.set(build_cache_key(f"prompt {index}", "gemini-1.5-flash", CONFIG), "respuesta", "gemini-1.5-flash")
+
+    assert evict.call_count == 1
+
+    cache = GeminiCache()
+    with override_settings(GEMINI_CACHE_EVICTION_INTERVAL=0), \
+            patch.object(cache, '_evict_if_needed') as evict:
+        for index in range(3):
+            cache.set(build_cache_key(f"prompt {index}", "gemini-1.5-flash", CONFIG), "respuesta", "gemini-1.5-flash")
+
+    assert evict.call_count == 3
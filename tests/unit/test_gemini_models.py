@@ -0,0 +1,33 @@
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+from psybot.utils.gemini_models import GeminiModelRegistry
+
+
+@patch('psybot.utils.gemini_models.genai')
+def test_modelo_se_construye_una_vez_por_configuracion(mock_genai):
+    """Las peticiones concurrentes reutilizan el mismo modelo y la API se configura una vez"""
+    mock_genai.GenerativeModel.side_effect = lambda *args, **kwargs: object()
+    registro = GeminiModelRegistry()
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        modelos = list(pool.map(lambda _: registro.get_model("gemini-1.5-flash"), range(20)))
+    otro = registro.get_model("gemini-1.5-flash", {"temperature": 0.2})
+
+    assert all(modelo is modelos[0] for modelo in modelos)
+    assert otro is not modelos[0]
+    assert mock_genai.configure.call_count == 1
+    assert mock_genai.GenerativeModel.call_count == 2
+    assert registro.stats()['reused'] == 19
+
+
+@patch('psybot.utils.gemini_models.genai')
+def test_reinicio_despues_de_fork(mock_genai):
+    """Tras un fork se descartan los modelos heredados y se vuelve a configurar la API"""
+    registro = GeminiModelRegistry()
+    registro.get_model("gemini-1.5-flash")
+
+    registro.reset()
+    registro.get_model("gemini-1.5-flash")
+
+    assert mock_genai.configure.call_count == 2
+    assert mock_genai.GenerativeModel.call_count == 2
@@ -0,0 +1,61 @@
+import pytest
+import os
+import uuid
+from django.test import Client, override_settings
+from pacientes.models import Paciente
+from valoraciones.models import PHQ9Assessment
+from valoraciones.serializers import PHQ9AssessmentSerializer
+from psybot.utils.identity_map import RoundTripCounter, get_document, identity_map_scope
+
+# Configurar host para testing local
+os.environ['MONGO_HOST'] = 'localhost'
+
+
+@pytest.mark.django_db
+def test_crear_valoracion_consulta_el_paciente_una_vez(paciente):
+    """La validación del serializer y la del modelo comparten el paciente cargado"""
+    with identity_map_scope() as identity_map:
+        serializer = PHQ9AssessmentSerializer(data={
+            'patient_id': str(paciente.id),
+            'responses': [1] * 9
+        })
+        assert serializer.is_valid(), serializer.errors
+        serializer.save()
+
+    # Una sola consulta (serializer) y un acierto (PHQ9Assessment.validate)
+    assert identity_map.misses == 1
+    assert identity_map.hits == 1
+
+
+@pytest.mark.django_db
+def test_documento_inexistente_y_fuera_de_peticion(paciente):
+    """Los documentos inexistentes también se recuerdan; fuera de un scope se consulta directo"""
+    inexistente = uuid.uuid4()
+
+    with identity_map_scope() as identity_map:
+        assert get_document(PHQ9Assessment, inexistente) is None
+        assert get_document(PHQ9Assessment, inexistente) is None
+        assert get_document(Paciente, str(paciente.id)).id == paciente.id
+        assert get_document(Paciente, paciente.id).id == paciente.id
+    assert (identity_map.misses, identity_map.hits) == (2, 2)
+
+    assert get_document(Paciente, paciente.id).id == paciente.id
+
+
+def test_contador_de_comandos_por_peticion():
+    """El listener de pymongo suma los comandos solo dentro del scope activo"""
+    contador = RoundTripCounter()
+    contador.started(None)
+    with identity_map_scope() as identity_map:
+        contador.started(None)
+        contador.started(None)
+    assert identity_map.round_trips == 2
+
+
+@pytest.mark.django_db
+@override_settings(MONGO_ROUND_TRIP_HEADER=True)
+def test_cabeceras_de_depuracion():
+    """El middleware reporta los comandos a MongoDB y los aciertos del mapa"""
+    response = Client().get('/')
+    assert 'X-Mongo-Round-Trips' in response
+    assert 'X-Identity-Map-Hits' in response
@@ -0,0 +1,63 @@
+import pytest
+import os
+import io
+import json
+import uuid
+from datetime import date, datetime
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client
+from pacientes.models import Paciente
+from pacientes.importacion import importar_pacientes
+
+# Configurar host para testing local
+os.environ['MONGO_HOST'] = 'localhost'
+
+
+@pytest.mark.django_db
+def test_importar_csv_descarta_duplicados_e_invalidos():
+    """Las filas válidas se insertan por lotes; duplicados (en la base o en el archivo) e inválidos se informan"""
+    existente = Paciente(
+        nombre="Rosa",
+        apellido="León",
+        identificacion=str(uuid.uuid4())[:8],
+        fecha_nacimiento=datetime(1970, 7, 7)
+    )
+    existente.save()
+    nuevas = [str(uuid.uuid4())[:8] for _ in range(3)]
+    contenido = '\n'.join([
+        'nombre,apellido,identificacion,fecha_nacimiento',
+        f'Ana,Gómez,{nuevas[0]},1990-01-01',
+        f'Luis,Pardo,{existente.identificacion},1985-05-05',
+        f'Eva,Mora,{nuevas[1]},1992-02-30',
+        f'Juan,Díaz,{nuevas[2]},1988-08-08',
+        f'Juan,Díaz,{nuevas[2]},1988-08-08',
+        ',Sin nombre,x1,1990-01-01',
+    ]).encode('utf-8')
+
+    resultado = importar_pacientes(io.BytesIO(contenido), 'csv', batch_size=1)
+
+    assert (resultado['procesadas'], resultado['insertadas'], resultado['duplicadas'], resultado['invalidas']) == (6, 2, 2, 2)
+    assert sorted(error['linea'] for error in resultado['errores']) == [3, 4, 6, 7]
+    assert Paciente.objects(identificacion__in=nuevas).count() == 2
+    importado = Paciente.objects.get(identificacion=nuevas[0])
+    assert importado.apellido == "Gómez"
+    assert importado.fecha_nacimiento == date(1990, 1, 1)
+
+
+@pytest.mark.django_db
+def test_endpoint_importa_ndjson():
+    """POST /api/pacientes/import/ recibe un archivo NDJSON y devuelve el resumen"""
+    identificacion = str(uuid.uuid4())[:8]
+    lineas = [
+        json.dumps({'nombre': 'Sara', 'apellido': 'Vega', 'identificacion': identificacion,
+                    'fecha_nacimiento': '2000-10-10'}),
+        '{no es json',
+    ]
+    archivo = SimpleUploadedFile('pacientes.ndjson', '\n'.join(lineas).encode('utf-8'))
+
+    response = Client().post('/api/pacientes/import/', {'file': archivo})
+
+    assert response.status_code == 200
+    assert response.json()['insertadas'] == 1
+    assert response.json()['invalidas'] == 1
+    assert Paciente.objects(identificacion=identificacion).count() == 1
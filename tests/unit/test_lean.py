@@ -0,0 +1,72 @@
+import pytest
+import os
+import json
+import uuid
+from datetime import datetime
+from rest_framework.renderers import JSONRenderer
+from pacientes.models import Paciente
+from pacientes.serializers import PacienteSerializer
+from valoraciones.models import PHQ9Assessment
+from valoraciones.serializers import PHQ9AssessmentSerializer
+from psybot.lean import get_lean_converter
+
+# Configurar host para testing local
+os.environ['MONGO_HOST'] = 'localhost'
+
+
+def render(data):
+    return JSONRenderer().render(data)
+
+
+@pytest.mark.django_db
+def test_salida_identica_al_serializer():
+    """El convertidor liviano produce exactamente los mismos bytes que el serializer"""
+    con_resumen = Paciente(
+        nombre="Nora",
+        apellido="Paz",
+        identificacion=str(uuid.uuid4())[:8],
+        fecha_nacimiento=datetime(1995, 12, 24)
+    )
+    con_resumen.save()
+    sin_resumen = Paciente(
+        nombre="Óscar",
+        apellido="Ñañez",
+        identificacion=str(uuid.uuid4())[:8],
+        fecha_nacimiento=datetime(1960, 1, 31)
+    )
+    sin_resumen.save()
+    PHQ9Assessment(patient_id=con_resumen.id, responses=[3, 2, 1, 0, 3, 2, 1, 0, 3]).save()
+
+    convertidor = get_lean_converter(PacienteSerializer)
+    for paciente_id in (con_resumen.id, sin_resumen.id):
+        documento = Paciente.objects.get(id=paciente_id)
+        crudo = Paciente.objects(id=paciente_id).as_pymongo().first()
+        assert render(convertidor(crudo)) == render(PacienteSerializer(documento).data)
+
+    convertidor = get_lean_converter(PHQ9AssessmentSerializer)
+    documento = PHQ9Assessment.objects(patient_id=con_resumen.id).first()
+    crudo = PHQ9Assessment.objects(id=documento.id).as_pymongo().first()
+    assert render(convertidor(crudo)) == render(PHQ9AssessmentSerializer(documento).data)
+
+
+@pytest.mark.django_db
+def test_listado_liviano_pagina_igual():
+    """El listado liviano conserva la paginación por cursor"""
+    from django.test import Client
+    paciente = Paciente(
+        nombre="Pía",
+        apellido="Ruiz",
+        identificacion=str(uuid.uuid4())[:8],
+        fecha_nacimiento=datetime(1999, 9, 9)
+    )
+    paciente.save()
+    for dia in range(1, 4):
+        PHQ9Assessment(patient_id=paciente.id, responses=[1] * 9, date_created=datetime(2021, 3, dia)).save()
+
+    client = Client()
+    primera = client.get(f'/api/assessments/?patient_id={paciente.id}&page_size=2').json()
+    segunda = client.get(primera['next']).json()
+
+    fechas = [v['date_created'] for v in primera['results'] + segunda['results']]
+    assert fechas == ['2021-03-03T00:00:00Z', '2021-03-02T00:00:00Z', '2021-03-01T00:00:00Z']
+    assert segunda['next'] is None
@@ -0,0 +1,102 @@
+import pytest
+import json
+import time
+from unittest.mock import patch
+from django.test import override_settings
+from psybot.utils.gemini_cache import build_cache_key
+from psybot.utils.gemini_client import gemini_client
+from psybot.utils.gemini_models import gemini_models
+from psybot.utils.llm_backends import FakeModel, LLMBackendError, ReplayModel
+
+FAKE = dict(
+    GEMINI_BACKEND='fake',
+    GEMINI_CACHE_ENABLED=False,
+    GEMINI_FAKE_LATENCY_MS=30,
+    GEMINI_FAKE_LATENCY_DISTRIBUTION='fixed',
+    GEMINI_FAKE_TOKENS_PER_SECOND=0,
+    GEMINI_FAKE_OUTPUT_TOKENS=50,
+    GEMINI_FAKE_ERROR_RATE=0,
+)
+
+
+@pytest.fixture(autouse=True)
+def registro_limpio():
+    gemini_models.reset()
+    yield
+    gemini_models.reset()
+
+
+@override_settings(**FAKE)
+def test_backend_fake_determinista_con_latencia():
+    """El backend fake responde sin red, con el mismo texto para el mismo prompt y la latencia configurada"""
+    assert gemini_client.is_configured()
+    assert isinstance(gemini_models.get_model(), FakeModel)
+
+    inicio = time.perf_counter()
+    primera = gemini_client.generate_text("prompt de prueba", use_cache=False)
+    duracion = time.perf_counter() - inicio
+
+    assert primera == gemini_client.generate_text("prompt de prueba", use_cache=False)
+    assert primera != gemini_client.generate_text("otro prompt", use_cache=False)
+    assert 0.03 <= duracion < 1
+    assert 150 <= len(primera) <= 250
+
+    # El streaming entrega el mismo texto en varios fragmentos
+    fragmentos = list(gemini_client.stream_text("prompt de prueba", use_cache=False))
+    assert len(fragmentos) > 1
+    assert ''.join(fragmentos) == primera
+
+
+@override_settings(**{**FAKE, 'GEMINI_FAKE_ERROR_RATE': 1.0, 'GEMINI_FAKE_LATENCY_MS': 0})
+def test_backend_fake_errores_simulados():
+    """Con tasa de errores 1 cada llamada falla como fallaría Gemini"""
+    assert gemini_client.generate_text("prompt", use_cache=False) is None
+    with pytest.raises(LLMBackendError):
+        list(gemini_client.stream_text("prompt", use_cache=False))
+
+
+def test_backend_replay_graba_y_reproduce(tmp_path):
+    """En modo record se guardan los pares prompt -> respuesta; en replay se reproducen sin el modelo real"""
+    grabacion = {'GEMINI_BACKEND': 'replay', 'GEMINI_REPLAY_DIR': str(tmp_path), 'GEMINI_REPLAY_LATENCY': False}
+
+    with override_settings(**{**FAKE, **grabacion, 'GEMINI_REPLAY_MODE': 'record'}), \
+            patch.object(gemini_models, '_build_gemini_model', lambda name, config: FakeModel(name, config)):
+        grabada = gemini_client.generate_text("analiza esto", use_cache=False)
+        grabada_stream = ''.join(gemini_client.stream_text("analiza en streaming", use_cache=False))
+
+    archivos = sorted(tmp_path.glob('*.json'))
+    assert len(archivos) == 2
+    contenidos = [json.loads(archivo.read_text(encoding='utf-8')) for archivo in archivos]
+    assert {c['prompt'] for c in contenidos} == {"analiza esto", "analiza en streaming"}
+
+    gemini_models.reset()
+    with override_settings(**{**FAKE, **grabacion, 'GEMINI_REPLAY_MODE': 'replay', 'GEMINI_API_KEY': None}):
+        assert gemini_client.is_configured()
+        assert isinstance(gemini_models.get_model(), ReplayModel)
+        assert gemini_client.generate_text("analiza esto", use_cache=False) == grabada
+        assert ''.join(gemini_client.stream_text("analiza en streaming", use_cache=False)) == grabada_stream
+        # Un prompt no grabado falla
+        assert gemini_client.generate_text("prompt nuevo", use_cache=False) is None
+
+
+def test_clave_cache_separa_los_backends():
+    """Las respuestas de los backends simulados no se sirven desde la caché al volver a Gemini"""
+    config = gemini_client.build_generation_config()
+    claves = {}
+    for backend in ('gemini', 'fake', 'replay'):
+        with override_settings(GEMINI_BACKEND=backend):
+            claves[backend] = build_cache_key("mismo prompt", "gemini-1.5-flash", config)
+
+    assert len(set(claves.values())) == 3
+
+
+def test_reset_no_espera_el_lock_heredado():
+    """Tras un fork el lock puede estar tomado por un hilo que ya no existe: reset lo reemplaza"""
+    lock = FakeModel._lock
+    lock.acquire()
+    try:
+        FakeModel.reset()
+        assert FakeModel._lock is not lock
+        assert FakeModel._random is None
+    finally:
+        lock.release()
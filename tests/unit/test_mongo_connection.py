@@ -0,0 +1,16 @@
+import mongoengine.connection
+from psybot.utils.mongo import register_mongo_connection, reset_mongo_connections
+
+
+def test_conexion_se_registra_sin_abrirse():
+    """Registrar la conexión no crea el cliente; tras un fork se vuelve a registrar"""
+    register_mongo_connection(alias='prueba-diferida', db='psybot_test_db', host='localhost', port=27017)
+
+    assert 'prueba-diferida' not in mongoengine.connection._connections
+    assert mongoengine.connection._connection_settings['prueba-diferida']['name'] == 'psybot_test_db'
+
+    reset_mongo_connections()
+
+    assert 'prueba-diferida' not in mongoengine.connection._connections
+    assert 'prueba-diferida' in mongoengine.connection._connection_settings
+    mongoengine.connection.disconnect('prueba-diferida')
@@ -0,0 +1,88 @@
+import pytest
+import os
+import json
+from datetime import datetime, timedelta
+from unittest.mock import patch
+from django.core.exceptions import ImproperlyConfigured
+from django.test import Client, override_settings
+from pymongo.read_preferences import SecondaryPreferred
+from pacientes.models import Paciente
+from valoraciones.models import PHQ9Assessment
+from valoraciones.summaries import load_trend_assessments
+from psybot.utils import mongo
+from psybot.utils.mongo import (
+    ANALYTICS_ALIAS, analytics_collection, build_read_preference, build_write_concern, get_write_concern
+)
+
+# Configurar host para testing local
+os.environ['MONGO_HOST'] = 'localhost'
+
+
+def test_conexion_de_analitica_lee_de_secundarios():
+    """La conexión de analítica se registra con secondaryPreferred, su pool y su maxTimeMS"""
+    registrada = mongo._registered[ANALYTICS_ALIAS]
+
+    assert isinstance(registrada['read_preference'], SecondaryPreferred)
+    assert registrada['maxPoolSize'] == 20
+    assert mongo.get_max_time_ms(ANALYTICS_ALIAS) == 30000
+    assert mongo.get_max_time_ms() is None
+
+
+def test_preferencias_de_lectura_y_write_concerns():
+    """Los valores configurados se traducen a opciones de pymongo"""
+    assert build_read_preference('secondaryPreferred', 120).max_staleness == 120
+    with pytest.raises(ImproperlyConfigured):
+        build_read_preference('secundario')
+
+    assert build_write_concern('majority', 5000) == {'w': 'majority', 'wtimeout': 5000}
+    assert build_write_concern('1') == {'w': 1}
+    assert build_write_concern('0', 5000) == {'w': 0}
+    with override_settings(MONGO_WRITE_CONCERNS={'assessment_bulk': '2'}, MONGO_WRITE_TIMEOUT_MS=1000):
+        assert get_write_concern('assessment_bulk') == {'w': 2, 'wtimeout': 1000}
+
+
+@pytest.mark.django_db
+def test_crear_valoracion_usa_el_write_concern_del_endpoint(paciente):
+    """POST /api/assessments/ guarda con el write concern de 'assessment_create'"""
+    save = PHQ9Assessment.save
+
+    with override_settings(MONGO_WRITE_CONCERNS={'assessment_create': 'majority'}, MONGO_WRITE_TIMEOUT_MS=2500), \
+            patch.object(PHQ9Assessment, 'save', autospec=True, side_effect=save) as guardar:
+        response = Client().post(
+            '/api/assessments/',
+            data=json.dumps({'patient_id': str(paciente.id), 'responses': [1] * 9}),
+            content_type='application/json'
+        )
+
+    assert response.status_code == 201
+    assert guardar.call_args.kwargs['write_concern'] == {'w': 'majority', 'wtimeout': 2500}
+
+
+@pytest.mark.django_db
+def test_exportacion_lee_por_la_conexion_de_analitica(paciente):
+    """Lo escrito por la conexión principal se lee por la de analítica"""
+    documento = analytics_collection(Paciente).find_one({'_id': paciente.id})
+
+    assert documento['identificacion'] == paciente.identificacion
+
+
+@pytest.mark.django_db
+def test_tendencias_releen_del_primario_si_la_replica_esta_atrasada(paciente):
+    """Si la réplica no tiene la última valoración del resumen, se lee del primario"""
+    inicio = datetime(2024, 1, 1)
+    valoraciones = []
+    for dia in range(3):
+        valoracion = PHQ9Assessment(patient_id=paciente.id, responses=[dia] * 9, date_created=inicio + timedelta(days=dia))
+        valoracion.save()
+        valoraciones.append(valoracion)
+    paciente = Paciente.objects.get(id=paciente.id)
+
+    # Réplica al día
+    assert [v.id for v in load_trend_assessments(paciente.id, paciente)] == [v.id for v in valoraciones]
+
+    # Réplica sin la última valoración
+    atrasada = lambda document_class: document_class.objects(id__in=[v.id for v in valoraciones[:2]])
+    with patch('valoraciones.summaries.analytics_queryset', side_effect=atrasada):
+        recuperadas = load_trend_assessments(paciente.id, paciente)
+
+    assert [v.id for v in recuperadas] == [v.id for v in valoraciones]
@@ -0,0 +1,30 @@
+import pytest
+import uuid
+from datetime import datetime
+from types import SimpleNamespace
+from rest_framework.exceptions import NotFound
+from psybot.pagination import KeysetPagination
+
+
+def crear_paginador():
+    paginador = KeysetPagination()
+    paginador.keyset_field = 'date_created'
+    return paginador
+
+
+def test_cursor_conserva_la_clave():
+    """El cursor codifica la fecha y el id del último documento de la página"""
+    paginador = crear_paginador()
+    documento = SimpleNamespace(id=uuid.uuid4(), date_created=datetime(2024, 3, 1, 10, 30, 15, 123000))
+
+    cursor = paginador.encode_cursor(documento)
+
+    assert '=' not in cursor
+    assert paginador.decode_cursor(cursor) == (documento.date_created, documento.id)
+
+
+@pytest.mark.parametrize("cursor", ["abc", "eyJ2IjoiMjAyNCJ9", "%%%"])
+def test_cursor_alterado_es_rechazado(cursor):
+    """Un cursor que no fue generado por el servidor responde 404"""
+    with pytest.raises(NotFound):
+        crear_paginador().decode_cursor(cursor)
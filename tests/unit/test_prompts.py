@@ -0,0 +1,102 @@
+import pytest
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+from datetime import datetime, timedelta
+from django.test import override_settings
+from psybot.utils.gemini_client import gemini_client
+from psybot.utils.prompts import (
+    TokenUsage, check_context, estimate_tokens, prompt_template, render_prompt, token_usage
+)
+from valoraciones.analysis import PHQ9_QUESTIONS, create_clinical_analysis_prompt, create_trend_analysis_prompt
+
+
+def valoracion(semana, puntaje=1):
+    return SimpleNamespace(
+        id=semana,
+        responses=[puntaje] * 9,
+        total_score=puntaje * 9,
+        date_created=datetime(2024, 1, 1) + timedelta(weeks=semana)
+    )
+
+
+PACIENTE = SimpleNamespace(id=1, nombre="Lucía", apellido="Paredes")
+
+
+def test_plantilla_sin_sangria_ni_espacios_finales():
+    """Las plantillas se normalizan al importar y las secciones vacías no dejan huecos"""
+    plantilla = prompt_template("""
+        TÍTULO   
+
+        {seccion}
+
+        1. PUNTO:
+           - detalle
+    """)
+
+    assert plantilla == "TÍTULO\n\n{seccion}\n\n1. PUNTO:\n   - detalle"
+    assert render_prompt(plantilla, seccion='') == "TÍTULO\n\n1. PUNTO:\n   - detalle"
+
+
+def test_prompt_clinico_compacto_sin_perder_contenido():
+    """El prompt no lleva la sangría del código y conserva todas las preguntas y secciones"""
+    prompt = create_clinical_analysis_prompt(valoracion(0, 2), PACIENTE, 40)
+
+    assert prompt.startswith("ANÁLISIS CLÍNICO PHQ-9")
+    assert not any(linea.startswith('    ') or linea != linea.rstrip() for linea in prompt.splitlines())
+    assert all(f"{i}. {pregunta}: 2 (Más de la mitad de los días)" in prompt
+               for i, pregunta in enumerate(PHQ9_QUESTIONS, 1))
+    assert "- Nombre: Lucía Paredes" in prompt
+    assert "5. CONSIDERACIONES ADICIONALES:\n   - Aspectos psicoeducativos relevantes" in prompt
+
+
+def test_presupuesto_recorta_el_historial_mas_antiguo():
+    """Si el detalle no cabe en el presupuesto se omiten las valoraciones más antiguas"""
+    valoraciones = [valoracion(semana, semana % 4) for semana in range(200)]
+
+    completo = create_trend_analysis_prompt(valoraciones, PACIENTE)
+    with override_settings(GEMINI_INPUT_TOKEN_BUDGETS={'trends': 1200}):
+        recortado = create_trend_analysis_prompt(valoraciones, PACIENTE)
+
+    assert estimate_tokens(completo) > 1200 >= estimate_tokens(recortado)
+    assert "NÚMERO DE EVALUACIONES: 200" in recortado
+    assert "valoraciones anteriores omitidas por longitud" in recortado
+    # Se conservan las más recientes
+    assert "- 2027-10-25: 27/27" in recortado and "- 2024-01-01:" not in recortado
+
+
+def test_registro_de_tokens_y_contexto():
+    """Se usan los conteos de Gemini si vienen y la estimación local si no"""
+    registro = TokenUsage()
+    uso = SimpleNamespace(prompt_token_count=120, candidates_token_count=300)
+    registro.record('clinical', 'x' * 400, 'y' * 40, SimpleNamespace(usage_metadata=uso))
+    registro.record('clinical', 'x' * 400, 'y' * 40, MagicMock())
+    registro.record_cached('clinical')
+
+    assert registro.stats()['clinical'] == {
+        'calls': 2, 'cached': 1, 'input_tokens': 220, 'output_tokens': 310,
+        'max_input_tokens': 120, 'avg_input_tokens': 110.0,
+    }
+
+    with override_settings(GEMINI_CONTEXT_TOKENS=1000):
+        assert check_context('x' * 400, 500) == 100
+        with pytest.raises(ValueError):
+            check_context('x' * 4000, 500)
+
+
+@override_settings(GEMINI_CACHE_ENABLED=False)
+@patch('psybot.utils.gemini_client.gemini_models')
+def test_cliente_registra_tokens_por_endpoint(mock_gemini_models):
+    """Cada generación del cliente suma sus tokens al endpoint indicado"""
+    modelo = MagicMock()
+    modelo.generate_content.return_value = SimpleNamespace(
+        text="respuesta",
+        usage_metadata=SimpleNamespace(prompt_token_count=42, candidates_token_count=7)
+    )
+    mock_gemini_models.get_model.return_value = modelo
+    antes = token_usage.stats().get('prueba_tokens', {'calls': 0, 'input_tokens': 0})
+
+    assert gemini_client.generate_text("hola", endpoint='prueba_tokens') == "respuesta"
+
+    despues = token_usage.stats()['prueba_tokens']
+    assert despues['calls'] - antes['calls'] == 1
+    assert despues['input_tokens'] - antes['input_tokens'] == 42
@@ -0,0 +1,35 @@
+import pytest
+from psybot.utils.query_plans import analyze_plan
+
+
+def explain(winning_plan):
+    return {'queryPlanner': {'winningPlan': winning_plan}}
+
+
+def test_plan_con_indice_sin_problemas():
+    """Un plan que recorre un índice en el orden pedido no tiene problemas"""
+    resultado = analyze_plan(explain({
+        'stage': 'LIMIT',
+        'inputStage': {
+            'stage': 'FETCH',
+            'inputStage': {'stage': 'IXSCAN', 'indexName': 'patient_id_1_date_created_-1__id_-1'}
+        }
+    }))
+
+    assert resultado['stages'] == ['LIMIT', 'FETCH', 'IXSCAN']
+    assert resultado['indexes'] == ['patient_id_1_date_created_-1__id_-1']
+    assert resultado['problems'] == []
+
+
+@pytest.mark.parametrize("plan, etapa", [
+    ({'stage': 'COLLSCAN'}, 'COLLSCAN'),
+    ({'stage': 'SORT', 'inputStage': {'stage': 'FETCH', 'inputStage': {'stage': 'IXSCAN'}}}, 'SORT'),
+    # Motor de ejecución basado en slots (MongoDB 5+): el plan está anidado en queryPlan
+    ({'queryPlan': {'stage': 'SORT', 'inputStage': {'stage': 'COLLSCAN'}}}, 'COLLSCAN'),
+    ({'stage': 'SORT_MERGE', 'inputStages': [{'stage': 'IXSCAN'}, {'stage': 'COLLSCAN'}]}, 'COLLSCAN'),
+])
+def test_plan_sin_indice_adecuado(plan, etapa):
+    """Los recorridos completos y los ordenamientos en memoria se reportan"""
+    resultado = analyze_plan(explain(plan))
+
+    assert any(problema.startswith(etapa) for problema in resultado['problems'])
@@ -0,0 +1,55 @@
+import pytest
+import os
+import uuid
+from datetime import datetime, timedelta
+from pacientes.models import Paciente
+from valoraciones.models import PHQ9Assessment
+from valoraciones.summaries import build_patient_summary
+
+# Configurar host para testing local
+os.environ['MONGO_HOST'] = 'localhost'
+
+
+def crear_valoracion(paciente, puntaje, fecha):
+    valoracion = PHQ9Assessment(
+        patient_id=paciente.id,
+        responses=[puntaje] * 9,
+        date_created=fecha
+    )
+    valoracion.save()
+    return valoracion
+
+
+@pytest.mark.django_db
+def test_resumen_se_actualiza_al_crear_y_eliminar():
+    """El resumen del paciente refleja las valoraciones creadas (en cualquier orden) y eliminadas"""
+    paciente = Paciente(
+        nombre="Carlos",
+        apellido="Rojas",
+        identificacion=str(uuid.uuid4())[:8],
+        fecha_nacimiento=datetime(1985, 3, 10)
+    )
+    paciente.save()
+    inicio = datetime(2024, 1, 10)
+
+    crear_valoracion(paciente, 1, inicio)
+    ultima = crear_valoracion(paciente, 2, inicio + timedelta(days=7))
+    # Valoración registrada tarde, con fecha anterior a las demás
+    crear_valoracion(paciente, 3, inicio - timedelta(days=7))
+
+    paciente.reload()
+    resumen = paciente.resumen
+    assert resumen.total_valoraciones == 3
+    assert resumen.ultimo_puntaje == 18
+    assert resumen.puntaje_anterior == 9
+    assert resumen.nivel_severidad == "Moderadamente severo"
+    assert (resumen.puntaje_minimo, resumen.puntaje_maximo) == (9, 27)
+    assert resumen.primera_valoracion == inicio - timedelta(days=7)
+    assert resumen.ultima_valoracion_id == ultima.id
+
+    ultima.delete()
+    paciente.reload()
+    assert paciente.resumen.total_valoraciones == 2
+    assert paciente.resumen.ultimo_puntaje == 9
+    assert paciente.resumen.puntaje_anterior == 27
+    assert paciente.resumen.to_mongo() == build_patient_summary(paciente.id).to_mongo()
@@ -0,0 +1,137 @@
+import pytest
+import os
+import uuid
+from unittest.mock import patch
+from datetime import datetime, timedelta
+from django.test import override_settings
+from pacientes.models import Paciente
+from valoraciones.analysis import create_trend_analysis_prompt, prepare_trend_analysis
+from valoraciones.jobs import claim_next_job, execute_job
+from valoraciones.models import AnalysisJob, PHQ9Assessment
+from valoraciones.trend_summary import TrendSummary, summarize_history
+
+# Configurar host para testing local
+os.environ['MONGO_HOST'] = 'localhost'
+
+INICIO = datetime(2024, 1, 1)
+
+
+def agregar_valoraciones(paciente, desde, cantidad):
+    for semana in range(desde, desde + cantidad):
+        PHQ9Assessment(
+            patient_id=paciente.id,
+            responses=[semana % 4] * 9,
+            date_created=INICIO + timedelta(weeks=semana)
+        ).save()
+
+
+def historial(paciente):
+    return list(PHQ9Assessment.objects(patient_id=paciente.id).order_by('date_created'))
+
+
+@pytest.mark.django_db
+@override_settings(TREND_SUMMARY_ENABLED=True, TREND_SUMMARY_WINDOW=4)
+@patch('valoraciones.trend_summary.gemini_client')
+def test_resumen_incremental_con_marca_de_agua(mock_gemini_client, paciente):
+    """El historial se compacta por ventanas y luego solo se envían el resumen y las valoraciones nuevas"""
+    prompts = []
+
+    def generar(prompt, **kwargs):
+        prompts.append(prompt)
+        return f"resumen {len(prompts)}"
+
+    mock_gemini_client.generate_text.side_effect = generar
+    agregar_valoraciones(paciente, 0, 20)
+
+    # 16 valoraciones en 4 ventanas y una combinación; las 4 últimas quedan en el detalle
+    resumen, resumidas = summarize_history(paciente.id, historial(paciente))
+    assert (resumen, resumidas) == ("resumen 5", 16)
+    assert len(prompts) == 5
+    assert 'COMBINACIÓN DE RESÚMENES' in prompts[-1]
+
+    # Sin valoraciones nuevas que superen la ventana no se llama a Gemini
+    assert summarize_history(paciente.id, historial(paciente)) == ("resumen 5", 16)
+    assert len(prompts) == 5
+
+    # Las 4 valoraciones que salen del detalle se incorporan con el resumen anterior
+    agregar_valoraciones(paciente, 20, 3)
+    valoraciones = historial(paciente)
+    resumen, resumidas = summarize_history(paciente.id, valoraciones)
+    assert (resumen, resumidas) == ("resumen 6", 20)
+    assert 'RESUMEN ANTERIOR:\nresumen 5' in prompts[-1]
+    assert prompts[-1].count('respuestas [') == 4
+
+    prompt = create_trend_analysis_prompt(valoraciones, paciente, history=(resumen, resumidas))
+    assert 'RESUMEN DEL HISTORIAL ANTERIOR (20 valoraciones, 2024-01-01 a 2024-05-13)' in prompt
+    assert 'NÚMERO DE EVALUACIONES: 23' in prompt
+    assert prompt.count('/27 (') == 3
+
+    guardado = TrendSummary.objects.get(patient_id=paciente.id)
+    assert guardado.assessments_count == 20
+    assert guardado.watermark_id == valoraciones[19].id
+
+
+@pytest.mark.django_db
+@override_settings(TREND_SUMMARY_ENABLED=True, TREND_SUMMARY_WINDOW=4)
+@patch('valoraciones.trend_summary.gemini_client')
+def test_resumen_se_reconstruye_si_cambia_el_historial(mock_gemini_client, paciente):
+    """Editar una valoración ya resumida descarta el resumen; si Gemini falla se conserva el anterior"""
+    mock_gemini_client.generate_text.return_value = "resumen inicial"
+    agregar_valoraciones(paciente, 0, 6)
+    assert summarize_history(paciente.id, historial(paciente)) == ("resumen inicial", 4)
+
+    primera = historial(paciente)[0]
+    primera.responses = [3] * 9
+    primera.save()
+    assert TrendSummary.objects(patient_id=paciente.id).count() == 0
+
+    mock_gemini_client.generate_text.return_value = "resumen corregido"
+    assert summarize_history(paciente.id, historial(paciente)) == ("resumen corregido", 4)
+
+    # Si falla la actualización se usa el resumen guardado y el detalle crece
+    agregar_valoraciones(paciente, 6, 4)
+    mock_gemini_client.generate_text.return_value = None
+    assert summarize_history(paciente.id, historial(paciente)) == ("resumen corregido", 4)
+
+    # Historiales cortos no usan resumen
+    otro = Paciente(
+        nombre="Tomás",
+        apellido="Herrera",
+        identificacion=str(uuid.uuid4())[:8],
+        fecha_nacimiento=datetime(1980, 2, 2)
+    )
+    otro.save()
+    agregar_valoraciones(otro, 0, 4)
+    assert summarize_history(otro.id, historial(otro)) == (None, 0)
+
+
+@pytest.mark.django_db
+@override_settings(TREND_SUMMARY_ENABLED=True, TREND_SUMMARY_WINDOW=4, GEMINI_INPUT_TOKEN_BUDGETS={})
+@patch('valoraciones.trend_summary.gemini_client')
+def test_resumen_inicial_se_construye_en_un_trabajo(mock_gemini_client, paciente):
+    """La petición HTTP no compacta el historial: encola un trabajo y mientras tanto detalla todo"""
+    mock_gemini_client.generate_text.side_effect = lambda prompt, **kwargs: "resumen del trabajo"
+    AnalysisJob.objects(status__in=[AnalysisJob.STATUS_PENDING, AnalysisJob.STATUS_RUNNING]).delete()
+    agregar_valoraciones(paciente, 0, 40)
+
+    prompt, metadata, _ = prepare_trend_analysis(paciente.id)
+    prepare_trend_analysis(paciente.id)
+
+    assert mock_gemini_client.generate_text.call_count == 0
+    assert 'RESUMEN DEL HISTORIAL ANTERIOR' not in prompt
+    assert prompt.count('/27 (') == 40
+    jobs = AnalysisJob.objects(job_type='trend_summary', params__patient_id=str(paciente.id))
+    assert jobs.count() == 1
+
+    claimed = claim_next_job('worker-test', visibility_timeout=60)
+    assert claimed.id == jobs.first().id
+    execute_job(claimed, 'worker-test', visibility_timeout=60)
+
+    # 36 valoraciones: 9 ventanas, 2 combinaciones (la novena pasa sola) y la final
+    assert mock_gemini_client.generate_text.call_count == 12
+    assert jobs.first().status == AnalysisJob.STATUS_SUCCEEDED
+    assert jobs.first().result['assessments_summarized'] == 36
+
+    prompt, _, _ = prepare_trend_analysis(paciente.id)
+    assert 'RESUMEN DEL HISTORIAL ANTERIOR (36 valoraciones' in prompt
+    assert prompt.count('/27 (') == 4
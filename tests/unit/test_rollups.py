@@ -0,0 +1,88 @@
+import pytest
+import os
+import uuid
+from datetime import datetime, timedelta
+from pacientes.models import Paciente
+from valoraciones.models import PHQ9Assessment
+from valoraciones.rollups import DailyRollup, rebuild_rollups
+
+# Configurar host para testing local
+os.environ['MONGO_HOST'] = 'localhost'
+
+
+def rollup_del_dia(fecha):
+    rollup = DailyRollup.objects(day=fecha.strftime('%Y-%m-%d')).first()
+    if rollup is None:
+        return {'assessments': 0, 'new_patients': 0, 'score_sum': 0, 'severity': {}}
+    return {
+        'assessments': rollup.assessments,
+        'new_patients': rollup.new_patients,
+        'score_sum': rollup.score_sum,
+        'severity': {key: total for key, total in rollup.severity.items() if total},
+    }
+
+
+@pytest.mark.django_db
+def test_rollup_se_actualiza_al_guardar_y_eliminar():
+    """Crear, editar y eliminar valoraciones ajusta los contadores del día correspondiente"""
+    dia = datetime(2003, 5, 20, 10, 30)
+    paciente = Paciente(
+        nombre="Lucía",
+        apellido="Mejía",
+        identificacion=str(uuid.uuid4())[:8],
+        fecha_nacimiento=datetime(1990, 1, 1),
+        fecha_creacion=dia
+    )
+    paciente.save()
+
+    leve = PHQ9Assessment(patient_id=paciente.id, responses=[1] * 9, date_created=dia)
+    leve.save()
+    severa = PHQ9Assessment(patient_id=paciente.id, responses=[3] * 9, date_created=dia + timedelta(hours=2))
+    severa.save()
+
+    assert rollup_del_dia(dia) == {
+        'assessments': 2,
+        'new_patients': 1,
+        'score_sum': 36,
+        'severity': {'leve': 1, 'severo': 1},
+    }
+
+    # Editar el puntaje mueve la valoración de banda
+    leve.responses = [0] * 9
+    leve.save()
+    assert rollup_del_dia(dia)['severity'] == {'minimo': 1, 'severo': 1}
+    assert rollup_del_dia(dia)['score_sum'] == 27
+
+    severa.delete()
+    assert rollup_del_dia(dia) == {
+        'assessments': 1,
+        'new_patients': 1,
+        'score_sum': 0,
+        'severity': {'minimo': 1},
+    }
+
+
+@pytest.mark.django_db
+def test_rebuild_rollups_coincide_con_los_contadores():
+    """La reconstrucción por agregación produce los mismos contadores que las escrituras"""
+    dia = datetime(2004, 8, 3, 15, 0)
+    paciente = Paciente(
+        nombre="Andrés",
+        apellido="Paz",
+        identificacion=str(uuid.uuid4())[:8],
+        fecha_nacimiento=datetime(1980, 6, 15),
+        fecha_creacion=dia
+    )
+    paciente.save()
+    for puntaje in (0, 1, 2):
+        PHQ9Assessment(patient_id=paciente.id, responses=[puntaje] * 9, date_created=dia).save()
+
+    esperado = rollup_del_dia(dia)
+    # Un contador desfasado (por ejemplo, tras un borrado masivo) se corrige al reconstruir
+    DailyRollup.objects(day=dia.strftime('%Y-%m-%d')).update_one(inc__assessments=5)
+
+    rebuild_rollups()
+
+    assert rollup_del_dia(dia) == esperado
+    assert esperado['assessments'] == 3
+    assert esperado['score_sum'] == 27
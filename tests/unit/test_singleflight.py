@@ -0,0 +1,48 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from psybot.utils.gemini_client import SingleFlight
+
+
+def test_llamadas_concurrentes_comparten_generacion():
+    """Las llamadas idénticas simultáneas ejecutan la generación una sola vez"""
+    singleflight = SingleFlight()
+    llamadas = []
+    inicio = threading.Event()
+
+    def generar():
+        llamadas.append(1)
+        inicio.wait(timeout=5)
+        return "Análisis compartido"
+
+    with ThreadPoolExecutor(max_workers=5) as pool:
+        futuros = [pool.submit(singleflight.do, "clave", generar) for _ in range(5)]
+        # Esperar a que todas las llamadas estén registradas antes de liberar la generación
+        while singleflight.stats()['coalesced'] < 4:
+            time.sleep(0.01)
+        inicio.set()
+        resultados = [futuro.result() for futuro in futuros]
+
+    assert resultados == ["Análisis compartido"] * 5
+    assert len(llamadas) == 1
+    assert singleflight.stats()['coalesced'] == 4
+    assert singleflight.stats()['in_flight'] == 0
+
+
+def test_error_se_propaga_a_llamadas_agrupadas():
+    """Si la generación falla, todas las llamadas agrupadas reciben el error"""
+    singleflight = SingleFlight()
+    inicio = threading.Event()
+
+    def generar():
+        inicio.wait(timeout=5)
+        raise RuntimeError("Gemini no disponible")
+
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        futuros = [pool.submit(singleflight.do, "clave", generar) for _ in range(3)]
+        while singleflight.stats()['coalesced'] < 2:
+            time.sleep(0.01)
+        inicio.set()
+        errores = [futuro.exception() for futuro in futuros]
+
+    assert all(isinstance(error, RuntimeError) for error in errores)
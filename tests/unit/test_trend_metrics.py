@@ -0,0 +1,96 @@
+import pytest
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from django.test import Client
+from pacientes.models import Paciente
+from valoraciones.analysis import create_trend_analysis_prompt
+from valoraciones.analytics import RELIABLE_CHANGE_POINTS, compute_trend_metrics
+from valoraciones.models import PHQ9Assessment
+
+# Configurar host para testing local
+os.environ['MONGO_HOST'] = 'localhost'
+
+INICIO = datetime(2025, 1, 6, tzinfo=timezone.utc)
+
+
+def serie(puntajes_items):
+    """Una valoración semanal por lista de respuestas"""
+    fechas = [INICIO + timedelta(weeks=semana) for semana in range(len(puntajes_items))]
+    return fechas, puntajes_items
+
+
+def test_metricas_de_mejoria_confiable():
+    """Pendiente, cambio confiable, respuesta y remisión sobre una serie descendente"""
+    respuestas = [[3] * 6 + [2] * 3, [2] * 9, [1] * 9, [0] * 9]
+    metricas = compute_trend_metrics([serie(respuestas)])[0]
+
+    assert metricas['assessments_count'] == 4
+    assert (metricas['first_score'], metricas['last_score'], metricas['change']) == (24, 0, -24)
+    assert metricas['weeks'] == 3.0
+    assert metricas['slope_per_week'] == pytest.approx(-8.1)
+    assert metricas['rolling_mean'] == [24.0, 21.0, 17.0, 9.0]
+    assert metricas['reliable_improvement'] and not metricas['reliable_deterioration']
+    assert metricas['response'] and metricas['remission']
+    assert metricas['items'][0] == {
+        'item': 1, 'first': 3, 'last': 0, 'change': -3, 'mean': 1.5, 'slope_per_week': -1.0
+    }
+    assert 5 < RELIABLE_CHANGE_POINTS < 7
+
+
+def test_punto_de_cambio_y_series_de_varios_pacientes():
+    """Un salto sostenido se detecta como punto de cambio; las series vacías no rompen el cálculo"""
+    estable_y_salto = [[1] * 9] * 4 + [[2] * 9] * 4
+    desordenada = list(reversed(list(zip(*serie([[2] * 9, [3] * 9])))))
+    fechas, respuestas = zip(*desordenada)
+
+    vacia, salto, invertida = compute_trend_metrics([
+        ([], []), serie(estable_y_salto), (list(fechas), list(respuestas))
+    ])
+
+    assert vacia == {'assessments_count': 0}
+    assert salto['change_points'] == [{
+        'index': 4, 'date': (INICIO + timedelta(weeks=4)).isoformat(),
+        'mean_before': 9.0, 'mean_after': 18.0, 'shift': 9.0
+    }]
+    assert salto['reliable_deterioration']
+    assert not salto['response'] and not salto['remission']
+    # Las valoraciones se ordenan por fecha antes de calcular
+    assert (invertida['first_score'], invertida['last_score']) == (18, 27)
+    assert invertida['change_points'] == []
+
+
+@pytest.mark.django_db
+def test_endpoint_metricas_de_tendencia():
+    """El endpoint devuelve las métricas del paciente y 404 si no hay paciente o valoraciones"""
+    paciente = Paciente(
+        nombre='Tendencia',
+        apellido='Métricas',
+        identificacion=str(uuid.uuid4())[:8],
+        fecha_nacimiento=datetime(1990, 1, 1)
+    )
+    paciente.save()
+    client = Client()
+    url = f'/api/pacientes/{paciente.id}/trend-metrics/'
+
+    assert client.get(url).status_code == 404
+
+    for semana, valor in enumerate([3, 2, 1]):
+        PHQ9Assessment(
+            patient_id=paciente.id, responses=[valor] * 9, date_created=INICIO + timedelta(weeks=semana)
+        ).save()
+
+    response = client.get(url)
+    assert response.status_code == 200
+    metricas = response.json()['trend_metrics']
+    assert metricas['assessments_count'] == 3
+    assert (metricas['first_score'], metricas['last_score']) == (27, 9)
+    assert metricas['slope_per_week'] == pytest.approx(-9.0)
+
+    assert client.get(f'/api/pacientes/{uuid.uuid4()}/trend-metrics/').status_code == 404
+
+    prompt = create_trend_analysis_prompt(
+        list(PHQ9Assessment.objects(patient_id=paciente.id).order_by('date_created')), paciente
+    )
+    assert 'MÉTRICAS CALCULADAS' in prompt
+    assert '-9.00 puntos por semana' in prompt
@@ -0,0 +1,85 @@
+import pytest
+import os
+import uuid
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+from datetime import datetime
+from django.test import RequestFactory, override_settings
+from pacientes.models import Paciente
+from psybot.utils.gemini_client import gemini_client
+from valoraciones.models import PHQ9Assessment
+from valoraciones.services import gemini_analysis_service
+from web_interface import enriquecer_valoraciones, obtener_pagina
+
+# Configurar host para testing local
+os.environ['MONGO_HOST'] = 'localhost'
+
+
+@pytest.mark.django_db
+def test_enriquecer_valoraciones_con_una_consulta():
+    """Los pacientes de una página de valoraciones se obtienen con una sola consulta"""
+    paciente = Paciente(
+        nombre="Ana",
+        apellido="García",
+        identificacion=str(uuid.uuid4())[:8],
+        fecha_nacimiento=datetime(1990, 5, 15)
+    )
+    paciente.save()
+    valoraciones = [
+        PHQ9Assessment(patient_id=paciente.id, responses=[1] * 9) for _ in range(3)
+    ]
+    for valoracion in valoraciones:
+        valoracion.save()
+    # Valoración huérfana (su paciente fue eliminado)
+    huerfana = PHQ9Assessment(patient_id=uuid.uuid4(), responses=[0] * 9, total_score=0)
+
+    with patch.object(Paciente, 'objects', wraps=Paciente.objects) as consultas:
+        resultado = enriquecer_valoraciones(valoraciones + [huerfana])
+
+    assert consultas.call_count == 1
+    assert [v['paciente_nombre'] for v in resultado] == ["Ana García"] * 3 + ['Paciente no encontrado']
+    assert resultado[0]['paciente_identificacion'] == paciente.identificacion
+    assert resultado[3]['paciente_identificacion'] == 'N/A'
+
+
+@pytest.mark.django_db
+@override_settings(GEMINI_CACHE_ENABLED=True)
+@patch('psybot.utils.gemini_client.gemini_models')
+def test_analisis_web_usa_la_configuracion_y_cache_de_la_api(mock_gemini_models):
+    """La interfaz web genera con la configuración de la API REST y comparte su caché"""
+    modelo = MagicMock()
+    modelo.generate_content.return_value = SimpleNamespace(text="Análisis compartido")
+    mock_gemini_models.get_model.return_value = modelo
+    prompt = f"Analiza la valoración {uuid.uuid4()}"
+
+    assert gemini_analysis_service._generate(prompt, endpoint='clinical') == "Análisis compartido"
+    assert gemini_client.generate_text(prompt, endpoint='clinical') == "Análisis compartido"
+
+    modelo.generate_content.assert_called_once_with(
+        prompt, generation_config=gemini_client.build_generation_config()
+    )
+
+
+@pytest.mark.django_db
+def test_pagina_de_valoraciones_lee_solo_per_page_documentos():
+    """Cada página lee de MongoDB solo sus documentos, no la colección completa"""
+    PHQ9Assessment.objects.delete()
+    paciente = Paciente(
+        nombre="Marta",
+        apellido="Soto",
+        identificacion=str(uuid.uuid4())[:8],
+        fecha_nacimiento=datetime(1985, 1, 10)
+    )
+    paciente.save()
+    for _ in range(7):
+        PHQ9Assessment(patient_id=paciente.id, responses=[1] * 9).save()
+    request = RequestFactory().get('/valoraciones/', {'page': 2, 'per_page': 3})
+
+    with patch.object(PHQ9Assessment, '_from_son', wraps=PHQ9Assessment._from_son) as documentos:
+        page_obj = obtener_pagina(request, PHQ9Assessment.objects.order_by('-date_created'))
+        valoraciones = list(page_obj)
+
+    assert len(valoraciones) == 3
+    assert documentos.call_count == 3
+    assert page_obj.paginator.count == 7
+    assert page_obj.paginator.num_pages == 3
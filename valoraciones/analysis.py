@@ -0,0 +1,630 @@
+"""
+Lógica de análisis PHQ-9 con Gemini AI compartida por las vistas síncronas y los workers
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import logging
+
+from .analytics import format_trend_metrics, metrics_from_assessments
+from .deidentified import (
+    DEIDENTIFIED_CACHE_SCOPE, DEIDENTIFIED_CACHE_TAG, age_band, deidentified_enabled, patient_header
+)
+from .models import PHQ9Assessment
+from .severity import get_severity_level
+from .services import gemini_analysis_service
+from .summaries import load_trend_assessments
+from .trend_summary import summarize_history
+from pacientes.models import Paciente
+from psybot.utils.gemini_client import gemini_client
+from psybot.utils.gemini_cache import analysis_cache_tags
+from psybot.utils.identity_map import get_document, get_document_or_raise
+from psybot.utils.prompts import fit_history, prompt_template, render_prompt
+
+logger = logging.getLogger(__name__)
+
+
+class AnalysisError(Exception):
+    """
+    Error de análisis con el mensaje y el código HTTP que debe recibir el cliente
+    """
+
+    def __init__(self, message, status_code=500):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+def prepare_assessment_analysis(assessment_id):
+    """
+    Carga la valoración y el paciente y construye el prompt del análisis clínico
+    
+    Args:
+        assessment_id: ID de la valoración
+        
+    Returns:
+        tuple: Como build_assessment_analysis
+        
+    Raises:
+        AnalysisError: Si la valoración o el paciente no existen
+    """
+    # Obtener la valoración PHQ-9
+    assessment = get_document(PHQ9Assessment, assessment_id)
+    if not assessment:
+        raise AnalysisError('La valoración PHQ-9 especificada no existe', 404)
+    
+    # Obtener información del paciente
+    paciente = get_document(Paciente, assessment.patient_id)
+    if not paciente:
+        raise AnalysisError('No se encontró la información del paciente', 404)
+    
+    return build_assessment_analysis(assessment, paciente)
+
+
+def build_assessment_analysis(assessment, paciente):
+    """
+    Construye el prompt y los metadatos del análisis clínico de una valoración ya cargada
+    
+    Con GEMINI_DEIDENTIFIED_ANALYSIS el prompt solo lleva las respuestas y el
+    rango de edad: el análisis se comparte en caché entre pacientes y los datos
+    del paciente vuelven como encabezado local.
+    
+    Returns:
+        tuple: (prompt, metadatos de la respuesta, opciones de caché para
+            gemini_client, encabezado a anteponer al análisis)
+    """
+    # Calcular edad del paciente
+    edad = datetime.now().year - paciente.fecha_nacimiento.year
+    
+    # Generar prompt especializado para psicólogos clínicos
+    if deidentified_enabled():
+        prompt = create_deidentified_clinical_prompt(assessment.responses, age_band(edad))
+        cache_options = {'cache_tags': [DEIDENTIFIED_CACHE_TAG], 'cache_scope': DEIDENTIFIED_CACHE_SCOPE}
+        header = patient_header(paciente, edad, assessment)
+    else:
+        prompt = create_clinical_analysis_prompt(assessment, paciente, edad)
+        cache_options = {'cache_tags': analysis_cache_tags(assessment.id, assessment.patient_id)}
+        header = ''
+    
+    metadata = {
+        'status': 'success',
+        'patient_info': {
+            'nombre': f"{paciente.nombre} {paciente.apellido}",
+            'edad': edad,
+            'identificacion': paciente.identificacion
+        },
+        'assessment_info': {
+            'total_score': assessment.total_score,
+            'responses': assessment.responses,
+            'date_created': assessment.date_created.isoformat(),
+            'severity_level': get_severity_level(assessment.total_score)
+        }
+    }
+    return prompt, metadata, cache_options, header
+
+
+def analyze_assessment(assessment_id, use_cache=True):
+    """
+    Genera el análisis clínico de una valoración PHQ-9
+    
+    Args:
+        assessment_id: ID de la valoración
+        use_cache (bool): Usar la caché de análisis previos
+        
+    Returns:
+        dict: Cuerpo de respuesta de `POST /api/assessments/analyze/`
+        
+    Raises:
+        AnalysisError: Si la valoración o el paciente no existen o Gemini falla
+    """
+    prompt, metadata, cache_options, header = prepare_assessment_analysis(assessment_id)
+    
+    # Llamar a Gemini AI
+    response = gemini_client.generate_text(prompt, use_cache=use_cache, endpoint='clinical', **cache_options)
+    if not response:
+        raise AnalysisError('Error al generar el análisis con Gemini AI', 500)
+    
+    return {**metadata, 'clinical_analysis': header + response}
+
+
+def stream_assessment_analysis(assessment_id, use_cache=True):
+    """
+    Variante en streaming de analyze_assessment
+    
+    Returns:
+        tuple: (metadatos de la respuesta, generador de fragmentos del análisis)
+    """
+    prompt, metadata, cache_options, header = prepare_assessment_analysis(assessment_id)
+    chunks = gemini_client.stream_text(prompt, use_cache=use_cache, endpoint='clinical', **cache_options)
+    return metadata, _with_header(header, chunks)
+
+
+def _with_header(header, chunks):
+    if header:
+        yield header
+    yield from chunks
+
+
+def analyze_assessments_batch(assessment_ids, concurrency, use_cache=True):
+    """
+    Genera el análisis clínico de varias valoraciones con paralelismo acotado
+    
+    Las valoraciones y los pacientes se cargan con dos consultas `$in` y las
+    llamadas a Gemini se reparten en un pool de `concurrency` hilos. Un error
+    en una valoración no interrumpe el resto del lote.
+    
+    Args:
+        assessment_ids (list): IDs de las valoraciones
+        concurrency (int): Máximo de llamadas simultáneas a Gemini
+        use_cache (bool): Usar la caché de análisis previos
+        
+    Returns:
+        dict: Cuerpo de respuesta de `POST /api/assessments/analyze/batch/`
+    """
+    # Eliminar IDs repetidos conservando el orden
+    assessment_ids = list(dict.fromkeys(assessment_ids))
+    
+    assessments = {
+        assessment.id: assessment
+        for assessment in PHQ9Assessment.objects(id__in=assessment_ids)
+    }
+    pacientes = {
+        paciente.id: paciente
+        for paciente in Paciente.objects(id__in={a.patient_id for a in assessments.values()})
+    }
+    
+    def analyze(prompt, metadata, cache_options, header):
+        response = gemini_client.generate_text(prompt, use_cache=use_cache, endpoint='clinical', **cache_options)
+        if not response:
+            raise AnalysisError('Error al generar el análisis con Gemini AI', 500)
+        return {**metadata, 'clinical_analysis': header + response}
+    
+    results = {}
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = {}
+        for assessment_id in assessment_ids:
+            assessment = assessments.get(assessment_id)
+            if not assessment:
+                results[assessment_id] = AnalysisError('La valoración PHQ-9 especificada no existe', 404)
+                continue
+            paciente = pacientes.get(assessment.patient_id)
+            if not paciente:
+                results[assessment_id] = AnalysisError('No se encontró la información del paciente', 404)
+                continue
+            futures[assessment_id] = pool.submit(analyze, *build_assessment_analysis(assessment, paciente))
+        
+        for assessment_id, future in futures.items():
+            try:
+                results[assessment_id] = future.result()
+            except AnalysisError as e:
+                results[assessment_id] = e
+            except Exception as e:
+                logger.error(f"Error en el análisis por lotes de la valoración {assessment_id}: {e}")
+                results[assessment_id] = AnalysisError(f'Error interno: {str(e)}', 500)
+    
+    items = []
+    for assessment_id in assessment_ids:
+        result = results[assessment_id]
+        if isinstance(result, AnalysisError):
+            items.append({
+                'assessment_id': str(assessment_id),
+                'status': 'error',
+                'status_code': result.status_code,
+                'message': result.message
+            })
+        else:
+            items.append({'assessment_id': str(assessment_id), **result})
+    
+    failed = sum(1 for item in items if item['status'] == 'error')
+    return {
+        'status': 'success',
+        'total': len(items),
+        'succeeded': len(items) - failed,
+        'failed': failed,
+        'results': items
+    }
+
+
+def prepare_trend_analysis(patient_id):
+    """
+    Carga las valoraciones y el paciente y construye el prompt del análisis de tendencias
+    
+    Args:
+        patient_id: ID del paciente
+        
+    Returns:
+        tuple: (prompt, metadatos de la respuesta, etiquetas de caché)
+        
+    Raises:
+        AnalysisError: Si no hay valoraciones o el paciente no existe
+    """
+    # Obtener información del paciente y todas sus valoraciones
+    paciente = get_document(Paciente, patient_id)
+    assessments = load_trend_assessments(patient_id, paciente)
+    if not assessments:
+        raise AnalysisError('No se encontraron valoraciones para este paciente', 404)
+    
+    if not paciente:
+        raise AnalysisError('No se encontró la información del paciente', 404)
+    
+    # Métricas calculadas localmente (pendiente, cambio confiable, respuesta, ...), resumen
+    # persistente del historial anterior a las últimas valoraciones y prompt
+    metrics = metrics_from_assessments(assessments)
+    history = summarize_history(paciente.id, assessments, defer=True)
+    prompt = create_trend_analysis_prompt(assessments, paciente, metrics, history)
+    
+    # Preparar datos de las valoraciones
+    assessment_data = []
+    for assessment in assessments:
+        assessment_data.append({
+            'id': str(assessment.id),
+            'total_score': assessment.total_score,
+            'date_created': assessment.date_created.isoformat(),
+            'severity_level': get_severity_level(assessment.total_score)
+        })
+    
+    metadata = {
+        'status': 'success',
+        'patient_info': {
+            'nombre': f"{paciente.nombre} {paciente.apellido}",
+            'identificacion': paciente.identificacion
+        },
+        'assessments_count': len(assessments),
+        'assessments_data': assessment_data,
+        'trend_metrics': metrics
+    }
+    return prompt, metadata, analysis_cache_tags(patient_id=patient_id)
+
+
+def analyze_patient_trends(patient_id, use_cache=True):
+    """
+    Genera el análisis de tendencias de todas las valoraciones de un paciente
+    
+    Args:
+        patient_id: ID del paciente
+        use_cache (bool): Usar la caché de análisis previos
+        
+    Returns:
+        dict: Cuerpo de respuesta de `POST /api/assessments/trends/`
+        
+    Raises:
+        AnalysisError: Si no hay valoraciones, el paciente no existe o Gemini falla
+    """
+    prompt, metadata, cache_tags = prepare_trend_analysis(patient_id)
+    
+    # Llamar a Gemini AI
+    response = gemini_client.generate_text(prompt, use_cache=use_cache, cache_tags=cache_tags, endpoint='trends')
+    if not response:
+        raise AnalysisError('Error al generar el análisis de tendencias con Gemini AI', 500)
+    
+    return {**metadata, 'trend_analysis': response}
+
+
+def stream_patient_trends(patient_id, use_cache=True):
+    """
+    Variante en streaming de analyze_patient_trends
+    
+    Returns:
+        tuple: (metadatos de la respuesta, generador de fragmentos del análisis)
+    """
+    prompt, metadata, cache_tags = prepare_trend_analysis(patient_id)
+    return metadata, gemini_client.stream_text(prompt, use_cache=use_cache, cache_tags=cache_tags, endpoint='trends')
+
+
+def prepare_assessment_web(valoracion_id):
+    """
+    Carga la valoración y el paciente para el análisis individual de la interfaz web
+    
+    Returns:
+        tuple: (valoración, metadatos de la respuesta)
+    """
+    # Obtener valoración
+    try:
+        valoracion = get_document_or_raise(PHQ9Assessment, valoracion_id)
+        paciente = get_document_or_raise(Paciente, valoracion.patient_id)
+    except PHQ9Assessment.DoesNotExist:
+        raise AnalysisError('Valoración no encontrada', 404)
+    except Paciente.DoesNotExist:
+        raise AnalysisError('Paciente no encontrado', 404)
+    
+    metadata = {
+        'success': True,
+        'paciente': f'{paciente.nombre} {paciente.apellido}',
+        'valoracion': {
+            'id': str(valoracion.id),
+            'fecha': valoracion.date_created.strftime('%d/%m/%Y'),
+            'total_score': valoracion.total_score,
+            'responses': valoracion.responses
+        }
+    }
+    return valoracion, metadata
+
+
+def analyze_assessment_web(valoracion_id, use_cache=True):
+    """
+    Genera el análisis individual que muestra la interfaz web
+    
+    Returns:
+        dict: Cuerpo de respuesta de `POST /analisis/individual/`
+    """
+    valoracion, metadata = prepare_assessment_web(valoracion_id)
+    
+    # Generar análisis con Gemini
+    analisis = gemini_analysis_service.analyze_single_assessment(str(valoracion.id), use_cache=use_cache)
+    
+    return {**metadata, 'analisis': analisis}
+
+
+def stream_assessment_web(valoracion_id, use_cache=True):
+    """
+    Variante en streaming de analyze_assessment_web
+    
+    Returns:
+        tuple: (metadatos de la respuesta, generador de fragmentos del análisis)
+    """
+    valoracion, metadata = prepare_assessment_web(valoracion_id)
+    return metadata, gemini_analysis_service.stream_single_assessment(str(valoracion.id), use_cache=use_cache)
+
+
+def prepare_patient_trends_web(patient_id):
+    """
+    Verifica el paciente y sus valoraciones para el análisis de tendencias de la interfaz web
+    
+    Returns:
+        dict: Metadatos de la respuesta
+    """
+    # Obtener paciente
+    try:
+        paciente = get_document_or_raise(Paciente, patient_id)
+    except Paciente.DoesNotExist:
+        raise AnalysisError('Paciente no encontrado', 404)
+    
+    # Obtener valoraciones del paciente
+    total_valoraciones = PHQ9Assessment.objects.filter(patient_id=patient_id).count()
+    
+    if not total_valoraciones:
+        raise AnalysisError('No hay valoraciones para este paciente', 400)
+    
+    return {
+        'success': True,
+        'paciente': f'{paciente.nombre} {paciente.apellido}',
+        'total_valoraciones': total_valoraciones
+    }
+
+
+def analyze_patient_trends_web(patient_id, use_cache=True):
+    """
+    Genera el análisis de tendencias que muestra la interfaz web
+    
+    Returns:
+        dict: Cuerpo de respuesta de `POST /analisis/tendencias/`
+    """
+    metadata = prepare_patient_trends_web(patient_id)
+    
+    # Generar análisis de tendencias con Gemini
+    analisis = gemini_analysis_service.analyze_trends(patient_id, use_cache=use_cache)
+    
+    return {**metadata, 'analisis': analisis}
+
+
+def stream_patient_trends_web(patient_id, use_cache=True):
+    """
+    Variante en streaming de analyze_patient_trends_web
+    
+    Returns:
+        tuple: (metadatos de la respuesta, generador de fragmentos del análisis)
+    """
+    metadata = prepare_patient_trends_web(patient_id)
+    return metadata, gemini_analysis_service.stream_trends(patient_id, use_cache=use_cache)
+
+
+# Preguntas PHQ-9 y frecuencias de respuesta
+PHQ9_QUESTIONS = [
+    "Poco interés o placer en hacer cosas",
+    "Sentirse decaído(a), deprimido(a) o sin esperanza",
+    "Dificultad para conciliar el sueño, o despertarse frecuentemente",
+    "Sentirse cansado(a) o con poca energía",
+    "Poco apetito o comer en exceso",
+    "Sentirse mal acerca de sí mismo(a) o sentir que es un fracaso",
+    "Dificultad para concentrarse en actividades",
+    "Moverse o hablar tan lento que otras personas lo han notado",
+    "Pensamientos de lastimarse o que estaría mejor muerto(a)"
+]
+RESPONSE_FREQUENCIES = ["Nunca", "Algunos días", "Más de la mitad de los días", "Casi todos los días"]
+
+CLINICAL_PATIENT_SECTION = prompt_template("""
+    INFORMACIÓN DEL PACIENTE:
+    - Nombre: {nombre}
+    - Edad: {edad} años
+    - Fecha de evaluación: {fecha}
+""")
+
+DEIDENTIFIED_PATIENT_SECTION = prompt_template("""
+    INFORMACIÓN DEL PACIENTE (no identificable):
+    - Rango de edad: {band} años
+    - Refiérete a la persona como "el paciente", sin inventar nombres ni fechas
+""")
+
+CLINICAL_ANALYSIS_TEMPLATE = prompt_template("""
+    ANÁLISIS CLÍNICO PHQ-9 PARA PROFESIONAL DE SALUD MENTAL
+
+    {patient_section}
+
+    RESULTADOS PHQ-9:
+    - Puntaje total: {total_score}/27
+    - Nivel de severidad: {severity}
+
+    DESGLOSE DE RESPUESTAS:
+    {responses_breakdown}
+
+    Como psicólogo clínico especializado, proporciona:
+
+    1. INTERPRETACIÓN CLÍNICA:
+       - Análisis detallado del estado depresivo actual
+       - Identificación de síntomas predominantes
+       - Patrones de severidad por dominio sintomático
+
+    2. ÁREAS DE ATENCIÓN PRIORITARIA:
+       - Síntomas que requieren intervención inmediata
+       - Factores de riesgo identificados
+       - Elementos protectores presentes
+
+    3. RECOMENDACIONES TERAPÉUTICAS:
+       - Modalidades de tratamiento sugeridas
+       - Frecuencia de sesiones recomendada
+       - Consideraciones para derivación a psiquiatría
+
+    4. SEGUIMIENTO Y MONITOREO:
+       - Indicadores a vigilar en próximas sesiones
+       - Frecuencia de re-evaluación sugerida
+       - Señales de alerta para intervención de crisis
+
+    5. CONSIDERACIONES ADICIONALES:
+       - Aspectos psicoeducativos relevantes
+       - Recursos de apoyo recomendados
+       - Estrategias de autocuidado apropiadas
+
+    Por favor, proporciona un análisis profesional, basado en evidencia y orientado a la práctica clínica.
+""")
+
+TREND_ANALYSIS_TEMPLATE = prompt_template("""
+    ANÁLISIS DE TENDENCIAS PHQ-9 - EVOLUCIÓN CLÍNICA
+
+    PACIENTE: {nombre}
+    NÚMERO DE EVALUACIONES: {count}
+    PERÍODO: {first_date} a {last_date}
+
+    {history_section}
+
+    EVOLUCIÓN DE PUNTAJES{recent}:
+    {timeline}
+
+    MÉTRICAS CALCULADAS (exactas; úsalas en lugar de estimarlas):
+    {metrics}
+
+    Como psicólogo clínico especializado, analiza la evolución del paciente y proporciona:
+
+    1. ANÁLISIS DE TENDENCIAS:
+       - Patrón de evolución (mejora, empeoramiento, estabilidad)
+       - Velocidad de cambio observada
+       - Fluctuaciones significativas identificadas
+
+    2. INTERPRETACIÓN CLÍNICA:
+       - Posible respuesta al tratamiento actual
+       - Identificación de períodos críticos
+       - Factores que pueden influir en los cambios
+
+    3. PRONÓSTICO:
+       - Expectativas realistas de evolución
+       - Factores que favorecen o dificultan la recuperación
+       - Tiempo estimado para objetivos terapéuticos
+
+    4. AJUSTES TERAPÉUTICOS RECOMENDADOS:
+       - Modificaciones en el plan de tratamiento
+       - Intensidad de intervención sugerida
+       - Modalidades adicionales a considerar
+
+    5. SEGUIMIENTO:
+       - Frecuencia óptima de re-evaluación
+       - Indicadores clave a monitorear
+       - Criterios para ajustar el tratamiento
+
+    Proporciona un análisis longitudinal profesional basado en la evolución observada.
+""")
+
+HISTORY_SECTION = prompt_template("""
+    RESUMEN DEL HISTORIAL ANTERIOR ({count} valoraciones, {first_date} a {last_date}):
+    {summary}
+""")
+
+
+def create_clinical_analysis_prompt(assessment, paciente, edad):
+    """
+    Crea un prompt especializado para análisis clínico de PHQ-9
+    """
+    patient_section = CLINICAL_PATIENT_SECTION.format(
+        nombre=f"{paciente.nombre} {paciente.apellido}",
+        edad=edad,
+        fecha=assessment.date_created.strftime('%Y-%m-%d %H:%M')
+    )
+    return _clinical_prompt(patient_section, assessment.responses, assessment.total_score)
+
+
+def create_deidentified_clinical_prompt(responses, band):
+    """
+    Prompt de análisis clínico PHQ-9 sin datos identificables del paciente
+    
+    Args:
+        responses (list): Las 9 respuestas de la valoración
+        band (str): Rango de edad (deidentified.age_band)
+    """
+    return _clinical_prompt(DEIDENTIFIED_PATIENT_SECTION.format(band=band), responses, sum(responses))
+
+
+def _clinical_prompt(patient_section, responses, total_score):
+    # Crear desglose de respuestas
+    responses_breakdown = "\n".join(
+        f"{i}. {question}: {response} ({RESPONSE_FREQUENCIES[response]})"
+        for i, (question, response) in enumerate(zip(PHQ9_QUESTIONS, responses), 1)
+    )
+    
+    return render_prompt(
+        CLINICAL_ANALYSIS_TEMPLATE,
+        patient_section=patient_section,
+        total_score=total_score,
+        severity=get_severity_level(total_score),
+        responses_breakdown=responses_breakdown
+    )
+
+
+def create_trend_analysis_prompt(assessments, paciente, metrics=None, history=(None, 0)):
+    """
+    Crea un prompt para análisis de tendencias en múltiples valoraciones PHQ-9
+    
+    Si el detalle de las valoraciones no cabe en el presupuesto de tokens
+    'trends' (GEMINI_INPUT_TOKEN_BUDGETS) se omiten las más antiguas; las
+    métricas calculadas siguen cubriendo todo el historial.
+    
+    Args:
+        metrics (dict): Métricas de valoraciones.analytics (se calculan si no se indican)
+        history (tuple): (resumen, valoraciones que incorpora) de trend_summary.summarize_history;
+            solo las valoraciones posteriores se detallan en el prompt
+    """
+    if metrics is None:
+        metrics = metrics_from_assessments(assessments)
+    summary, summarized = history
+    
+    # Convertir a lista para poder usar índices negativos
+    assessments_list = list(assessments)
+    
+    history_section = ''
+    if summary:
+        history_section = HISTORY_SECTION.format(
+            count=summarized,
+            first_date=assessments_list[0].date_created.strftime('%Y-%m-%d'),
+            last_date=assessments_list[summarized - 1].date_created.strftime('%Y-%m-%d'),
+            summary=summary
+        )
+    
+    def render(recent, omitted):
+        timeline = [
+            f"- {assessment.date_created.strftime('%Y-%m-%d')}: {assessment.total_score}/27 "
+            f"({get_severity_level(assessment.total_score)})"
+            for assessment in recent
+        ]
+        if omitted:
+            timeline.insert(0, f"- ({omitted} valoraciones anteriores omitidas por longitud; incluidas en las métricas)")
+        return render_prompt(
+            TREND_ANALYSIS_TEMPLATE,
+            nombre=f"{paciente.nombre} {paciente.apellido}",
+            count=len(assessments_list),
+            first_date=assessments_list[0].date_created.strftime('%Y-%m-%d'),
+            last_date=assessments_list[-1].date_created.strftime('%Y-%m-%d'),
+            history_section=history_section,
+            recent=' RECIENTES' if summary else '',
+            timeline="\n".join(timeline),
+            metrics=format_trend_metrics(metrics)
+        )
+    
+    prompt, _ = fit_history(render, assessments_list[summarized:], 'trends')
+    return prompt
@@ -0,0 +1,259 @@
+"""
+Métricas longitudinales PHQ-9 calculadas localmente con NumPy (sin Gemini)
+
+Las series de uno o varios pacientes se alinean en una matriz (pacientes x
+valoraciones x ítems, rellena con NaN) y todas las métricas se calculan en
+una sola pasada vectorizada sobre esa matriz.
+"""
+
+import numpy as np
+
+PHQ9_ITEMS = 9
+
+# Media móvil de las últimas valoraciones
+ROLLING_WINDOW = 3
+
+# Índice de cambio confiable (Jacobson y Truax) con la desviación estándar y la
+# confiabilidad test-retest del PHQ-9: el umbral de 1.96 equivale a ~6 puntos
+RCI_SD = 5.72
+RCI_RELIABILITY = 0.84
+RCI_SDIFF = RCI_SD * np.sqrt(2 * (1 - RCI_RELIABILITY))
+RELIABLE_CHANGE_Z = 1.96
+RELIABLE_CHANGE_POINTS = RELIABLE_CHANGE_Z * RCI_SDIFF
+
+# Respuesta: caída de al menos 50 % respecto de la primera valoración; remisión: puntaje menor a 5
+RESPONSE_DROP = 0.5
+REMISSION_BELOW = 5
+
+# Puntos de cambio: segmentos de al menos 2 valoraciones y como máximo 3 candidatos
+CHANGE_POINT_MIN_SEGMENT = 2
+CHANGE_POINT_MAX = 3
+
+
+def _round(value, digits=2):
+    return None if value is None or np.isnan(value) else round(float(value), digits)
+
+
+def _naive_utc(moment):
+    # MongoDB devuelve fechas ingenuas en UTC; las aware se llevan a la misma referencia
+    return moment if moment.tzinfo is None else (moment - moment.utcoffset()).replace(tzinfo=None)
+
+
+def build_matrix(series):
+    """
+    Alinea las series de varios pacientes en matrices rellenas con NaN
+
+    Args:
+        series (list): Por paciente, (fechas, respuestas) con fechas datetime y
+            respuestas de 9 ítems por valoración, en cualquier orden (al menos una)
+
+    Returns:
+        tuple: (días desde la época P x T, respuestas P x T x 9, valoraciones por paciente, fechas ordenadas)
+    """
+    counts = np.array([len(dates) for dates, _ in series], dtype=int)
+    width = int(counts.max())
+    days = np.full((len(series), width), np.nan)
+    items = np.full((len(series), width, PHQ9_ITEMS), np.nan)
+    ordered_dates = []
+
+    for row, (dates, responses) in enumerate(series):
+        moments = np.array([_naive_utc(moment) for moment in dates], dtype='datetime64[s]').astype('int64') / 86400.0
+        order = np.argsort(moments, kind='stable')
+        days[row, :len(dates)] = moments[order]
+        items[row, :len(dates)] = np.asarray(responses, dtype=float)[order]
+        ordered_dates.append([dates[index] for index in order])
+
+    return days, items, counts, ordered_dates
+
+
+def _slopes(weeks, values):
+    """
+    Pendiente de mínimos cuadrados por fila ignorando NaN (eje de valoraciones = 1)
+    """
+    valid = ~np.isnan(values)
+    x = np.where(valid, weeks, np.nan)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        x_mean = np.nanmean(x, axis=1, keepdims=True)
+        y_mean = np.nanmean(values, axis=1, keepdims=True)
+        sxx = np.nansum((x - x_mean) ** 2, axis=1)
+        sxy = np.nansum((x - x_mean) * (values - y_mean), axis=1)
+        return np.where(sxx > 0, sxy / np.where(sxx > 0, sxx, 1), np.nan)
+
+
+def compute_trend_metrics(series, window=ROLLING_WINDOW):
+    """
+    Métricas longitudinales de uno o varios pacientes en una sola pasada
+
+    Args:
+        series (list): Por paciente, (fechas, respuestas) como en build_matrix
+        window (int): Valoraciones de la media móvil
+
+    Returns:
+        list: Un diccionario de métricas por serie, en el mismo orden
+    """
+    if not series:
+        return []
+    if any(not len(dates) for dates, _ in series):
+        # Las series vacías no entran en la matriz
+        present = [index for index, (dates, _) in enumerate(series) if len(dates)]
+        computed = dict(zip(present, compute_trend_metrics([series[index] for index in present], window)))
+        return [computed.get(index, {'assessments_count': 0}) for index in range(len(series))]
+
+    days, items, counts, ordered_dates = build_matrix(series)
+    patients, width = days.shape
+    rows = np.arange(patients)
+    last = np.maximum(counts - 1, 0)
+
+    scores = items.sum(axis=2)  # NaN en las posiciones de relleno
+    weeks = (days - days[:, :1]) / 7.0
+
+    # Primera y última valoración, cambio confiable, respuesta y remisión
+    first_scores = scores[:, 0]
+    last_scores = scores[rows, last]
+    change = last_scores - first_scores
+    rci = change / RCI_SDIFF
+    with np.errstate(invalid='ignore', divide='ignore'):
+        percent_change = np.where(first_scores > 0, change * 100 / np.where(first_scores > 0, first_scores, 1), np.nan)
+    response = (counts > 1) & (first_scores > 0) & (last_scores <= first_scores * (1 - RESPONSE_DROP))
+    remission = last_scores < REMISSION_BELOW
+
+    # Pendiente por semana del puntaje total y de cada ítem
+    slopes = _slopes(weeks, scores)
+    item_slopes = _slopes(
+        np.broadcast_to(weeks[:, :, None], items.shape).transpose(0, 2, 1).reshape(-1, width),
+        items.transpose(0, 2, 1).reshape(-1, width)
+    ).reshape(patients, PHQ9_ITEMS)
+    with np.errstate(invalid='ignore'):
+        item_means = np.nanmean(items, axis=1)
+
+    # Media móvil de las últimas `window` valoraciones (sumas acumuladas)
+    cumulative = np.nancumsum(scores, axis=1)
+    window_sums = cumulative.copy()
+    window_sums[:, window:] -= cumulative[:, :-window]
+    rolling = window_sums / np.minimum(np.arange(width) + 1, window)
+
+    # Puntos de cambio: para cada corte k, la reducción del error cuadrático al
+    # separar la serie en dos medias es k (n - k) / n * (media antes - media después)^2
+    total = cumulative[rows, last]
+    left_counts = np.arange(1, width + 1)[None, :]
+    right_counts = counts[:, None] - left_counts
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_before = cumulative / left_counts
+        mean_after = (total[:, None] - cumulative) / right_counts
+        shift = mean_after - mean_before
+        gain = left_counts * right_counts / counts[:, None] * shift ** 2
+    valid_split = (left_counts >= CHANGE_POINT_MIN_SEGMENT) & (right_counts >= CHANGE_POINT_MIN_SEGMENT)
+    gain = np.where(valid_split, gain, -np.inf)
+    padded = np.pad(gain, ((0, 0), (1, 1)), constant_values=-np.inf)
+    local_max = (gain >= padded[:, :-2]) & (gain >= padded[:, 2:])
+    candidates = valid_split & local_max & (np.abs(np.nan_to_num(shift)) >= RELIABLE_CHANGE_POINTS)
+
+    metrics = []
+    for row in rows:
+        n = int(counts[row])
+        dates = ordered_dates[row]
+        splits = np.flatnonzero(candidates[row])
+        splits = splits[np.argsort(-gain[row, splits], kind='stable')][:CHANGE_POINT_MAX]
+        metrics.append({
+            'assessments_count': n,
+            'first_date': dates[0].isoformat(),
+            'last_date': dates[-1].isoformat(),
+            'weeks': _round(weeks[row, n - 1], 1),
+            'first_score': int(first_scores[row]),
+            'last_score': int(last_scores[row]),
+            'change': int(change[row]),
+            'percent_change': _round(percent_change[row], 1),
+            'slope_per_week': _round(slopes[row]),
+            'rolling_mean': [_round(value) for value in rolling[row, :n]],
+            'reliable_change_index': _round(rci[row]),
+            'reliable_improvement': bool(n > 1 and rci[row] <= -RELIABLE_CHANGE_Z),
+            'reliable_deterioration': bool(n > 1 and rci[row] >= RELIABLE_CHANGE_Z),
+            'response': bool(response[row]),
+            'remission': bool(remission[row]),
+            'items': [
+                {
+                    'item': item + 1,
+                    'first': int(items[row, 0, item]),
+                    'last': int(items[row, n - 1, item]),
+                    'change': int(items[row, n - 1, item] - items[row, 0, item]),
+                    'mean': _round(item_means[row, item]),
+                    'slope_per_week': _round(item_slopes[row, item], 3),
+                }
+                for item in range(PHQ9_ITEMS)
+            ],
+            'change_points': [
+                {
+                    # Primera valoración del nuevo nivel
+                    'index': int(split + 1),
+                    'date': dates[split + 1].isoformat(),
+                    'mean_before': _round(mean_before[row, split]),
+                    'mean_after': _round(mean_after[row, split]),
+                    'shift': _round(shift[row, split]),
+                }
+                for split in sorted(splits)
+            ],
+        })
+    return metrics
+
+
+def metrics_from_assessments(assessments):
+    """
+    Métricas de un paciente a partir de sus valoraciones ya cargadas
+
+    Args:
+        assessments: Valoraciones PHQ9Assessment del paciente
+
+    Returns:
+        dict: Métricas de compute_trend_metrics
+    """
+    assessments = [assessment for assessment in assessments if len(assessment.responses) == PHQ9_ITEMS]
+    return compute_trend_metrics([(
+        [assessment.date_created for assessment in assessments],
+        [assessment.responses for assessment in assessments],
+    )])[0]
+
+
+def format_trend_metrics(metrics):
+    """
+    Texto de las métricas calculadas para incluir en el prompt de tendencias
+
+    Returns:
+        str: Líneas con las métricas (vacío si no hay valoraciones)
+    """
+    if not metrics.get('assessments_count'):
+        return ''
+
+    def si_no(value):
+        return 'sí' if value else 'no'
+
+    lines = [
+        f"- Cambio total: {metrics['first_score']} -> {metrics['last_score']} ({metrics['change']:+d} puntos"
+        + (f", {metrics['percent_change']:+.1f} %" if metrics['percent_change'] is not None else '')
+        + f") en {metrics['weeks']} semanas",
+    ]
+    if metrics['slope_per_week'] is not None:
+        lines.append(f"- Pendiente lineal: {metrics['slope_per_week']:+.2f} puntos por semana")
+    lines.append(f"- Media móvil ({ROLLING_WINDOW} valoraciones) más reciente: {metrics['rolling_mean'][-1]}")
+    if metrics['assessments_count'] > 1:
+        lines.append(
+            f"- Índice de cambio confiable: {metrics['reliable_change_index']} "
+            f"(mejoría confiable: {si_no(metrics['reliable_improvement'])}, "
+            f"deterioro confiable: {si_no(metrics['reliable_deterioration'])})"
+        )
+    lines.append(
+        f"- Respuesta (caída ≥ 50 %): {si_no(metrics['response'])}; "
+        f"remisión (puntaje < {REMISSION_BELOW}): {si_no(metrics['remission'])}"
+    )
+
+    changed = sorted(
+        (item for item in metrics['items'] if item['change']), key=lambda item: -abs(item['change'])
+    )[:3]
+    if changed:
+        lines.append("- Ítems con mayor cambio: " + ', '.join(
+            f"ítem {item['item']} ({item['first']} -> {item['last']})" for item in changed
+        ))
+    for point in metrics['change_points']:
+        lines.append(
+            f"- Punto de cambio el {point['date'][:10]}: media {point['mean_before']} -> {point['mean_after']}"
+        )
+    return '\n'.join(lines)
@@ -0,0 +1,92 @@
+"""
+Análisis clínico a partir de datos no identificables, reutilizable entre pacientes
+
+El prompt solo depende del vector de 9 respuestas y del rango de edad, de modo
+que su clave en la caché de Gemini es la misma para todos los pacientes con
+esas entradas. Los datos propios del paciente (nombre, edad exacta, fecha de
+evaluación) no se envían al modelo: se agregan localmente como encabezado del
+análisis.
+"""
+
+from collections import Counter
+from datetime import datetime
+
+from django.conf import settings
+
+from .models import PHQ9Assessment
+from pacientes.models import Paciente
+from psybot.utils.mongo import analytics_collection
+
+# Límite inferior de cada rango de edad (el último rango es abierto)
+AGE_BANDS = [0, 13, 18, 25, 35, 45, 55, 65]
+
+# Etiqueta y contador de la caché para los análisis compartidos entre pacientes
+DEIDENTIFIED_CACHE_TAG = 'deidentified'
+DEIDENTIFIED_CACHE_SCOPE = 'deidentified'
+
+
+def deidentified_enabled():
+    return getattr(settings, 'GEMINI_DEIDENTIFIED_ANALYSIS', False)
+
+
+def age_band(edad):
+    """
+    Rango de edad que se envía al modelo en lugar de la edad exacta ('25-34', '65+')
+    """
+    lower = max(bound for bound in AGE_BANDS if bound <= max(edad, 0))
+    index = AGE_BANDS.index(lower)
+    if index == len(AGE_BANDS) - 1:
+        return f'{lower}+'
+    return f'{lower}-{AGE_BANDS[index + 1] - 1}'
+
+
+def patient_header(paciente, edad, assessment):
+    """
+    Encabezado con los datos del paciente que se antepone localmente al análisis generado
+    """
+    return (
+        f"Paciente: {paciente.nombre} {paciente.apellido}\n"
+        f"Edad: {edad} años\n"
+        f"Fecha de evaluación: {assessment.date_created.strftime('%Y-%m-%d %H:%M')}\n\n"
+    )
+
+
+def reuse_report(batch_size=None):
+    """
+    Estima sobre los datos existentes cuántos análisis serían aciertos de caché
+
+    Cada par distinto (vector de respuestas, rango de edad) requiere una sola
+    llamada a Gemini; el resto de las valoraciones con esas mismas entradas
+    reutilizan el análisis. Se lee por la conexión de analítica.
+
+    Returns:
+        dict: total de valoraciones, claves distintas, proporción de aciertos
+            esperada y las claves más repetidas
+    """
+    current_year = datetime.now().year
+    bands = {
+        paciente['_id']: age_band(current_year - paciente['fecha_nacimiento'].year)
+        for paciente in analytics_collection(Paciente).find(
+            {'fecha_nacimiento': {'$ne': None}}, {'fecha_nacimiento': 1}
+        ).batch_size(batch_size or settings.EXPORT_BATCH_SIZE)
+    }
+
+    keys = Counter()
+    cursor = analytics_collection(PHQ9Assessment).find(
+        {}, {'patient_id': 1, 'responses': 1}
+    ).batch_size(batch_size or settings.EXPORT_BATCH_SIZE)
+    for document in cursor:
+        band = bands.get(document.get('patient_id'))
+        if band is not None:
+            keys[(tuple(document.get('responses') or []), band)] += 1
+
+    total = sum(keys.values())
+    return {
+        'assessments': total,
+        'distinct_keys': len(keys),
+        'expected_hit_ratio': round(1 - len(keys) / total, 4) if total else 0.0,
+        'top_keys': [
+            {'responses': list(responses), 'age_band': band, 'assessments': count}
+            for (responses, band), count in keys.most_common(10)
+        ],
+    }
@@ -0,0 +1,106 @@
+"""
+Exportación de valoraciones PHQ-9 con los datos demográficos del paciente
+"""
+
+from itertools import islice
+
+from django.conf import settings
+
+from .models import PHQ9Assessment
+from .severity import SEVERITY_BANDS, get_severity_level
+from pacientes.models import Paciente
+from psybot.utils.mongo import analytics_collection
+
+PHQ9_ITEMS = 9
+
+ASSESSMENT_EXPORT_FIELDS = [
+    'assessment_id', 'patient_id', 'identificacion', 'nombre', 'apellido', 'fecha_nacimiento',
+    *[f'respuesta_{item}' for item in range(1, PHQ9_ITEMS + 1)],
+    'total_score', 'severity_level', 'date_created',
+]
+
+PATIENT_PROJECTION = {'nombre': 1, 'apellido': 1, 'identificacion': 1, 'fecha_nacimiento': 1}
+
+
+def build_assessment_filter(date_from=None, date_to=None, severity=None, patient_id=None):
+    """
+    Filtro de MongoDB para la exportación
+
+    Args:
+        severity (str): Clave de SEVERITY_BANDS; se traduce a un rango de total_score
+
+    Returns:
+        dict: Filtro sobre la colección phq9_assessment
+    """
+    query = {}
+    if patient_id:
+        query['patient_id'] = patient_id
+    if date_from or date_to:
+        query['date_created'] = {}
+        if date_from:
+            query['date_created']['$gte'] = date_from
+        if date_to:
+            query['date_created']['$lte'] = date_to
+    if severity:
+        minimum, maximum = next((low, high) for key, _, low, high in SEVERITY_BANDS if key == severity)
+        query['total_score'] = {'$gte': minimum, '$lte': maximum}
+    return query
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_assessment_rows(date_from=None, date_to=None, severity=None, patient_id=None, batch_size=None):
+    """
+    Recorre las valoraciones con un cursor de pymongo y agrega los datos del paciente
+
+    Las valoraciones se leen en lotes de `batch_size` documentos; por cada
+    lote los pacientes se consultan con un solo `$in`, de modo que la memoria
+    usada depende del tamaño del lote y no del total exportado. Se lee por la
+    conexión de analítica (secundario si lo hay) y sin maxTimeMS: la duración
+    de una exportación crece con la colección.
+
+    Yields:
+        dict: Una fila por valoración (columnas de ASSESSMENT_EXPORT_FIELDS)
+    """
+    batch_size = batch_size or settings.EXPORT_BATCH_SIZE
+    cursor = analytics_collection(PHQ9Assessment).find(
+        build_assessment_filter(date_from, date_to, severity, patient_id),
+        {'patient_id': 1, 'responses': 1, 'total_score': 1, 'date_created': 1}
+    ).sort([('date_created', 1), ('_id', 1)]).batch_size(batch_size)
+
+    for documents in _chunks(cursor, batch_size):
+        patients = {
+            patient['_id']: patient
+            for patient in analytics_collection(Paciente).find(
+                {'_id': {'$in': list({document['patient_id'] for document in documents})}},
+                PATIENT_PROJECTION
+            )
+        }
+
+        for document in documents:
+            patient = patients.get(document['patient_id'], {})
+            responses = document.get('responses') or []
+            total_score = document.get('total_score')
+            fecha_nacimiento = patient.get('fecha_nacimiento')
+            yield {
+                'assessment_id': str(document['_id']),
+                'patient_id': str(document['patient_id']),
+                'identificacion': patient.get('identificacion'),
+                'nombre': patient.get('nombre'),
+                'apellido': patient.get('apellido'),
+                'fecha_nacimiento': fecha_nacimiento.date() if fecha_nacimiento else None,
+                **{
+                    f'respuesta_{item}': responses[item - 1] if item <= len(responses) else None
+                    for item in range(1, PHQ9_ITEMS + 1)
+                },
+                'total_score': total_score,
+                'severity_level': get_severity_level(total_score) if total_score is not None else None,
+                'date_created': document.get('date_created'),
+            }
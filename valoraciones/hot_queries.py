@@ -0,0 +1,49 @@
+"""
+Consultas frecuentes de valoraciones verificadas por `manage.py check_query_plans`
+"""
+
+import uuid
+from datetime import datetime
+
+from mongoengine.queryset.visitor import Q
+
+from psybot.utils.query_plans import register_hot_query
+from .models import PHQ9Assessment, AnalysisJob
+
+
+@register_hot_query('valoraciones.tendencias_paciente')
+def tendencias_paciente():
+    # Análisis de tendencias (API REST y web)
+    return PHQ9Assessment.objects(patient_id=uuid.uuid4()).order_by('date_created')
+
+
+@register_hot_query('valoraciones.valoraciones_paciente')
+def valoraciones_paciente():
+    # ValoracionesPacienteView
+    return PHQ9Assessment.objects(patient_id=uuid.uuid4()).order_by('-date_created')
+
+
+@register_hot_query('valoraciones.listado')
+def listado():
+    # Página de valoraciones y GET /api/assessments/
+    return PHQ9Assessment.objects.order_by('-date_created', '-id').limit(50)
+
+
+@register_hot_query('valoraciones.listado_cursor_paciente')
+def listado_cursor_paciente():
+    # GET /api/assessments/?patient_id=...&cursor=...
+    date_created = datetime.utcnow()
+    return PHQ9Assessment.objects(
+        Q(date_created__lt=date_created) | Q(date_created=date_created, id__lt=uuid.uuid4()),
+        patient_id=uuid.uuid4()
+    ).order_by('-date_created', '-id').limit(50)
+
+
+@register_hot_query('valoraciones.cola_trabajos')
+def cola_trabajos():
+    # claim_next_job de los workers de análisis
+    now = datetime.utcnow()
+    return AnalysisJob.objects(
+        Q(status=AnalysisJob.STATUS_PENDING, available_at__lte=now) |
+        Q(status=AnalysisJob.STATUS_RUNNING, locked_until__lt=now)
+    ).order_by('available_at').limit(1)
@@ -0,0 +1,168 @@
+"""
+Ingesta masiva de valoraciones PHQ-9 (POST /api/assessments/bulk/)
+"""
+
+from datetime import datetime, timezone
+import logging
+import uuid
+
+import numpy as np
+from django.utils.dateparse import parse_date, parse_datetime
+from pymongo import WriteConcern
+from pymongo.errors import BulkWriteError
+
+from .models import PHQ9Assessment
+from .rollups import record_assessments
+from .summaries import rebuild_patient_summaries
+from pacientes.models import Paciente
+from psybot.utils.mongo import get_write_concern
+
+logger = logging.getLogger(__name__)
+
+PHQ9_ITEMS = 9
+
+
+def _parse_uuid(value):
+    try:
+        return uuid.UUID(str(value))
+    except (TypeError, ValueError, AttributeError):
+        return None
+
+
+def _parse_date_created(value):
+    """
+    Fecha de la valoración en UTC sin zona horaria (como `datetime.utcnow`)
+
+    Returns:
+        datetime: La fecha, o None si el valor no es una fecha ISO 8601
+    """
+    if not isinstance(value, str):
+        return None
+    try:
+        moment = parse_datetime(value)
+        if moment is None:
+            day = parse_date(value)
+            moment = datetime(day.year, day.month, day.day) if day else None
+    except ValueError:
+        return None
+    if moment is not None and moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+def _has_valid_shape(responses):
+    return (
+        isinstance(responses, list) and len(responses) == PHQ9_ITEMS and
+        all(type(value) is int and abs(value) < 2 ** 31 for value in responses)
+    )
+
+
+def ingest_assessments(rows):
+    """
+    Valida e inserta un lote de valoraciones PHQ-9
+
+    Las filas se validan en conjunto: las respuestas se comprueban como una
+    matriz de NumPy, los pacientes con una única consulta `$in` y las
+    valoraciones válidas se escriben con un `insert_many` no ordenado. Una
+    fila inválida no impide insertar las demás.
+
+    Args:
+        rows (list): Objetos con `patient_id`, `responses` y opcionalmente
+            `date_created` (ISO 8601)
+
+    Returns:
+        dict: Totales, IDs creados por fila y errores por fila
+    """
+    errors = {}
+
+    def add_error(index, field, message):
+        errors.setdefault(index, {}).setdefault(field, []).append(message)
+
+    # Forma de cada fila (tipos y campos requeridos)
+    candidates = []
+    patient_ids = {}
+    dates = {}
+    for index, row in enumerate(rows):
+        if not isinstance(row, dict):
+            add_error(index, 'non_field_errors', 'Cada fila debe ser un objeto JSON')
+            continue
+
+        patient_id = _parse_uuid(row.get('patient_id'))
+        if patient_id is None:
+            add_error(index, 'patient_id', 'Debe ser un UUID válido')
+        else:
+            patient_ids[index] = patient_id
+
+        if not _has_valid_shape(row.get('responses')):
+            add_error(index, 'responses', f'PHQ-9 debe tener exactamente {PHQ9_ITEMS} respuestas enteras')
+        else:
+            candidates.append(index)
+
+        if row.get('date_created') is not None:
+            date_created = _parse_date_created(row['date_created'])
+            if date_created is None:
+                add_error(index, 'date_created', 'Debe ser una fecha ISO 8601')
+            else:
+                dates[index] = date_created
+
+    # Rango de las respuestas y puntajes totales, para todas las filas a la vez
+    totals = {}
+    if candidates:
+        matrix = np.array([rows[index]['responses'] for index in candidates], dtype=np.int64)
+        out_of_range = (matrix < 0) | (matrix > 3)
+        row_totals = matrix.sum(axis=1)
+        for position in np.flatnonzero(out_of_range.any(axis=1)):
+            item = int(np.argmax(out_of_range[position])) + 1
+            add_error(candidates[position], 'responses', f'La respuesta {item} debe estar entre 0 y 3')
+        for position, index in enumerate(candidates):
+            totals[index] = int(row_totals[position])
+
+    # Existencia de todos los pacientes con una sola consulta
+    existing = set(Paciente.objects(id__in=set(patient_ids.values())).scalar('id')) if patient_ids else set()
+    for index, patient_id in patient_ids.items():
+        if patient_id not in existing:
+            add_error(index, 'patient_id', 'El paciente especificado no existe')
+
+    # Inserción no ordenada de las filas válidas
+    now = datetime.utcnow()
+    documents = []
+    document_rows = []
+    for index in range(len(rows)):
+        if index in errors:
+            continue
+        documents.append({
+            '_id': uuid.uuid4(),
+            'patient_id': patient_ids[index],
+            'responses': rows[index]['responses'],
+            'total_score': totals[index],
+            'date_created': dates.get(index, now),
+        })
+        document_rows.append(index)
+
+    failed_documents = set()
+    if documents:
+        try:
+            PHQ9Assessment._get_collection().with_options(
+                write_concern=WriteConcern(**get_write_concern('assessment_bulk'))
+            ).insert_many(documents, ordered=False)
+        except BulkWriteError as e:
+            for write_error in e.details.get('writeErrors', []):
+                failed_documents.add(write_error['index'])
+                add_error(document_rows[write_error['index']], 'non_field_errors', write_error.get('errmsg', 'Error de escritura'))
+
+    inserted = [
+        (index, document) for position, (index, document) in enumerate(zip(document_rows, documents))
+        if position not in failed_documents
+    ]
+
+    # Resumen de los pacientes afectados (una agregación por bloque) y rollups (una escritura por día)
+    rebuild_patient_summaries({document['patient_id'] for _, document in inserted})
+    record_assessments([(document['total_score'], document['date_created']) for _, document in inserted])
+
+    return {
+        'received': len(rows),
+        'inserted': len(inserted),
+        'failed': len(errors),
+        'ids': [{'index': index, 'id': str(document['_id'])} for index, document in inserted],
+        'errors': [{'index': index, 'errors': errors[index]} for index in sorted(errors)],
+    }
@@ -0,0 +1,290 @@
+"""
+Cola persistente (MongoDB) de trabajos de análisis con Gemini AI y pool de workers
+"""
+
+from datetime import datetime, timedelta
+import logging
+import os
+import socket
+import threading
+import uuid
+
+from django.conf import settings
+from pymongo import ReturnDocument
+
+from .models import AnalysisJob
+from .analysis import (
+    AnalysisError,
+    analyze_assessment,
+    analyze_patient_trends,
+    analyze_assessment_web,
+    analyze_patient_trends_web,
+)
+from .trend_summary import build_trend_summary
+
+logger = logging.getLogger(__name__)
+
+
+# Tipos de trabajo y la función que los ejecuta (mismos parámetros que las vistas síncronas)
+JOB_HANDLERS = {
+    'assessment_analysis': lambda params: analyze_assessment(
+        params['assessment_id'], use_cache=params.get('use_cache', True)
+    ),
+    'trend_analysis': lambda params: analyze_patient_trends(
+        params['patient_id'], use_cache=params.get('use_cache', True)
+    ),
+    'web_assessment_analysis': lambda params: analyze_assessment_web(
+        params['valoracion_id'], use_cache=params.get('use_cache', True)
+    ),
+    'web_trend_analysis': lambda params: analyze_patient_trends_web(
+        params['patient_id'], use_cache=params.get('use_cache', True)
+    ),
+    # Construcción del resumen de historial que las peticiones HTTP no hacen en línea
+    'trend_summary': lambda params: build_trend_summary(params['patient_id']),
+}
+
+
+def enqueue_job(job_type, params):
+    """
+    Registra un trabajo de análisis pendiente
+
+    Args:
+        job_type (str): Uno de los tipos de JOB_HANDLERS
+        params (dict): Parámetros del trabajo (IDs serializados como texto)
+
+    Returns:
+        AnalysisJob: El trabajo creado
+    """
+    if job_type not in JOB_HANDLERS:
+        raise ValueError(f"Tipo de trabajo desconocido: {job_type}")
+
+    job = AnalysisJob(
+        job_type=job_type,
+        params={key: str(value) if isinstance(value, uuid.UUID) else value for key, value in params.items()},
+        max_attempts=settings.ANALYSIS_JOB_MAX_ATTEMPTS,
+    )
+    job.save()
+    return job
+
+
+def serialize_job(job):
+    """
+    Representación del trabajo para el endpoint de consulta de estado
+    """
+    return {
+        'id': str(job.id),
+        'job_type': job.job_type,
+        'status': job.status,
+        'attempts': job.attempts,
+        'max_attempts': job.max_attempts,
+        'result': job.result or None,
+        'error': job.error,
+        'date_created': job.date_created.isoformat() if job.date_created else None,
+        'date_started': job.date_started.isoformat() if job.date_started else None,
+        'date_finished': job.date_finished.isoformat() if job.date_finished else None,
+    }
+
+
+def claim_next_job(worker_id, visibility_timeout):
+    """
+    Toma atómicamente el siguiente trabajo disponible
+
+    Un trabajo está disponible si está pendiente o si su worker dejó vencer
+    el tiempo de visibilidad (por ejemplo, porque el proceso murió).
+
+    Returns:
+        AnalysisJob | None: El trabajo reservado para este worker
+    """
+    now = datetime.utcnow()
+    doc = AnalysisJob._get_collection().find_one_and_update(
+        {'$or': [
+            {'status': AnalysisJob.STATUS_PENDING, 'available_at': {'$lte': now}},
+            {'status': AnalysisJob.STATUS_RUNNING, 'locked_until': {'$lt': now}},
+        ]},
+        {
+            '$set': {
+                'status': AnalysisJob.STATUS_RUNNING,
+                'worker_id': worker_id,
+                'locked_until': now + timedelta(seconds=visibility_timeout),
+                'date_started': now,
+            },
+            '$inc': {'attempts': 1},
+        },
+        sort=[('available_at', 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+    return AnalysisJob._from_son(doc) if doc else None
+
+
+def _owned(job, worker_id):
+    """
+    Trabajos que siguen reservados por este worker en este intento (un worker
+    que lo vuelve a tomar al vencer la visibilidad incrementa `attempts`)
+    """
+    return AnalysisJob.objects(
+        id=job.id, worker_id=worker_id, status=AnalysisJob.STATUS_RUNNING, attempts=job.attempts
+    )
+
+
+def _finish_job(job, worker_id, **fields):
+    """
+    Actualiza el trabajo solo si este worker sigue siendo su dueño
+    """
+    updated = _owned(job, worker_id).update_one(**{f'set__{key}': value for key, value in fields.items()})
+    if not updated:
+        logger.warning(f"El trabajo {job.id} fue reasignado antes de que {worker_id} terminara")
+
+
+def extend_lock(job, worker_id, visibility_timeout):
+    """
+    Extiende el tiempo de visibilidad de un trabajo que este worker sigue ejecutando
+
+    Returns:
+        bool: False si el trabajo ya no es de este worker
+    """
+    return bool(_owned(job, worker_id).update_one(
+        set__locked_until=datetime.utcnow() + timedelta(seconds=visibility_timeout)
+    ))
+
+
+class JobHeartbeat(threading.Thread):
+    """
+    Hilo que extiende `locked_until` mientras se ejecuta el trabajo, para que
+    un análisis más largo que el tiempo de visibilidad no se reasigne a otro worker
+    """
+
+    def __init__(self, job, worker_id, visibility_timeout):
+        super().__init__(name=f'analysis-heartbeat-{job.id}', daemon=True)
+        self.job = job
+        self.worker_id = worker_id
+        self.visibility_timeout = visibility_timeout
+        # Se renueva tres veces por período: tolera una renovación perdida
+        self.interval = visibility_timeout / 3
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                if not extend_lock(self.job, self.worker_id, self.visibility_timeout):
+                    logger.warning(f"El trabajo {self.job.id} ya no pertenece a {self.worker_id}")
+                    return
+            except Exception as e:
+                logger.error(f"Error extendiendo la visibilidad del trabajo {self.job.id}: {e}")
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def execute_job(job, worker_id, visibility_timeout=None):
+    """
+    Ejecuta un trabajo reservado y registra su resultado, reintento o fallo
+
+    Mientras el handler se ejecuta, un JobHeartbeat mantiene la reserva.
+    """
+    now = datetime.utcnow()
+
+    if job.attempts > job.max_attempts:
+        _finish_job(
+            job, worker_id,
+            status=AnalysisJob.STATUS_FAILED,
+            error='Se agotaron los reintentos del trabajo',
+            date_finished=now,
+        )
+        return
+
+    heartbeat = JobHeartbeat(job, worker_id, visibility_timeout or settings.ANALYSIS_JOB_VISIBILITY_TIMEOUT)
+    heartbeat.start()
+    try:
+        result = JOB_HANDLERS[job.job_type](job.params)
+    except AnalysisError as e:
+        # Los errores del cliente (4xx) no mejoran con reintentos
+        retryable = e.status_code >= 500
+        error, error_status = e.message, e.status_code
+    except Exception as e:
+        logger.error(f"Error ejecutando el trabajo de análisis {job.id}: {e}")
+        retryable = True
+        error, error_status = f'Error interno: {str(e)}', 500
+    else:
+        _finish_job(
+            job, worker_id,
+            status=AnalysisJob.STATUS_SUCCEEDED,
+            result=result,
+            error=None,
+            error_status=None,
+            date_finished=datetime.utcnow(),
+        )
+        return
+    finally:
+        heartbeat.stop()
+
+    if retryable and job.attempts < job.max_attempts:
+        delay = settings.ANALYSIS_JOB_RETRY_DELAY * (2 ** (job.attempts - 1))
+        _finish_job(
+            job, worker_id,
+            status=AnalysisJob.STATUS_PENDING,
+            error=error,
+            error_status=error_status,
+            available_at=datetime.utcnow() + timedelta(seconds=delay),
+        )
+    else:
+        _finish_job(
+            job, worker_id,
+            status=AnalysisJob.STATUS_FAILED,
+            error=error,
+            error_status=error_status,
+            date_finished=datetime.utcnow(),
+        )
+
+
+class AnalysisWorker(threading.Thread):
+    """
+    Hilo que toma y ejecuta trabajos de la cola hasta recibir la señal de parada
+    """
+
+    def __init__(self, index, stop_event, poll_interval, visibility_timeout):
+        super().__init__(name=f'analysis-worker-{index}', daemon=True)
+        self.worker_id = f'{socket.gethostname()}:{os.getpid()}:{index}'
+        self.stop_event = stop_event
+        self.poll_interval = poll_interval
+        self.visibility_timeout = visibility_timeout
+
+    def run(self):
+        while not self.stop_event.is_set():
+            try:
+                job = claim_next_job(self.worker_id, self.visibility_timeout)
+            except Exception as e:
+                logger.error(f"Error consultando la cola de análisis: {e}")
+                job = None
+
+            if job is None:
+                self.stop_event.wait(self.poll_interval)
+                continue
+
+            execute_job(job, self.worker_id, self.visibility_timeout)
+
+
+def run_worker_pool(num_workers, poll_interval, visibility_timeout, stop_event=None):
+    """
+    Inicia el pool de workers y bloquea hasta que se active stop_event
+
+    Returns:
+        list: Los hilos de worker (ya detenidos)
+    """
+    stop_event = stop_event or threading.Event()
+    workers = [
+        AnalysisWorker(index, stop_event, poll_interval, visibility_timeout)
+        for index in range(num_workers)
+    ]
+    for worker in workers:
+        worker.start()
+
+    try:
+        while not stop_event.is_set():
+            stop_event.wait(1)
+    except KeyboardInterrupt:
+        stop_event.set()
+
+    for worker in workers:
+        worker.join()
+    return workers
@@ -0,0 +1,30 @@
+"""
+Comando para estimar la reutilización de los análisis clínicos no identificables
+"""
+
+import json
+
+from django.core.management.base import BaseCommand
+
+from valoraciones.deidentified import reuse_report
+
+
+class Command(BaseCommand):
+    help = ('Estima, sobre las valoraciones existentes, la proporción de análisis clínicos que serían '
+            'aciertos de caché con GEMINI_DEIDENTIFIED_ANALYSIS (respuestas y rango de edad)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help='Documentos por lote del cursor')
+        parser.add_argument('--json', action='store_true', help='Imprimir el informe completo en JSON')
+
+    def handle(self, *args, **options):
+        report = reuse_report(batch_size=options['batch_size'])
+        if options['json']:
+            self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
+            return
+
+        self.stdout.write(f"Valoraciones: {report['assessments']}")
+        self.stdout.write(f"Claves distintas (respuestas, rango de edad): {report['distinct_keys']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Proporción de aciertos esperada: {report['expected_hit_ratio']:.1%}"
+        ))
@@ -0,0 +1,60 @@
+"""
+Comando que verifica con explain() que las consultas frecuentes usan índices
+"""
+
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import autodiscover_modules
+
+from psybot.utils.query_plans import get_hot_queries, analyze_plan
+
+
+class Command(BaseCommand):
+    help = (
+        'Ejecuta explain() sobre las consultas registradas en los módulos hot_queries.py '
+        'y falla si alguna recorre la colección (COLLSCAN) u ordena en memoria (SORT)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--query', action='append', default=[],
+            help='Verificar solo esta consulta (puede repetirse)'
+        )
+        parser.add_argument(
+            '--json', action='store_true',
+            help='Imprimir el resultado en formato JSON'
+        )
+
+    def handle(self, *args, **options):
+        autodiscover_modules('hot_queries')
+        queries = get_hot_queries()
+
+        unknown = set(options['query']) - set(queries)
+        if unknown:
+            raise CommandError(f"Consultas no registradas: {', '.join(sorted(unknown))}")
+        names = options['query'] or sorted(queries)
+
+        results = {}
+        for name in names:
+            queryset = queries[name]()
+            # Acceder a la colección crea los índices declarados en el modelo
+            queryset._document._get_collection()
+            results[name] = analyze_plan(queryset.explain())
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+        else:
+            for name, result in results.items():
+                plan = ' <- '.join(result['stages'])
+                indexes = ', '.join(result['indexes']) or '-'
+                if result['problems']:
+                    self.stdout.write(self.style.ERROR(f"FALLA {name}: {plan} (índices: {indexes})"))
+                    for problem in result['problems']:
+                        self.stdout.write(f"      {problem}")
+                else:
+                    self.stdout.write(self.style.SUCCESS(f"OK    {name}: {plan} (índices: {indexes})"))
+
+        failed = [name for name, result in results.items() if result['problems']]
+        if failed:
+            raise CommandError(f"{len(failed)} consulta(s) sin índice adecuado: {', '.join(failed)}")
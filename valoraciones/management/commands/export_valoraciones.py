@@ -0,0 +1,49 @@
+"""
+Comando para exportar las valoraciones PHQ-9 con los datos del paciente
+"""
+
+import sys
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from psybot.utils.export import EXPORT_FORMATS, encode_export
+from valoraciones.export import ASSESSMENT_EXPORT_FIELDS, iter_assessment_rows
+from valoraciones.severity import SEVERITY_BANDS
+
+
+class Command(BaseCommand):
+    help = 'Exporta las valoraciones PHQ-9 (con datos del paciente) en NDJSON o CSV, en streaming'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', '-o', help='Archivo de salida (por defecto la salida estándar)')
+        parser.add_argument('--format', choices=EXPORT_FORMATS, default='ndjson', help='Formato de salida')
+        parser.add_argument('--gzip', action='store_true', help='Comprimir la salida con gzip')
+        parser.add_argument('--date-from', type=datetime.fromisoformat, help='Fecha de creación mínima (ISO 8601)')
+        parser.add_argument('--date-to', type=datetime.fromisoformat, help='Fecha de creación máxima (ISO 8601)')
+        parser.add_argument(
+            '--severity', choices=[key for key, *_ in SEVERITY_BANDS],
+            help='Solo valoraciones en esta banda de severidad'
+        )
+
+    def handle(self, *args, **options):
+        rows = iter_assessment_rows(
+            date_from=options['date_from'],
+            date_to=options['date_to'],
+            severity=options['severity']
+        )
+        chunks = encode_export(rows, options['format'], ASSESSMENT_EXPORT_FIELDS, compress=options['gzip'])
+
+        if not options['output']:
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
+            return
+
+        try:
+            with open(options['output'], 'wb') as output:
+                for chunk in chunks:
+                    output.write(chunk)
+        except OSError as e:
+            raise CommandError(f'No se pudo escribir el archivo: {e}')
+        self.stdout.write(self.style.SUCCESS(f"Valoraciones exportadas en {options['output']}"))
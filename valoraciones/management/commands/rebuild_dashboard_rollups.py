@@ -0,0 +1,15 @@
+"""
+Comando para recalcular los rollups diarios del dashboard
+"""
+
+from django.core.management.base import BaseCommand
+
+from valoraciones.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Recalcula la colección daily_rollups con agregaciones sobre valoraciones y pacientes'
+
+    def handle(self, *args, **options):
+        total = rebuild_rollups()
+        self.stdout.write(self.style.SUCCESS(f'Rollups recalculados: {total} días con actividad'))
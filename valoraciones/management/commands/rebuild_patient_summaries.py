@@ -0,0 +1,27 @@
+"""
+Comando para recalcular el resumen de valoraciones de cada paciente
+"""
+
+from django.core.management.base import BaseCommand
+
+from valoraciones.summaries import rebuild_all_summaries, rebuild_patient_summary
+
+
+class Command(BaseCommand):
+    help = 'Recalcula Paciente.resumen a partir de las valoraciones PHQ-9 existentes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--patient', action='append', default=[],
+            help='Recalcular solo este paciente (puede repetirse)'
+        )
+
+    def handle(self, *args, **options):
+        if options['patient']:
+            for patient_id in options['patient']:
+                rebuild_patient_summary(patient_id)
+            total = len(options['patient'])
+        else:
+            total = rebuild_all_summaries()
+
+        self.stdout.write(self.style.SUCCESS(f'Resúmenes recalculados: {total} pacientes'))
@@ -0,0 +1,55 @@
+"""
+Comando para ejecutar el pool de workers de la cola de análisis con Gemini AI
+"""
+
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from psybot.utils.gemini_models import gemini_models
+from valoraciones.jobs import run_worker_pool
+
+
+class Command(BaseCommand):
+    help = 'Ejecuta los workers que procesan los trabajos de análisis PHQ-9 encolados'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=settings.ANALYSIS_WORKERS,
+            help='Número de hilos de trabajo'
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=settings.ANALYSIS_JOB_POLL_INTERVAL,
+            help='Segundos de espera cuando la cola está vacía'
+        )
+        parser.add_argument(
+            '--visibility-timeout', type=int, default=settings.ANALYSIS_JOB_VISIBILITY_TIMEOUT,
+            help='Segundos tras los cuales un trabajo sin terminar vuelve a estar disponible'
+        )
+
+    def handle(self, *args, **options):
+        stop_event = threading.Event()
+
+        def stop(signum, frame):
+            self.stdout.write('Deteniendo workers...')
+            stop_event.set()
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        if settings.GEMINI_WARMUP:
+            gemini_models.warm_up()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Iniciando {options['workers']} workers de análisis "
+            f"(visibilidad: {options['visibility_timeout']}s)"
+        ))
+        run_worker_pool(
+            options['workers'],
+            options['poll_interval'],
+            options['visibility_timeout'],
+            stop_event=stop_event,
+        )
+        self.stdout.write(self.style.SUCCESS('Workers detenidos'))
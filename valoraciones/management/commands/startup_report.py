@@ -0,0 +1,99 @@
+"""
+Comando para medir el costo de arranque: importaciones y conexiones diferidas
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+# Se ejecuta en un proceso nuevo para medir un arranque en frío
+MEASURE_SCRIPT = r'''
+import json
+import sys
+import time
+
+timings = {}
+
+start = time.perf_counter()
+import django
+django.setup()
+timings['django_setup'] = time.perf_counter() - start
+
+start = time.perf_counter()
+import psybot.urls  # noqa: F401
+timings['url_conf'] = time.perf_counter() - start
+
+import mongoengine.connection
+report = {
+    'genai_loaded_at_boot': 'google.generativeai' in sys.modules,
+    'mongo_clients_at_boot': len(mongoengine.connection._connections),
+}
+
+from psybot.utils.gemini_models import load_genai
+start = time.perf_counter()
+load_genai()
+timings['genai_import'] = time.perf_counter() - start
+
+if '--skip-connect' not in sys.argv:
+    start = time.perf_counter()
+    try:
+        mongoengine.connection.get_db().command('ping')
+        timings['mongo_first_ping'] = time.perf_counter() - start
+    except Exception as e:
+        report['mongo_error'] = str(e)
+
+report['timings'] = {name: round(seconds, 4) for name, seconds in timings.items()}
+print(json.dumps(report))
+'''
+
+
+class Command(BaseCommand):
+    help = 'Muestra el tiempo de arranque y el costo de importar Gemini y conectar a MongoDB'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--skip-connect', action='store_true',
+            help='No medir la primera conexión a MongoDB'
+        )
+        parser.add_argument(
+            '--json', action='store_true',
+            help='Imprimir el reporte en formato JSON'
+        )
+
+    def handle(self, *args, **options):
+        command = [sys.executable, '-c', MEASURE_SCRIPT]
+        if options['skip_connect']:
+            command.append('--skip-connect')
+
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'psybot.settings')}
+        result = subprocess.run(
+            command, capture_output=True, text=True, env=env, cwd=str(settings.BASE_DIR)
+        )
+        if result.returncode != 0:
+            raise CommandError(f"Error midiendo el arranque:\n{result.stderr}")
+
+        # La última línea es el reporte (settings puede imprimir mensajes antes)
+        report = json.loads(result.stdout.strip().splitlines()[-1])
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        self.stdout.write('Reporte de arranque')
+        for name, seconds in report['timings'].items():
+            self.stdout.write(f"  {name:<20} {seconds * 1000:8.1f} ms")
+
+        self.stdout.write(f"  google.generativeai importado al iniciar: {report['genai_loaded_at_boot']}")
+        self.stdout.write(f"  Clientes MongoDB abiertos al iniciar: {report['mongo_clients_at_boot']}")
+        if 'mongo_error' in report:
+            self.stdout.write(self.style.WARNING(f"  Error conectando a MongoDB: {report['mongo_error']}"))
+
+        if report['genai_loaded_at_boot'] or report['mongo_clients_at_boot']:
+            self.stdout.write(self.style.WARNING('Hay inicializaciones que ocurren antes del primer uso'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Gemini y MongoDB se inicializan en el primer uso'))
@@ -1,6 +1,9 @@
-from mongoengine import Document, UUIDField, ListField, IntField, DateTimeField, ValidationError
+from mongoengine import (
+    Document, UUIDField, ListField, IntField, DateTimeField, StringField, DictField, ValidationError
+)
 import uuid
 from datetime import datetime
+from psybot.utils.identity_map import get_document, remember_document, forget_document
 
 class PHQ9Assessment(Document):
     id = UUIDField(primary_key=True, default=uuid.uuid4)
@@ -10,7 +13,12 @@ class PHQ9Assessment(Document):
     date_created = DateTimeField(default=datetime.utcnow)
 
     meta = {
-        'indexes': ['patient_id'],
+        'indexes': [
+            # Valoraciones de un paciente por fecha (tendencias, listados filtrados, distinct)
+            {'fields': ['patient_id', '-date_created', '-id']},
+            # Listado general por fecha (página de valoraciones y paginación por cursor)
+            {'fields': ['-date_created', '-id']},
+        ],
         'collection': 'phq9_assessment'
     }
 
@@ -21,7 +29,7 @@ class PHQ9Assessment(Document):
         
         # Validar que el paciente existe
         from pacientes.models import Paciente
-        if not Paciente.objects(id=self.patient_id).first():
+        if not get_document(Paciente, self.patient_id):
             raise ValidationError('El paciente especificado no existe')
         
         super().validate(clean)
@@ -29,4 +37,78 @@ class PHQ9Assessment(Document):
     def save(self, *args, **kwargs):
         # Calcular total_score automáticamente
         self.total_score = sum(self.responses)
-        super().save(*args, **kwargs)
\ No newline at end of file
+        
+        created = self._created
+        previous = None
+        if not created:
+            previous = PHQ9Assessment.objects(id=self.id).only(
+                'patient_id', 'total_score', 'date_created'
+            ).first()
+        
+        super().save(*args, **kwargs)
+        remember_document(self)
+        
+        # Mantener el resumen del paciente (y del anterior si la valoración cambió de paciente)
+        # y los rollups diarios del dashboard
+        from .summaries import apply_new_assessment, rebuild_patient_summary
+        from .rollups import record_assessment
+        from .trend_summary import forget_trend_summary
+        if created:
+            apply_new_assessment(self)
+            record_assessment(self.total_score, self.date_created)
+        else:
+            # Una valoración editada puede estar ya incorporada al resumen de tendencias
+            rebuild_patient_summary(self.patient_id)
+            forget_trend_summary(self.patient_id)
+            if previous and str(previous.patient_id) != str(self.patient_id):
+                rebuild_patient_summary(previous.patient_id)
+                forget_trend_summary(previous.patient_id)
+            if previous and (previous.total_score, previous.date_created) != (self.total_score, self.date_created):
+                record_assessment(previous.total_score, previous.date_created, sign=-1)
+                record_assessment(self.total_score, self.date_created)
+
+    def delete(self, *args, **kwargs):
+        super().delete(*args, **kwargs)
+        forget_document(PHQ9Assessment, self.id)
+        
+        from .summaries import rebuild_patient_summary
+        from .rollups import record_assessment
+        from .trend_summary import forget_trend_summary
+        rebuild_patient_summary(self.patient_id)
+        forget_trend_summary(self.patient_id)
+        record_assessment(self.total_score, self.date_created, sign=-1)
+
+
+class AnalysisJob(Document):
+    """
+    Trabajo de análisis con Gemini AI ejecutado de forma asíncrona por los workers
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    STATUSES = (STATUS_PENDING, STATUS_RUNNING, STATUS_SUCCEEDED, STATUS_FAILED)
+
+    id = UUIDField(primary_key=True, default=uuid.uuid4)
+    job_type = StringField(required=True)
+    params = DictField()
+    status = StringField(default=STATUS_PENDING, choices=STATUSES)
+    attempts = IntField(default=0)
+    max_attempts = IntField(default=3)
+    result = DictField()
+    error = StringField()
+    error_status = IntField()
+    worker_id = StringField()
+    available_at = DateTimeField(default=datetime.utcnow)
+    locked_until = DateTimeField()
+    date_created = DateTimeField(default=datetime.utcnow)
+    date_started = DateTimeField()
+    date_finished = DateTimeField()
+
+    meta = {
+        'indexes': [
+            # Cubre ambas ramas del $or de claim_next_job sin ordenar en memoria
+            ('status', 'available_at', 'locked_until'),
+        ],
+        'collection': 'analysis_jobs'
+    }
@@ -0,0 +1,228 @@
+"""
+Agregados diarios (rollups) para el dashboard, actualizados en cada escritura
+"""
+
+from datetime import datetime, timedelta
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from mongoengine import Document, StringField, DateTimeField, IntField, DictField
+from pymongo import ReplaceOne
+
+from .severity import SEVERITY_BANDS, get_severity_band
+from psybot.utils.mongo import ANALYTICS_ALIAS, analytics_collection, with_max_time
+
+logger = logging.getLogger(__name__)
+
+DASHBOARD_CACHE_KEY = 'dashboard_rollups'
+
+
+class DailyRollup(Document):
+    """
+    Contadores de un día: valoraciones, pacientes nuevos, suma de puntajes y bandas de severidad
+    """
+    day = StringField(primary_key=True)
+    date = DateTimeField(required=True)
+    assessments = IntField(default=0)
+    new_patients = IntField(default=0)
+    score_sum = IntField(default=0)
+    severity = DictField()
+
+    meta = {
+        'indexes': ['date'],
+        'collection': 'daily_rollups'
+    }
+
+
+def _bucket(moment):
+    """
+    Clave ('YYYY-MM-DD') y fecha de inicio del día al que pertenece `moment`
+    """
+    day = datetime(moment.year, moment.month, moment.day)
+    return day.strftime('%Y-%m-%d'), day
+
+
+def _increment(moment, increments):
+    key, day = _bucket(moment)
+    try:
+        DailyRollup._get_collection().update_one(
+            {'_id': key},
+            {'$inc': increments, '$setOnInsert': {'date': day}},
+            upsert=True
+        )
+        cache.delete(DASHBOARD_CACHE_KEY)
+    except Exception as e:
+        # El rollup se puede reconstruir; no debe impedir guardar la valoración
+        logger.warning(f"Error actualizando el rollup diario {key}: {e}")
+
+
+def record_assessment(score, date_created, sign=1):
+    """
+    Suma (sign=1) o resta (sign=-1) una valoración en el rollup de su día
+    """
+    increments = {'assessments': sign, 'score_sum': sign * score}
+    band = get_severity_band(score)
+    if band:
+        increments[f'severity.{band}'] = sign
+    _increment(date_created, increments)
+
+
+def record_assessments(assessments):
+    """
+    Suma un lote de valoraciones con una actualización por día (ingesta masiva)
+
+    Args:
+        assessments: Pares (puntaje, fecha de creación)
+    """
+    by_day = {}
+    for score, date_created in assessments:
+        key, _ = _bucket(date_created)
+        moment, increments = by_day.setdefault(key, (date_created, {'assessments': 0, 'score_sum': 0}))
+        increments['assessments'] += 1
+        increments['score_sum'] += score
+        band = get_severity_band(score)
+        if band:
+            increments[f'severity.{band}'] = increments.get(f'severity.{band}', 0) + 1
+
+    for moment, increments in by_day.values():
+        _increment(moment, increments)
+
+
+def record_new_patient(fecha_creacion, sign=1):
+    """
+    Suma (sign=1) o resta (sign=-1) un paciente nuevo en el rollup de su día
+    """
+    _increment(fecha_creacion, {'new_patients': sign})
+
+
+def record_new_patients(fechas_creacion):
+    """
+    Suma un lote de pacientes nuevos con una actualización por día (importación masiva)
+    """
+    by_day = {}
+    for fecha_creacion in fechas_creacion:
+        key, _ = _bucket(fecha_creacion)
+        moment, total = by_day.get(key, (fecha_creacion, 0))
+        by_day[key] = (moment, total + 1)
+
+    for moment, total in by_day.values():
+        _increment(moment, {'new_patients': total})
+
+
+def _build_dashboard_stats(days):
+    # Lectura por la conexión de analítica: el dashboard tolera el retraso de un secundario
+    rollups = list(with_max_time(analytics_collection(DailyRollup).find({}), ANALYTICS_ALIAS))
+
+    total_valoraciones = sum(r.get('assessments', 0) for r in rollups)
+    total_puntajes = sum(r.get('score_sum', 0) for r in rollups)
+    severidad = {key: 0 for key, *_ in SEVERITY_BANDS}
+    for rollup in rollups:
+        for key, count in rollup.get('severity', {}).items():
+            severidad[key] = severidad.get(key, 0) + count
+
+    # Serie de los últimos `days` días (los días sin actividad van en cero)
+    by_day = {rollup['_id']: rollup for rollup in rollups}
+    _, today = _bucket(datetime.utcnow())
+    serie = []
+    for offset in range(days - 1, -1, -1):
+        key, day = _bucket(today - timedelta(days=offset))
+        rollup = by_day.get(key, {})
+        valoraciones = rollup.get('assessments', 0)
+        serie.append({
+            'fecha': day,
+            'valoraciones': valoraciones,
+            'pacientes_nuevos': rollup.get('new_patients', 0),
+            'puntaje_promedio': round(rollup.get('score_sum', 0) / valoraciones, 1) if valoraciones else None,
+        })
+    maximo = max([dia['valoraciones'] for dia in serie] + [1])
+    for dia in serie:
+        dia['altura'] = round(dia['valoraciones'] * 100 / maximo)
+
+    return {
+        'total_pacientes': sum(r.get('new_patients', 0) for r in rollups),
+        'total_valoraciones': total_valoraciones,
+        'puntaje_promedio': round(total_puntajes / total_valoraciones, 1) if total_valoraciones else None,
+        'severidad': [
+            {
+                'clave': key,
+                'nombre': nombre,
+                'total': severidad[key],
+                'porcentaje': round(severidad[key] * 100 / total_valoraciones, 1) if total_valoraciones else 0,
+            }
+            for key, nombre, *_ in SEVERITY_BANDS
+        ],
+        'serie': serie,
+        'dias': days,
+    }
+
+
+def get_dashboard_stats():
+    """
+    Estadísticas del dashboard calculadas desde los rollups (lee O(días), no O(valoraciones))
+
+    El resultado se guarda en la caché del proceso durante DASHBOARD_CACHE_SECONDS.
+
+    Returns:
+        dict: Totales, distribución por severidad y serie diaria
+    """
+    stats = cache.get(DASHBOARD_CACHE_KEY)
+    if stats is None:
+        stats = _build_dashboard_stats(settings.DASHBOARD_DAYS)
+        cache.set(DASHBOARD_CACHE_KEY, stats, settings.DASHBOARD_CACHE_SECONDS)
+    return stats
+
+
+def _day_expression(field):
+    return {'$dateToString': {'format': '%Y-%m-%d', 'date': f'${field}'}}
+
+
+def rebuild_rollups():
+    """
+    Recalcula todos los rollups con pipelines de agregación sobre valoraciones y pacientes
+
+    Returns:
+        int: Número de días con actividad
+    """
+    from pacientes.models import Paciente
+    from .models import PHQ9Assessment
+
+    group = {
+        '_id': _day_expression('date_created'),
+        'assessments': {'$sum': 1},
+        'score_sum': {'$sum': '$total_score'},
+    }
+    for key, _, minimum, maximum in SEVERITY_BANDS:
+        group[key] = {'$sum': {'$cond': [
+            {'$and': [{'$gte': ['$total_score', minimum]}, {'$lte': ['$total_score', maximum]}]}, 1, 0
+        ]}}
+
+    rollups = {}
+    for row in PHQ9Assessment._get_collection().aggregate([{'$group': group}], allowDiskUse=True):
+        rollups[row['_id']] = {
+            'assessments': row['assessments'],
+            'score_sum': row['score_sum'],
+            'severity': {key: row[key] for key, *_ in SEVERITY_BANDS if row[key]},
+        }
+
+    for row in Paciente._get_collection().aggregate([
+        {'$group': {'_id': _day_expression('fecha_creacion'), 'new_patients': {'$sum': 1}}}
+    ], allowDiskUse=True):
+        rollups.setdefault(row['_id'], {})['new_patients'] = row['new_patients']
+
+    # Reemplazar día por día (el dashboard nunca ve la colección vacía) y quitar los días sin actividad
+    collection = DailyRollup._get_collection()
+    if rollups:
+        collection.bulk_write([
+            ReplaceOne({'_id': key}, {
+                'date': datetime.strptime(key, '%Y-%m-%d'),
+                'assessments': values.get('assessments', 0),
+                'new_patients': values.get('new_patients', 0),
+                'score_sum': values.get('score_sum', 0),
+                'severity': values.get('severity', {}),
+            }, upsert=True)
+            for key, values in rollups.items()
+        ], ordered=False)
+    collection.delete_many({'_id': {'$nin': list(rollups)}})
+    cache.delete(DASHBOARD_CACHE_KEY)
+    return len(rollups)
@@ -1,7 +1,10 @@
 from rest_framework_mongoengine.serializers import DocumentSerializer
 from rest_framework import serializers
+from django.conf import settings
 from .models import PHQ9Assessment
+from .severity import SEVERITY_BANDS
 from pacientes.models import Paciente
+from psybot.utils.identity_map import get_document
 
 class PHQ9AssessmentSerializer(DocumentSerializer):
     class Meta:
@@ -11,7 +14,7 @@ class PHQ9AssessmentSerializer(DocumentSerializer):
 
     def validate_patient_id(self, value):
         """Validar que el paciente existe"""
-        if not Paciente.objects(id=value).first():
+        if not get_document(Paciente, value):
             raise serializers.ValidationError("El paciente especificado no existe")
         return value
 
@@ -27,16 +30,36 @@ class PHQ9AssessmentSerializer(DocumentSerializer):
         
         return value
 
+    def create(self, validated_data):
+        """Crear con el write concern que indique la vista (contexto 'write_concern')"""
+        instance = PHQ9Assessment(**validated_data)
+        instance.save(write_concern=self.context.get('write_concern'))
+        return instance
+
+    def update(self, instance, validated_data):
+        for key, value in validated_data.items():
+            setattr(instance, key, value)
+        instance.save(write_concern=self.context.get('write_concern'))
+        return instance
+
 
 class AnalyzeAssessmentSerializer(serializers.Serializer):
     """
     Serializer para los parámetros de análisis individual de PHQ-9
     """
     assessment_id = serializers.UUIDField(required=True, help_text="ID de la valoración PHQ-9 a analizar")
+    bypass_cache = serializers.BooleanField(
+        required=False, default=False,
+        help_text="Ignorar la caché y regenerar el análisis con Gemini AI"
+    )
+    run_async = serializers.BooleanField(
+        required=False, default=False,
+        help_text="Encolar el análisis y responder 202 con el ID del trabajo"
+    )
     
     def validate_assessment_id(self, value):
         """Validar que la valoración existe"""
-        if not PHQ9Assessment.objects(id=value).first():
+        if not get_document(PHQ9Assessment, value):
             raise serializers.ValidationError("La valoración PHQ-9 especificada no existe")
         return value
 
@@ -46,14 +69,77 @@ class AnalyzeTrendsSerializer(serializers.Serializer):
     Serializer para los parámetros de análisis de tendencias
     """
     patient_id = serializers.UUIDField(required=True, help_text="ID del paciente para análisis de tendencias")
+    bypass_cache = serializers.BooleanField(
+        required=False, default=False,
+        help_text="Ignorar la caché y regenerar el análisis con Gemini AI"
+    )
+    run_async = serializers.BooleanField(
+        required=False, default=False,
+        help_text="Encolar el análisis y responder 202 con el ID del trabajo"
+    )
     
     def validate_patient_id(self, value):
         """Validar que el paciente existe y tiene valoraciones"""
-        if not Paciente.objects(id=value).first():
+        paciente = get_document(Paciente, value)
+        if not paciente:
             raise serializers.ValidationError("El paciente especificado no existe")
         
-        # Verificar que el paciente tiene valoraciones
-        if not PHQ9Assessment.objects(patient_id=value).first():
+        # Verificar que el paciente tiene valoraciones (según su resumen, si ya se calculó)
+        if paciente.resumen is not None:
+            tiene_valoraciones = paciente.resumen.total_valoraciones > 0
+        else:
+            tiene_valoraciones = PHQ9Assessment.objects(patient_id=value).first() is not None
+        if not tiene_valoraciones:
             raise serializers.ValidationError("No se encontraron valoraciones para este paciente")
         
         return value
+
+
+class AnalyzeBatchSerializer(serializers.Serializer):
+    """
+    Serializer para los parámetros de análisis por lotes de valoraciones PHQ-9
+    """
+    assessment_ids = serializers.ListField(
+        child=serializers.UUIDField(),
+        min_length=1,
+        max_length=settings.ANALYSIS_BATCH_MAX_ITEMS,
+        help_text="IDs de las valoraciones PHQ-9 a analizar"
+    )
+    concurrency = serializers.IntegerField(
+        required=False,
+        default=settings.ANALYSIS_BATCH_DEFAULT_CONCURRENCY,
+        min_value=1,
+        max_value=settings.ANALYSIS_BATCH_MAX_CONCURRENCY,
+        help_text="Máximo de llamadas simultáneas a Gemini AI para este lote"
+    )
+    bypass_cache = serializers.BooleanField(
+        required=False, default=False,
+        help_text="Ignorar la caché y regenerar los análisis con Gemini AI"
+    )
+
+
+class AssessmentListFilterSerializer(serializers.Serializer):
+    """
+    Serializer para los filtros del listado de valoraciones PHQ-9
+    """
+    patient_id = serializers.UUIDField(required=False, help_text="Solo valoraciones de este paciente")
+    date_from = serializers.DateTimeField(required=False, help_text="Fecha de creación mínima (inclusive)")
+    date_to = serializers.DateTimeField(required=False, help_text="Fecha de creación máxima (inclusive)")
+
+
+class AssessmentExportSerializer(serializers.Serializer):
+    """
+    Serializer para los parámetros de la exportación de valoraciones PHQ-9
+    """
+    output = serializers.ChoiceField(
+        choices=['ndjson', 'csv'], required=False, default='ndjson',
+        help_text="Formato del archivo exportado"
+    )
+    compress = serializers.BooleanField(required=False, default=False, help_text="Comprimir la descarga con gzip")
+    patient_id = serializers.UUIDField(required=False, help_text="Solo valoraciones de este paciente")
+    date_from = serializers.DateTimeField(required=False, help_text="Fecha de creación mínima (inclusive)")
+    date_to = serializers.DateTimeField(required=False, help_text="Fecha de creación máxima (inclusive)")
+    severity = serializers.ChoiceField(
+        choices=[key for key, *_ in SEVERITY_BANDS], required=False,
+        help_text="Solo valoraciones en esta banda de severidad"
+    )
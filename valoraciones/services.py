@@ -2,35 +2,215 @@
 Servicios para análisis con Gemini AI
 """
 
-import os
-import google.generativeai as genai
 from django.conf import settings
+from .analytics import format_trend_metrics, metrics_from_assessments
+from .deidentified import deidentified_enabled
 from .models import PHQ9Assessment
+from .summaries import load_trend_assessments
+from .trend_summary import summarize_history
 from pacientes.models import Paciente
+from psybot.utils.gemini_cache import analysis_cache_tags
+from psybot.utils.gemini_client import gemini_client
+from psybot.utils.gemini_models import gemini_models
+from psybot.utils.identity_map import get_document_or_raise
+from psybot.utils.prompts import fit_history, prompt_template, render_prompt
+
+
+SINGLE_ASSESSMENT_TEMPLATE = prompt_template("""
+    Como psicólogo clínico experto, analiza la siguiente valoración PHQ-9:
+
+    Paciente: {nombre}
+    Fecha de nacimiento: {fecha_nacimiento}
+    Fecha de valoración: {fecha}
+
+    Respuestas PHQ-9: {respuestas}
+    Puntuación total: {puntuacion}/27
+
+    Proporciona un análisis clínico detallado que incluya:
+    1. Interpretación de la severidad de la depresión
+    2. Análisis de síntomas específicos más relevantes
+    3. Recomendaciones clínicas
+    4. Sugerencias de seguimiento
+
+    Responde en español y de manera profesional.
+""")
+
+TRENDS_TEMPLATE = prompt_template("""
+    Como psicólogo clínico experto, analiza las siguientes valoraciones PHQ-9 secuenciales:
+
+    Paciente: {nombre}
+    Fecha de nacimiento: {fecha_nacimiento}
+    Número de valoraciones: {total}
+
+    {seccion_resumen}
+
+    Datos de valoraciones:
+    {datos}
+
+    Métricas calculadas (exactas; úsalas en lugar de estimarlas):
+    {metricas}
+
+    Proporciona un análisis de tendencias que incluya:
+    1. Evolución temporal de la severidad de la depresión
+    2. Patrones identificados en los síntomas
+    3. Interpretación de la progresión del paciente
+    4. Recomendaciones para tratamiento futuro
+    5. Indicadores de mejora o empeoramiento
+
+    Responde en español y de manera profesional.
+""")
+
+TRENDS_SUMMARY_SECTION = prompt_template("""
+    Resumen de las valoraciones 1 a {resumidas}:
+    {resumen}
+""")
+
+TRENDS_ASSESSMENT_ENTRY = prompt_template("""
+    Valoración {numero} ({fecha}):
+    - Puntuación total: {puntuacion}/27
+    - Respuestas: {respuestas}
+""")
 
 
 class GeminiAnalysisService:
     """Servicio para análisis de valoraciones PHQ-9 usando Gemini AI"""
     
-    def __init__(self):
-        """Inicializar el servicio de Gemini"""
-        try:
-            api_key = getattr(settings, 'GEMINI_API_KEY', None)
-            if api_key:
-                genai.configure(api_key=api_key)
-                self.model = genai.GenerativeModel('gemini-1.5-flash')
-                self.available = True
-            else:
-                self.available = False
-        except Exception:
-            self.available = False
+    @property
+    def model_name(self):
+        return settings.GEMINI_MODEL
+    
+    @property
+    def model(self):
+        """Modelo compartido del proceso (mismo registro que usa la API REST)"""
+        return gemini_models.get_model(self.model_name)
+    
+    @property
+    def available(self):
+        return gemini_models.is_configured()
+    
+    def _generate(self, prompt, use_cache=True, cache_tags=None, cache_scope=None, endpoint=None):
+        """
+        Generar texto con Gemini consultando primero la caché de respuestas
+        
+        Se delega en gemini_client: la misma configuración de generación
+        (GEMINI_TEMPERATURE, GEMINI_MAX_TOKENS), la misma clave de caché y el
+        mismo single-flight que la API REST.
+        
+        Args:
+            prompt (str): Prompt a enviar
+            use_cache (bool): Si es False se regenera la respuesta ignorando la caché
+            cache_tags (list): Etiquetas para invalidar la entrada
+            cache_scope (str): Ámbito de los contadores de aciertos de la caché
+            endpoint (str): Clave del endpoint para el registro de tokens
+            
+        Returns:
+            str: Texto generado
+        """
+        text = gemini_client.generate_text(
+            prompt, use_cache=use_cache, cache_tags=cache_tags, cache_scope=cache_scope, endpoint=endpoint
+        )
+        if not text:
+            raise RuntimeError('Gemini no generó una respuesta')
+        return text
+    
+    def _stream(self, prompt, use_cache=True, cache_tags=None, cache_scope=None, endpoint=None):
+        """
+        Generar texto con Gemini entregando los fragmentos a medida que llegan
+        
+        Args:
+            prompt (str): Prompt a enviar
+            use_cache (bool): Si es False se regenera la respuesta ignorando la caché
+            cache_tags (list): Etiquetas para invalidar la entrada
+            cache_scope (str): Ámbito de los contadores de aciertos de la caché
+            endpoint (str): Clave del endpoint para el registro de tokens
+            
+        Yields:
+            str: Fragmentos del texto generado
+        """
+        yield from gemini_client.stream_text(
+            prompt, use_cache=use_cache, cache_tags=cache_tags, cache_scope=cache_scope, endpoint=endpoint
+        )
+    
+    def build_single_assessment_prompt(self, assessment, paciente):
+        """
+        Crear el prompt de análisis de una valoración PHQ-9 individual
+        """
+        return render_prompt(
+            SINGLE_ASSESSMENT_TEMPLATE,
+            nombre=f"{paciente.nombre} {paciente.apellido}",
+            fecha_nacimiento=paciente.fecha_nacimiento,
+            fecha=assessment.date_created.strftime('%d/%m/%Y'),
+            respuestas=assessment.responses,
+            puntuacion=assessment.total_score
+        )
+    
+    def build_single_assessment_request(self, assessment, paciente):
+        """
+        Prompt, opciones de caché y encabezado local del análisis individual
+        
+        Con GEMINI_DEIDENTIFIED_ANALYSIS se usa el mismo prompt no identificable,
+        etiqueta y ámbito de caché que la API REST (build_assessment_analysis):
+        el nombre y la fecha de nacimiento no se envían a Gemini.
+        
+        Returns:
+            tuple: (prompt, opciones de caché para _generate/_stream, encabezado)
+        """
+        if deidentified_enabled():
+            from .analysis import build_assessment_analysis
+            prompt, _, cache_options, header = build_assessment_analysis(assessment, paciente)
+            return prompt, cache_options, header
+        
+        cache_options = {'cache_tags': analysis_cache_tags(assessment.id, assessment.patient_id)}
+        return self.build_single_assessment_prompt(assessment, paciente), cache_options, ''
     
-    def analyze_single_assessment(self, assessment_id):
+    def build_trends_prompt(self, paciente, valoraciones):
+        """
+        Crear el prompt de análisis de tendencias de las valoraciones de un paciente
+        
+        Las valoraciones anteriores a las más recientes llegan como el resumen
+        persistente del paciente (trend_summary) en lugar de una por una; si aun
+        así el detalle supera el presupuesto 'trends' se omiten las más antiguas.
+        """
+        resumen, resumidas = summarize_history(paciente.id, valoraciones, defer=True)
+        seccion_resumen = ''
+        if resumen:
+            seccion_resumen = TRENDS_SUMMARY_SECTION.format(resumidas=resumidas, resumen=resumen)
+        metricas = format_trend_metrics(metrics_from_assessments(valoraciones))
+        
+        def render(recientes, omitidas):
+            # Numeración sobre todo el historial
+            inicio = len(valoraciones) - len(recientes) + 1
+            datos = [
+                TRENDS_ASSESSMENT_ENTRY.format(
+                    numero=i,
+                    fecha=val.date_created.strftime('%d/%m/%Y'),
+                    puntuacion=val.total_score,
+                    respuestas=val.responses
+                )
+                for i, val in enumerate(recientes, inicio)
+            ]
+            if omitidas:
+                datos.insert(0, f"({omitidas} valoraciones omitidas por longitud; incluidas en las métricas)")
+            return render_prompt(
+                TRENDS_TEMPLATE,
+                nombre=f"{paciente.nombre} {paciente.apellido}",
+                fecha_nacimiento=paciente.fecha_nacimiento,
+                total=len(valoraciones),
+                seccion_resumen=seccion_resumen,
+                datos="\n".join(datos),
+                metricas=metricas
+            )
+        
+        prompt, _ = fit_history(render, valoraciones[resumidas:], 'trends')
+        return prompt
+    
+    def analyze_single_assessment(self, assessment_id, use_cache=True):
         """
         Analizar una valoración PHQ-9 individual
         
         Args:
             assessment_id (str): ID de la valoración
+            use_cache (bool): Usar la caché de análisis previos
             
         Returns:
             str: Análisis clínico generado por Gemini
@@ -40,42 +220,46 @@ class GeminiAnalysisService:
         
         try:
             # Obtener la valoración
-            assessment = PHQ9Assessment.objects.get(id=assessment_id)
-            paciente = Paciente.objects.get(id=assessment.patient_id)
-            
-            # Crear prompt para Gemini
-            prompt = f"""
-            Como psicólogo clínico experto, analiza la siguiente valoración PHQ-9:
-            
-            Paciente: {paciente.nombre} {paciente.apellido}
-            Fecha de nacimiento: {paciente.fecha_nacimiento}
-            Fecha de valoración: {assessment.date_created.strftime('%d/%m/%Y')}
-            
-            Respuestas PHQ-9: {assessment.responses}
-            Puntuación total: {assessment.total_score}/27
-            
-            Proporciona un análisis clínico detallado que incluya:
-            1. Interpretación de la severidad de la depresión
-            2. Análisis de síntomas específicos más relevantes
-            3. Recomendaciones clínicas
-            4. Sugerencias de seguimiento
-            
-            Responde en español y de manera profesional.
-            """
+            assessment = get_document_or_raise(PHQ9Assessment, assessment_id)
+            paciente = get_document_or_raise(Paciente, assessment.patient_id)
             
             # Generar análisis
-            response = self.model.generate_content(prompt)
-            return response.text
+            prompt, cache_options, header = self.build_single_assessment_request(assessment, paciente)
+            return header + self._generate(prompt, use_cache=use_cache, endpoint='clinical', **cache_options)
             
         except Exception as e:
             return f"Error al generar análisis: {str(e)}"
     
-    def analyze_trends(self, patient_id):
+    def stream_single_assessment(self, assessment_id, use_cache=True):
+        """
+        Variante en streaming de analyze_single_assessment
+        
+        Yields:
+            str: Fragmentos del análisis clínico generado por Gemini
+        """
+        if not self.available:
+            yield "Servicio de análisis no disponible. Configure la API de Gemini."
+            return
+        
+        try:
+            assessment = get_document_or_raise(PHQ9Assessment, assessment_id)
+            paciente = get_document_or_raise(Paciente, assessment.patient_id)
+            
+            prompt, cache_options, header = self.build_single_assessment_request(assessment, paciente)
+            if header:
+                yield header
+            yield from self._stream(prompt, use_cache=use_cache, endpoint='clinical', **cache_options)
+            
+        except Exception as e:
+            yield f"Error al generar análisis: {str(e)}"
+    
+    def analyze_trends(self, patient_id, use_cache=True):
         """
         Analizar tendencias de múltiples valoraciones de un paciente
         
         Args:
             patient_id (str): ID del paciente
+            use_cache (bool): Usar la caché de análisis previos
             
         Returns:
             str: Análisis de tendencias generado por Gemini
@@ -85,54 +269,52 @@ class GeminiAnalysisService:
         
         try:
             # Obtener paciente y valoraciones
-            paciente = Paciente.objects.get(id=patient_id)
-            valoraciones = PHQ9Assessment.objects.filter(patient_id=patient_id).order_by('date_created')
+            paciente = get_document_or_raise(Paciente, patient_id)
+            valoraciones = load_trend_assessments(patient_id, paciente)
             
             if not valoraciones:
                 return "No hay valoraciones para este paciente."
             
-            # Preparar datos para el análisis
-            datos_valoraciones = []
-            for val in valoraciones:
-                datos_valoraciones.append({
-                    'fecha': val.date_created.strftime('%d/%m/%Y'),
-                    'puntuacion': val.total_score,
-                    'respuestas': val.responses
-                })
-            
-            # Crear prompt para análisis de tendencias
-            prompt = f"""
-            Como psicólogo clínico experto, analiza las siguientes valoraciones PHQ-9 secuenciales:
-            
-            Paciente: {paciente.nombre} {paciente.apellido}
-            Fecha de nacimiento: {paciente.fecha_nacimiento}
-            Número de valoraciones: {len(datos_valoraciones)}
-            
-            Datos de valoraciones:
-            """
-            
-            for i, datos in enumerate(datos_valoraciones, 1):
-                prompt += f"""
-            Valoración {i} ({datos['fecha']}):
-            - Puntuación total: {datos['puntuacion']}/27
-            - Respuestas: {datos['respuestas']}
-            """
-            
-            prompt += """
+            # Generar análisis
+            return self._generate(
+                self.build_trends_prompt(paciente, valoraciones),
+                use_cache=use_cache,
+                cache_tags=analysis_cache_tags(patient_id=paciente.id),
+                endpoint='trends'
+            )
             
-            Proporciona un análisis de tendencias que incluya:
-            1. Evolución temporal de la severidad de la depresión
-            2. Patrones identificados en los síntomas
-            3. Interpretación de la progresión del paciente
-            4. Recomendaciones para tratamiento futuro
-            5. Indicadores de mejora o empeoramiento
+        except Exception as e:
+            return f"Error al generar análisis de tendencias: {str(e)}"
+    
+    def stream_trends(self, patient_id, use_cache=True):
+        """
+        Variante en streaming de analyze_trends
+        
+        Yields:
+            str: Fragmentos del análisis de tendencias generado por Gemini
+        """
+        if not self.available:
+            yield "Servicio de análisis no disponible. Configure la API de Gemini."
+            return
+        
+        try:
+            paciente = get_document_or_raise(Paciente, patient_id)
+            valoraciones = load_trend_assessments(patient_id, paciente)
             
-            Responde en español y de manera profesional.
-            """
+            if not valoraciones:
+                yield "No hay valoraciones para este paciente."
+                return
             
-            # Generar análisis
-            response = self.model.generate_content(prompt)
-            return response.text
+            yield from self._stream(
+                self.build_trends_prompt(paciente, valoraciones),
+                use_cache=use_cache,
+                cache_tags=analysis_cache_tags(patient_id=paciente.id),
+                endpoint='trends'
+            )
             
         except Exception as e:
-            return f"Error al generar análisis de tendencias: {str(e)}"
+            yield f"Error al generar análisis de tendencias: {str(e)}"
+
+
+# Instancia compartida del servicio
+gemini_analysis_service = GeminiAnalysisService()
@@ -0,0 +1,43 @@
+"""
+Niveles de severidad de la depresión según el puntaje total PHQ-9
+"""
+
+# (clave, nombre, puntaje mínimo, puntaje máximo)
+SEVERITY_BANDS = [
+    ('minimo', "Mínimo", 0, 4),
+    ('leve', "Leve", 5, 9),
+    ('moderado', "Moderado", 10, 14),
+    ('moderadamente_severo', "Moderadamente severo", 15, 19),
+    ('severo', "Severo", 20, 27),
+]
+
+
+def get_severity_band(score):
+    """
+    Determina la clave de la banda de severidad (para agregados y claves de documentos)
+    
+    Returns:
+        str | None: Clave de la banda o None si el puntaje está fuera de rango
+    """
+    for key, _, minimum, maximum in SEVERITY_BANDS:
+        if minimum <= score <= maximum:
+            return key
+    return None
+
+
+def get_severity_level(score):
+    """
+    Determina el nivel de severidad basado en el puntaje PHQ-9
+    """
+    if score >= 0 and score <= 4:
+        return "Mínimo"
+    elif score >= 5 and score <= 9:
+        return "Leve"
+    elif score >= 10 and score <= 14:
+        return "Moderado"
+    elif score >= 15 and score <= 19:
+        return "Moderadamente severo"
+    elif score >= 20 and score <= 27:
+        return "Severo"
+    else:
+        return "Desconocido"
@@ -0,0 +1,69 @@
+"""
+Respuestas Server-Sent Events (SSE) para los análisis generados en streaming
+"""
+
+import json
+import logging
+
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import BaseRenderer
+
+logger = logging.getLogger(__name__)
+
+
+class EventStreamRenderer(BaseRenderer):
+    """
+    Permite a DRF negociar `Accept: text/event-stream` en las vistas de streaming
+    """
+    media_type = 'text/event-stream'
+    format = 'sse'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data, ensure_ascii=False)
+
+
+def sse_event(event, data):
+    """
+    Serializa un evento SSE con datos en JSON (los saltos de línea quedan escapados)
+    """
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def analysis_event_stream(metadata, chunks, error_message='Error al generar el análisis con Gemini AI'):
+    """
+    Emite los metadatos, los fragmentos del análisis y un evento final
+
+    Eventos: `meta` (datos del paciente/valoración), `chunk` ({"text": ...}),
+    `done` al terminar o `error` ({"message": ...}) si la generación falla.
+    """
+    yield sse_event('meta', metadata)
+
+    sent = False
+    try:
+        for chunk in chunks:
+            sent = True
+            yield sse_event('chunk', {'text': chunk})
+    except Exception as e:
+        logger.error(f"Error en el streaming del análisis: {e}")
+        yield sse_event('error', {'message': error_message})
+        return
+
+    if not sent:
+        yield sse_event('error', {'message': error_message})
+        return
+
+    yield sse_event('done', {})
+
+
+def sse_response(metadata, chunks, **kwargs):
+    """
+    Respuesta HTTP en streaming que desactiva el buffering de proxies intermedios
+    """
+    response = StreamingHttpResponse(
+        analysis_event_stream(metadata, chunks, **kwargs),
+        content_type='text/event-stream; charset=utf-8'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,206 @@
+"""
+Resumen de valoraciones por paciente (Paciente.resumen) mantenido en cada escritura
+"""
+
+import logging
+
+from mongoengine.queryset.visitor import Q
+from pymongo import UpdateOne
+
+from pacientes.models import Paciente, ResumenValoraciones
+from .models import PHQ9Assessment
+from .severity import get_severity_level
+from psybot.utils.identity_map import forget_document
+from psybot.utils.mongo import analytics_queryset
+
+logger = logging.getLogger(__name__)
+
+
+def load_trend_assessments(patient_id, paciente=None, fields=None):
+    """
+    Valoraciones del paciente en orden cronológico para el análisis de tendencias
+
+    Se leen por la conexión de analítica. Si la réplica todavía no tiene lo que
+    registra el resumen del paciente (leído del primario), se vuelven a leer
+    del primario para no analizar un historial incompleto.
+
+    Args:
+        patient_id: ID del paciente
+        paciente (Paciente): Paciente ya cargado, con su resumen
+        fields (list): Cargar solo estos campos (opcional)
+
+    Returns:
+        list: Valoraciones del paciente ordenadas por fecha
+    """
+    fields = ('id', *fields) if fields else ()
+    assessments = list(
+        analytics_queryset(PHQ9Assessment).filter(patient_id=patient_id).only(*fields).order_by('date_created')
+    )
+
+    resumen = paciente.resumen if paciente else None
+    if resumen and (
+        resumen.total_valoraciones != len(assessments) or
+        (resumen.total_valoraciones and resumen.ultima_valoracion_id not in {a.id for a in assessments})
+    ):
+        logger.info(f"Réplica atrasada para el paciente {patient_id}: tendencias leídas del primario")
+        assessments = list(PHQ9Assessment.objects(patient_id=patient_id).only(*fields).order_by('date_created'))
+    return assessments
+
+
+def apply_new_assessment(assessment):
+    """
+    Incorpora una valoración recién creada al resumen de su paciente
+
+    El caso habitual (la valoración es la más reciente) se resuelve con una
+    actualización atómica `$inc`/`$min`/`$max`/`$set`. Si llega una valoración
+    con fecha anterior a la última registrada, el resumen se recalcula.
+
+    Args:
+        assessment (PHQ9Assessment): Valoración ya guardada
+    """
+    score = assessment.total_score
+    date_created = assessment.date_created
+    # El paciente cargado en esta petición deja de reflejar su resumen
+    forget_document(Paciente, assessment.patient_id)
+
+    previous = Paciente.objects(
+        Q(id=assessment.patient_id) &
+        (Q(resumen__ultima_valoracion__lte=date_created) | Q(resumen__ultima_valoracion=None))
+    ).modify(
+        inc__resumen__total_valoraciones=1,
+        min__resumen__puntaje_minimo=score,
+        max__resumen__puntaje_maximo=score,
+        min__resumen__primera_valoracion=date_created,
+        set__resumen__ultimo_puntaje=score,
+        set__resumen__nivel_severidad=get_severity_level(score),
+        set__resumen__ultima_valoracion=date_created,
+        set__resumen__ultima_valoracion_id=assessment.id,
+    )
+
+    if previous is None or previous.resumen is None:
+        # Valoración fuera de orden, o primer resumen del paciente (que puede
+        # tener valoraciones anteriores a este resumen): recalcular
+        rebuild_patient_summary(assessment.patient_id)
+        return
+
+    # El puntaje anterior es el último antes de esta actualización, salvo que
+    # otra valoración más reciente se haya registrado mientras tanto
+    if previous.resumen.ultimo_puntaje is not None:
+        Paciente.objects(
+            id=assessment.patient_id, resumen__ultima_valoracion_id=assessment.id
+        ).update_one(set__resumen__puntaje_anterior=previous.resumen.ultimo_puntaje)
+
+
+def build_patient_summary(patient_id):
+    """
+    Calcula el resumen de un paciente a partir de sus valoraciones
+
+    Returns:
+        ResumenValoraciones | None: None si el paciente no tiene valoraciones
+    """
+    valoraciones = PHQ9Assessment.objects(patient_id=patient_id)
+
+    stats = list(valoraciones.aggregate([
+        {'$group': {
+            '_id': None,
+            'total': {'$sum': 1},
+            'minimo': {'$min': '$total_score'},
+            'maximo': {'$max': '$total_score'},
+            'primera': {'$min': '$date_created'},
+        }}
+    ]))
+    if not stats:
+        return None
+    stats = stats[0]
+
+    ultimas = list(
+        valoraciones.order_by('-date_created', '-id').only('id', 'total_score', 'date_created').limit(2)
+    )
+    ultima = ultimas[0]
+
+    return ResumenValoraciones(
+        total_valoraciones=stats['total'],
+        ultimo_puntaje=ultima.total_score,
+        puntaje_anterior=ultimas[1].total_score if len(ultimas) > 1 else None,
+        nivel_severidad=get_severity_level(ultima.total_score),
+        puntaje_minimo=stats['minimo'],
+        puntaje_maximo=stats['maximo'],
+        primera_valoracion=stats['primera'],
+        ultima_valoracion=ultima.date_created,
+        ultima_valoracion_id=ultima.id,
+    )
+
+
+def rebuild_patient_summary(patient_id):
+    """
+    Recalcula y guarda el resumen de un paciente (tras eliminar o modificar valoraciones)
+    """
+    resumen = build_patient_summary(patient_id)
+    forget_document(Paciente, patient_id)
+    if resumen is None:
+        Paciente.objects(id=patient_id).update_one(unset__resumen=True)
+    else:
+        Paciente.objects(id=patient_id).update_one(set__resumen=resumen)
+
+
+def rebuild_patient_summaries(patient_ids, chunk_size=1000):
+    """
+    Recalcula el resumen de muchos pacientes con una agregación por bloque (ingesta masiva)
+
+    Args:
+        patient_ids: IDs de los pacientes afectados (todos con al menos una valoración)
+        chunk_size (int): Pacientes por agregación y por escritura
+    """
+    patient_ids = list(patient_ids)
+    for start in range(0, len(patient_ids), chunk_size):
+        chunk = patient_ids[start:start + chunk_size]
+        rows = PHQ9Assessment._get_collection().aggregate([
+            {'$match': {'patient_id': {'$in': chunk}}},
+            {'$sort': {'patient_id': 1, 'date_created': -1, '_id': -1}},
+            {'$group': {
+                '_id': '$patient_id',
+                'total': {'$sum': 1},
+                'minimo': {'$min': '$total_score'},
+                'maximo': {'$max': '$total_score'},
+                'primera': {'$min': '$date_created'},
+                'ultimas': {'$push': {'id': '$_id', 'puntaje': '$total_score', 'fecha': '$date_created'}},
+            }},
+            {'$project': {
+                'total': 1, 'minimo': 1, 'maximo': 1, 'primera': 1,
+                'ultimas': {'$slice': ['$ultimas', 2]},
+            }},
+        ], allowDiskUse=True)
+
+        updates = []
+        for row in rows:
+            ultima = row['ultimas'][0]
+            resumen = ResumenValoraciones(
+                total_valoraciones=row['total'],
+                ultimo_puntaje=ultima['puntaje'],
+                puntaje_anterior=row['ultimas'][1]['puntaje'] if len(row['ultimas']) > 1 else None,
+                nivel_severidad=get_severity_level(ultima['puntaje']),
+                puntaje_minimo=row['minimo'],
+                puntaje_maximo=row['maximo'],
+                primera_valoracion=row['primera'],
+                ultima_valoracion=ultima['fecha'],
+                ultima_valoracion_id=ultima['id'],
+            )
+            updates.append(UpdateOne({'_id': row['_id']}, {'$set': {'resumen': resumen.to_mongo()}}))
+            forget_document(Paciente, row['_id'])
+
+        if updates:
+            Paciente._get_collection().bulk_write(updates, ordered=False)
+
+
+def rebuild_all_summaries():
+    """
+    Recalcula el resumen de todos los pacientes
+
+    Returns:
+        int: Número de pacientes procesados
+    """
+    total = 0
+    for patient_id in Paciente.objects.scalar('id'):
+        rebuild_patient_summary(patient_id)
+        total += 1
+    return total
@@ -0,0 +1,307 @@
+"""
+Resumen narrativo persistente del historial de valoraciones de cada paciente
+
+El análisis de tendencias envía a Gemini este resumen y solo las valoraciones
+posteriores a su marca de agua (a lo sumo TREND_SUMMARY_WINDOW), en lugar de
+todo el historial: el tamaño del prompt no crece con los años de seguimiento.
+
+- Al construirlo por primera vez, el historial se divide en ventanas de
+  TREND_SUMMARY_WINDOW valoraciones que se resumen por separado, y esos
+  resúmenes se combinan por grupos hasta quedar uno (compactación jerárquica).
+- Cuando las valoraciones nuevas superan la ventana, las más antiguas se
+  incorporan al resumen en una llamada con el resumen anterior y ese bloque.
+- Si el historial ya incorporado cambia (valoración editada, eliminada o con
+  fecha anterior a la marca de agua), el resumen se descarta y se reconstruye.
+
+Las peticiones HTTP solo hacen la actualización de una ventana; la
+construcción inicial (o varias ventanas atrasadas) se encarga a un trabajo
+'trend_summary' de la cola de análisis y, mientras tanto, el prompt recorta
+el detalle al presupuesto de tokens (fit_history).
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import logging
+
+from django.conf import settings
+from mongoengine import Document, StringField, DateTimeField, IntField, UUIDField
+from pymongo.errors import DuplicateKeyError
+
+from .models import AnalysisJob
+from .severity import get_severity_level
+from .summaries import load_trend_assessments
+from pacientes.models import Paciente
+from psybot.utils.gemini_cache import analysis_cache_tags
+from psybot.utils.gemini_client import gemini_client
+from psybot.utils.identity_map import get_document
+from psybot.utils.prompts import prompt_template, render_prompt
+
+logger = logging.getLogger(__name__)
+
+
+class TrendSummary(Document):
+    """
+    Resumen de las primeras `assessments_count` valoraciones de un paciente (hasta `watermark_id`)
+    """
+    patient_id = UUIDField(primary_key=True)
+    summary = StringField(required=True)
+    assessments_count = IntField(required=True)
+    watermark_id = UUIDField(required=True)
+    watermark_date = DateTimeField(required=True)
+    date_updated = DateTimeField(default=datetime.utcnow)
+
+    meta = {
+        'collection': 'trend_summaries'
+    }
+
+
+WINDOW_TEMPLATE = prompt_template("""
+    RESUMEN DE HISTORIAL PHQ-9 (valoraciones {first_date} a {last_date})
+
+    VALORACIONES:
+    {assessments}
+
+    {instructions}
+""")
+
+MERGE_TEMPLATE = prompt_template("""
+    COMBINACIÓN DE RESÚMENES PHQ-9 (períodos consecutivos, del más antiguo al más reciente)
+
+    {periods}
+
+    {instructions} Conserva la cronología de todos los períodos.
+""")
+
+FOLD_TEMPLATE = prompt_template("""
+    ACTUALIZACIÓN DE RESUMEN PHQ-9
+
+    RESUMEN ANTERIOR:
+    {summary}
+
+    VALORACIONES NUEVAS:
+    {assessments}
+
+    {instructions} Integra las valoraciones nuevas en el resumen anterior.
+""")
+
+
+def _window_text(assessments):
+    return "\n".join(
+        f"- {assessment.date_created.strftime('%Y-%m-%d')}: {assessment.total_score}/27 "
+        f"({get_severity_level(assessment.total_score)}), respuestas {list(assessment.responses)}"
+        for assessment in assessments
+    )
+
+
+def _summary_instructions():
+    return (
+        f"Redacta un resumen clínico narrativo de como máximo {settings.TREND_SUMMARY_MAX_WORDS} palabras: "
+        "evolución de la severidad, síntomas (ítems) persistentes o cambiantes, períodos de mejoría o "
+        "deterioro con sus fechas y cualquier respuesta positiva en el ítem 9. Solo hechos observados, "
+        "sin recomendaciones."
+    )
+
+
+def build_window_prompt(assessments):
+    """
+    Prompt para resumir un bloque de valoraciones consecutivas
+    """
+    return render_prompt(
+        WINDOW_TEMPLATE,
+        first_date=assessments[0].date_created.strftime('%Y-%m-%d'),
+        last_date=assessments[-1].date_created.strftime('%Y-%m-%d'),
+        assessments=_window_text(assessments),
+        instructions=_summary_instructions()
+    )
+
+
+def build_merge_prompt(summaries):
+    """
+    Prompt para combinar resúmenes de períodos consecutivos en uno solo
+    """
+    periods = "\n\n".join(f"PERÍODO {index}:\n{summary}" for index, summary in enumerate(summaries, 1))
+    return render_prompt(MERGE_TEMPLATE, periods=periods, instructions=_summary_instructions())
+
+
+def build_fold_prompt(summary, assessments):
+    """
+    Prompt para actualizar el resumen con las valoraciones posteriores a la marca de agua
+    """
+    return render_prompt(
+        FOLD_TEMPLATE,
+        summary=summary,
+        assessments=_window_text(assessments),
+        instructions=_summary_instructions()
+    )
+
+
+def _generate(prompt, patient_id):
+    summary = gemini_client.generate_text(
+        prompt,
+        cache_tags=analysis_cache_tags(patient_id=patient_id),
+        endpoint='trend_summary',
+        max_tokens=settings.TREND_SUMMARY_MAX_TOKENS
+    )
+    if not summary:
+        raise RuntimeError('Gemini no generó el resumen del historial')
+    return summary.strip()
+
+
+def _compact(assessments, patient_id, window):
+    """
+    Resumen de un historial completo: una llamada por ventana y combinación por grupos de `window`
+
+    Las llamadas de cada nivel son independientes y se hacen en paralelo
+    (a lo sumo TREND_SUMMARY_CONCURRENCY a la vez).
+    """
+    with ThreadPoolExecutor(max_workers=settings.TREND_SUMMARY_CONCURRENCY) as pool:
+        summaries = list(pool.map(
+            lambda start: _generate(build_window_prompt(assessments[start:start + window]), patient_id),
+            range(0, len(assessments), window)
+        ))
+        while len(summaries) > 1:
+            groups = [summaries[start:start + window] for start in range(0, len(summaries), window)]
+            summaries = list(pool.map(
+                lambda group: group[0] if len(group) == 1 else _generate(build_merge_prompt(group), patient_id),
+                groups
+            ))
+    return summaries[0]
+
+
+def _load_valid(patient_id, assessments):
+    """
+    Resumen guardado si el historial que incorpora no cambió (misma valoración en la marca de agua)
+    """
+    stored = TrendSummary.objects(patient_id=patient_id).first()
+    if stored is None:
+        return None
+    count = stored.assessments_count
+    if 0 < count <= len(assessments) and assessments[count - 1].id == stored.watermark_id:
+        return stored
+    logger.info(f"Historial modificado del paciente {patient_id}: se reconstruye el resumen de tendencias")
+    stored.delete()
+    return None
+
+
+def _store(patient_id, summary, assessments, previous_count):
+    """
+    Guarda el resumen si nadie más lo avanzó desde que se leyó (`previous_count`)
+    """
+    watermark = assessments[-1]
+    document = {
+        'summary': summary,
+        'assessments_count': len(assessments),
+        'watermark_id': watermark.id,
+        'watermark_date': watermark.date_created,
+        'date_updated': datetime.utcnow(),
+    }
+    collection = TrendSummary._get_collection()
+    try:
+        if previous_count is None:
+            collection.insert_one({'_id': patient_id, **document})
+        else:
+            collection.update_one({'_id': patient_id, 'assessments_count': previous_count}, {'$set': document})
+    except DuplicateKeyError:
+        # Otra petición construyó el resumen al mismo tiempo
+        pass
+
+
+def schedule_trend_summary(patient_id):
+    """
+    Encola la construcción del resumen del paciente si no hay ya un trabajo pendiente
+    """
+    from .jobs import enqueue_job
+
+    try:
+        if AnalysisJob.objects(
+            job_type='trend_summary',
+            params__patient_id=str(patient_id),
+            status__in=[AnalysisJob.STATUS_PENDING, AnalysisJob.STATUS_RUNNING]
+        ).first():
+            return
+        enqueue_job('trend_summary', {'patient_id': patient_id})
+    except Exception as e:
+        logger.warning(f"Error encolando el resumen de tendencias del paciente {patient_id}: {e}")
+
+
+def summarize_history(patient_id, assessments, defer=False):
+    """
+    Actualiza (si hace falta) y devuelve el resumen de las valoraciones más antiguas del paciente
+
+    Las valoraciones posteriores a la marca de agua se dejan para el detalle
+    del prompt mientras no superen TREND_SUMMARY_WINDOW; al superarlo, los
+    bloques más antiguos se incorporan al resumen. Si Gemini falla, se
+    conserva el resumen anterior y el detalle crece hasta el próximo intento.
+
+    Args:
+        patient_id: ID del paciente
+        assessments (list): Todas sus valoraciones en orden cronológico
+        defer (bool): Si la actualización requiere más de una llamada a Gemini
+            (construcción inicial o varias ventanas), encolarla en lugar de
+            hacerla aquí y devolver el resumen guardado (para las peticiones HTTP)
+
+    Returns:
+        tuple: (resumen o None, número de valoraciones que incorpora)
+    """
+    window = settings.TREND_SUMMARY_WINDOW
+    if not settings.TREND_SUMMARY_ENABLED or len(assessments) <= window:
+        return None, 0
+
+    stored = _load_valid(patient_id, assessments)
+    summary = stored.summary if stored else None
+    count = stored.assessments_count if stored else 0
+    previous_count = count if stored else None
+
+    # Valoraciones que se incorporan ahora: bloques completos, dejando entre 1 y `window` en el detalle
+    target = count + ((len(assessments) - count - 1) // window) * window
+    if target == count:
+        return summary, count
+
+    if defer and (summary is None or target - count > window):
+        schedule_trend_summary(patient_id)
+        return summary, count
+
+    try:
+        if summary is None:
+            summary = _compact(assessments[:target], patient_id, window)
+        else:
+            for start in range(count, target, window):
+                summary = _generate(build_fold_prompt(summary, assessments[start:start + window]), patient_id)
+    except Exception as e:
+        logger.warning(f"Error actualizando el resumen de tendencias del paciente {patient_id}: {e}")
+        return (stored.summary, stored.assessments_count) if stored else (None, 0)
+
+    _store(patient_id, summary, assessments[:target], previous_count)
+    return summary, target
+
+
+def build_trend_summary(patient_id):
+    """
+    Construye o pone al día el resumen de un paciente (trabajo 'trend_summary' de la cola)
+
+    Returns:
+        dict: Valoraciones del paciente y cuántas incorpora el resumen
+
+    Raises:
+        RuntimeError: Si Gemini falló y el resumen quedó atrasado (el trabajo se reintenta)
+    """
+    paciente = get_document(Paciente, patient_id)
+    assessments = load_trend_assessments(patient_id, paciente)
+    summary, summarized = summarize_history(paciente.id if paciente else patient_id, assessments)
+    if len(assessments) - summarized > settings.TREND_SUMMARY_WINDOW:
+        raise RuntimeError('No se pudo actualizar el resumen del historial')
+    return {
+        'status': 'success',
+        'assessments_count': len(assessments),
+        'assessments_summarized': summarized,
+    }
+
+
+def forget_trend_summary(patient_id):
+    """
+    Descarta el resumen de un paciente (valoración editada o eliminada)
+    """
+    try:
+        TrendSummary._get_collection().delete_one({'_id': patient_id})
+    except Exception as e:
+        logger.warning(f"Error descartando el resumen de tendencias del paciente {patient_id}: {e}")
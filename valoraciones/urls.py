@@ -1,6 +1,10 @@
 from rest_framework.routers import DefaultRouter
 from django.urls import path
-from .views import PHQ9AssessmentViewSet, analyze_phq9_with_gemini, analyze_multiple_phq9_trends
+from .views import (
+    PHQ9AssessmentViewSet, analyze_phq9_with_gemini, analyze_multiple_phq9_trends, analysis_job_status,
+    analyze_phq9_with_gemini_stream, analyze_multiple_phq9_trends_stream, analyze_phq9_batch_with_gemini,
+    bulk_create_assessments, export_assessments, patient_trend_metrics
+)
 
 router = DefaultRouter()
 router.register(r'assessments', PHQ9AssessmentViewSet, basename='phq9assessment')
@@ -8,7 +12,14 @@ router.register(r'assessments', PHQ9AssessmentViewSet, basename='phq9assessment'
 # Rutas específicas primero (antes del router)
 urlpatterns = [
     path('assessments/analyze/', analyze_phq9_with_gemini, name='analyze_phq9_with_gemini'),
+    path('assessments/analyze/batch/', analyze_phq9_batch_with_gemini, name='analyze_phq9_batch_with_gemini'),
+    path('assessments/bulk/', bulk_create_assessments, name='bulk_create_assessments'),
+    path('assessments/export/', export_assessments, name='export_assessments'),
     path('assessments/trends/', analyze_multiple_phq9_trends, name='analyze_multiple_phq9_trends'),
+    path('assessments/analyze/stream/', analyze_phq9_with_gemini_stream, name='analyze_phq9_with_gemini_stream'),
+    path('assessments/trends/stream/', analyze_multiple_phq9_trends_stream, name='analyze_multiple_phq9_trends_stream'),
+    path('analysis-jobs/<uuid:job_id>/', analysis_job_status, name='analysis_job_status'),
+    path('pacientes/<uuid:patient_id>/trend-metrics/', patient_trend_metrics, name='patient_trend_metrics'),
 ]
 
 # Luego las rutas del router
@@ -1,23 +1,77 @@
 from rest_framework_mongoengine.viewsets import ModelViewSet
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, renderer_classes, parser_classes
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework import status
-from .models import PHQ9Assessment
-from .serializers import PHQ9AssessmentSerializer, AnalyzeAssessmentSerializer, AnalyzeTrendsSerializer
-from drf_spectacular.utils import extend_schema, OpenApiParameter
+from django.urls import reverse
+from .models import PHQ9Assessment, AnalysisJob
+from .serializers import (
+    PHQ9AssessmentSerializer, AnalyzeAssessmentSerializer, AnalyzeTrendsSerializer, AnalyzeBatchSerializer,
+    AssessmentListFilterSerializer, AssessmentExportSerializer
+)
+from .analysis import (
+    AnalysisError,
+    analyze_assessment,
+    analyze_patient_trends,
+    analyze_assessments_batch,
+    stream_assessment_analysis,
+    stream_patient_trends,
+)
+from .analytics import metrics_from_assessments
+from .export import ASSESSMENT_EXPORT_FIELDS, iter_assessment_rows
+from .ingest import ingest_assessments
+from .jobs import enqueue_job, serialize_job
+from .streaming import EventStreamRenderer, sse_response
+from .summaries import load_trend_assessments
+from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiParameter
 from drf_spectacular.types import OpenApiTypes
-from psybot.utils.gemini_client import gemini_client
 from pacientes.models import Paciente
-from datetime import datetime
+from psybot.utils.gemini_cache import gemini_cache, analysis_cache_tags
+from psybot.utils.identity_map import get_document
+from psybot.lean import LeanListMixin
+from psybot.pagination import KeysetPagination
+from psybot.parsers import NDJSONParser
+from psybot.utils.export import export_response
+from psybot.utils.mongo import get_write_concern
+from django.conf import settings
 import logging
 
 logger = logging.getLogger(__name__)
 
-class PHQ9AssessmentViewSet(ModelViewSet):
+@extend_schema_view(list=extend_schema(parameters=[AssessmentListFilterSerializer]))
+class PHQ9AssessmentViewSet(LeanListMixin, ModelViewSet):
     serializer_class = PHQ9AssessmentSerializer
+    pagination_class = KeysetPagination
+    keyset_field = 'date_created'
+    # Write concern de cada acción (claves de MONGO_WRITE_CONCERNS)
+    write_concerns = {
+        'create': 'assessment_create',
+        'update': 'assessment_update',
+        'partial_update': 'assessment_update',
+    }
+    
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action in self.write_concerns:
+            context['write_concern'] = get_write_concern(self.write_concerns[self.action])
+        return context
     
     def get_queryset(self):
-        return PHQ9Assessment.objects.all()
+        queryset = PHQ9Assessment.objects.all()
+        if self.action != 'list':
+            return queryset
+        
+        # Filtros del listado (resueltos con los índices (patient_id,) date_created, _id)
+        filters = AssessmentListFilterSerializer(data=self.request.query_params)
+        filters.is_valid(raise_exception=True)
+        if 'patient_id' in filters.validated_data:
+            queryset = queryset.filter(patient_id=filters.validated_data['patient_id'])
+        if 'date_from' in filters.validated_data:
+            queryset = queryset.filter(date_created__gte=filters.validated_data['date_from'])
+        if 'date_to' in filters.validated_data:
+            queryset = queryset.filter(date_created__lte=filters.validated_data['date_to'])
+        return queryset
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -32,6 +86,19 @@ class PHQ9AssessmentViewSet(ModelViewSet):
                 )
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    def perform_update(self, serializer):
+        # Invalidar los análisis en caché de la valoración y de su paciente (anterior y actual)
+        previous_patient_id = serializer.instance.patient_id
+        instance = serializer.save()
+        gemini_cache.invalidate(
+            analysis_cache_tags(instance.id, previous_patient_id) +
+            analysis_cache_tags(patient_id=instance.patient_id)
+        )
+
+    def perform_destroy(self, instance):
+        gemini_cache.invalidate(analysis_cache_tags(instance.id, instance.patient_id))
+        instance.delete(**get_write_concern('assessment_delete'))
+
 
 @extend_schema(
     request=AnalyzeAssessmentSerializer,
@@ -79,53 +146,23 @@ def analyze_phq9_with_gemini(request):
             }, status=status.HTTP_400_BAD_REQUEST)
         
         assessment_id = serializer.validated_data['assessment_id']
+        use_cache = not serializer.validated_data['bypass_cache']
         
-        # Obtener la valoración PHQ-9
-        assessment = PHQ9Assessment.objects(id=assessment_id).first()
-        if not assessment:
-            return Response({
-                'status': 'error',
-                'message': 'La valoración PHQ-9 especificada no existe'
-            }, status=status.HTTP_404_NOT_FOUND)
-        
-        # Obtener información del paciente
-        paciente = Paciente.objects(id=assessment.patient_id).first()
-        if not paciente:
-            return Response({
-                'status': 'error',
-                'message': 'No se encontró la información del paciente'
-            }, status=status.HTTP_404_NOT_FOUND)
-        
-        # Calcular edad del paciente
-        edad = datetime.now().year - paciente.fecha_nacimiento.year
-        
-        # Generar prompt especializado para psicólogos clínicos
-        prompt = create_clinical_analysis_prompt(assessment, paciente, edad)
+        # Modo asíncrono: encolar el trabajo y responder de inmediato
+        if serializer.validated_data['run_async']:
+            job = enqueue_job('assessment_analysis', {
+                'assessment_id': assessment_id,
+                'use_cache': use_cache
+            })
+            return job_accepted_response(request, job)
         
-        # Llamar a Gemini AI
-        response = gemini_client.generate_text(prompt)
-        if not response:
-            return Response({
-                'status': 'error',
-                'message': 'Error al generar el análisis con Gemini AI'
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return Response(analyze_assessment(assessment_id, use_cache=use_cache), status=status.HTTP_200_OK)
         
+    except AnalysisError as e:
         return Response({
-            'status': 'success',
-            'patient_info': {
-                'nombre': f"{paciente.nombre} {paciente.apellido}",
-                'edad': edad,
-                'identificacion': paciente.identificacion
-            },
-            'assessment_info': {
-                'total_score': assessment.total_score,
-                'responses': assessment.responses,
-                'date_created': assessment.date_created.isoformat(),
-                'severity_level': get_severity_level(assessment.total_score)
-            },
-            'clinical_analysis': response
-        }, status=status.HTTP_200_OK)
-        
+            'status': 'error',
+            'message': e.message
+        }, status=e.status_code)
     except Exception as e:
         logger.error(f"Error en el análisis PHQ-9 con Gemini: {e}")
         return Response({
@@ -183,210 +220,380 @@ def analyze_multiple_phq9_trends(request):
             }, status=status.HTTP_400_BAD_REQUEST)
         
         patient_id = serializer.validated_data['patient_id']
+        use_cache = not serializer.validated_data['bypass_cache']
         
-        # Obtener todas las valoraciones del paciente
-        assessments = PHQ9Assessment.objects(patient_id=patient_id).order_by('date_created')
-        if not assessments:
-            return Response({
-                'status': 'error',
-                'message': 'No se encontraron valoraciones para este paciente'
-            }, status=status.HTTP_404_NOT_FOUND)
-        
-        # Obtener información del paciente
-        paciente = Paciente.objects(id=patient_id).first()
-        if not paciente:
-            return Response({
-                'status': 'error',
-                'message': 'No se encontró la información del paciente'
-            }, status=status.HTTP_404_NOT_FOUND)
+        # Modo asíncrono: encolar el trabajo y responder de inmediato
+        if serializer.validated_data['run_async']:
+            job = enqueue_job('trend_analysis', {
+                'patient_id': patient_id,
+                'use_cache': use_cache
+            })
+            return job_accepted_response(request, job)
         
-        # Generar prompt para análisis de tendencias
-        prompt = create_trend_analysis_prompt(assessments, paciente)
+        return Response(analyze_patient_trends(patient_id, use_cache=use_cache), status=status.HTTP_200_OK)
         
-        # Llamar a Gemini AI
-        response = gemini_client.generate_text(prompt)
-        if not response:
+    except AnalysisError as e:
+        return Response({
+            'status': 'error',
+            'message': e.message
+        }, status=e.status_code)
+    except Exception as e:
+        logger.error(f"Error en el análisis de tendencias PHQ-9: {e}")
+        return Response({
+            'status': 'error',
+            'message': f'Error interno: {str(e)}'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@extend_schema(
+    request=AnalyzeBatchSerializer,
+    responses={
+        200: {
+            'type': 'object',
+            'properties': {
+                'status': {'type': 'string'},
+                'total': {'type': 'integer'},
+                'succeeded': {'type': 'integer'},
+                'failed': {'type': 'integer'},
+                'results': {
+                    'type': 'array',
+                    'items': {
+                        'type': 'object',
+                        'properties': {
+                            'assessment_id': {'type': 'string'},
+                            'status': {'type': 'string'},
+                            'status_code': {'type': 'integer'},
+                            'message': {'type': 'string'},
+                            'patient_info': {'type': 'object'},
+                            'assessment_info': {'type': 'object'},
+                            'clinical_analysis': {'type': 'string'}
+                        }
+                    }
+                }
+            }
+        }
+    },
+    description="Analiza varias valoraciones PHQ-9 en paralelo (con límite de concurrencia) usando Gemini AI. "
+                "Los errores se informan por valoración sin interrumpir el resto del lote"
+)
+@api_view(['POST'])
+def analyze_phq9_batch_with_gemini(request):
+    """
+    Análisis por lotes de valoraciones PHQ-9 con paralelismo acotado
+    """
+    try:
+        serializer = AnalyzeBatchSerializer(data=request.data)
+        if not serializer.is_valid():
             return Response({
                 'status': 'error',
-                'message': 'Error al generar el análisis de tendencias con Gemini AI'
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-        
-        # Preparar datos de las valoraciones
-        assessment_data = []
-        for assessment in assessments:
-            assessment_data.append({
-                'id': str(assessment.id),
-                'total_score': assessment.total_score,
-                'date_created': assessment.date_created.isoformat(),
-                'severity_level': get_severity_level(assessment.total_score)
-            })
+                'message': 'Parámetros inválidos',
+                'errors': serializer.errors
+            }, status=status.HTTP_400_BAD_REQUEST)
         
-        return Response({
-            'status': 'success',
-            'patient_info': {
-                'nombre': f"{paciente.nombre} {paciente.apellido}",
-                'identificacion': paciente.identificacion
-            },
-            'assessments_count': len(assessments),
-            'assessments_data': assessment_data,
-            'trend_analysis': response
-        }, status=status.HTTP_200_OK)
+        result = analyze_assessments_batch(
+            serializer.validated_data['assessment_ids'],
+            concurrency=serializer.validated_data['concurrency'],
+            use_cache=not serializer.validated_data['bypass_cache']
+        )
+        return Response(result, status=status.HTTP_200_OK)
         
     except Exception as e:
-        logger.error(f"Error en el análisis de tendencias PHQ-9: {e}")
+        logger.error(f"Error en el análisis por lotes con Gemini: {e}")
         return Response({
             'status': 'error',
             'message': f'Error interno: {str(e)}'
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
-def create_clinical_analysis_prompt(assessment, paciente, edad):
+@extend_schema(
+    request={
+        'application/json': {
+            'type': 'array',
+            'items': {
+                'type': 'object',
+                'required': ['patient_id', 'responses'],
+                'properties': {
+                    'patient_id': {'type': 'string', 'format': 'uuid'},
+                    'responses': {'type': 'array', 'items': {'type': 'integer', 'minimum': 0, 'maximum': 3}},
+                    'date_created': {'type': 'string', 'format': 'date-time'}
+                }
+            }
+        },
+        'application/x-ndjson': {'type': 'string', 'description': 'Un objeto JSON por línea, con los mismos campos'}
+    },
+    responses={
+        201: {
+            'type': 'object',
+            'properties': {
+                'received': {'type': 'integer'},
+                'inserted': {'type': 'integer'},
+                'failed': {'type': 'integer'},
+                'ids': {'type': 'array', 'items': {'type': 'object'}},
+                'errors': {'type': 'array', 'items': {'type': 'object'}}
+            }
+        }
+    },
+    description="Crea muchas valoraciones PHQ-9 en una sola petición (arreglo JSON o NDJSON). "
+                "Las filas inválidas se informan por índice sin impedir que se inserten las demás"
+)
+@api_view(['POST'])
+@parser_classes([JSONParser, NDJSONParser])
+def bulk_create_assessments(request):
     """
-    Crea un prompt especializado para análisis clínico de PHQ-9
+    Ingesta masiva de valoraciones PHQ-9 con validación por lotes
     """
-    # Mapeo de preguntas PHQ-9
-    phq9_questions = [
-        "Poco interés o placer en hacer cosas",
-        "Sentirse decaído(a), deprimido(a) o sin esperanza",
-        "Dificultad para conciliar el sueño, o despertarse frecuentemente",
-        "Sentirse cansado(a) o con poca energía",
-        "Poco apetito o comer en exceso",
-        "Sentirse mal acerca de sí mismo(a) o sentir que es un fracaso",
-        "Dificultad para concentrarse en actividades",
-        "Moverse o hablar tan lento que otras personas lo han notado",
-        "Pensamientos de lastimarse o que estaría mejor muerto(a)"
-    ]
-    
-    # Crear desglose de respuestas
-    responses_breakdown = ""
-    for i, (question, response) in enumerate(zip(phq9_questions, assessment.responses), 1):
-        severity_text = ["Nunca", "Algunos días", "Más de la mitad de los días", "Casi todos los días"][response]
-        responses_breakdown += f"\n{i}. {question}: {response} ({severity_text})"
-    
-    prompt = f"""
-    ANÁLISIS CLÍNICO PHQ-9 PARA PROFESIONAL DE SALUD MENTAL
-    
-    INFORMACIÓN DEL PACIENTE:
-    - Nombre: {paciente.nombre} {paciente.apellido}
-    - Edad: {edad} años
-    - Fecha de evaluación: {assessment.date_created.strftime('%Y-%m-%d %H:%M')}
-    
-    RESULTADOS PHQ-9:
-    - Puntaje total: {assessment.total_score}/27
-    - Nivel de severidad: {get_severity_level(assessment.total_score)}
-    
-    DESGLOSE DE RESPUESTAS:{responses_breakdown}
-    
-    Como psicólogo clínico especializado, proporciona:
-    
-    1. INTERPRETACIÓN CLÍNICA:
-       - Análisis detallado del estado depresivo actual
-       - Identificación de síntomas predominantes
-       - Patrones de severidad por dominio sintomático
+    rows = request.data
+    if not isinstance(rows, list):
+        return Response({
+            'status': 'error',
+            'message': 'El cuerpo debe ser un arreglo JSON o NDJSON de valoraciones'
+        }, status=status.HTTP_400_BAD_REQUEST)
     
-    2. ÁREAS DE ATENCIÓN PRIORITARIA:
-       - Síntomas que requieren intervención inmediata
-       - Factores de riesgo identificados
-       - Elementos protectores presentes
+    if not rows or len(rows) > settings.ASSESSMENT_BULK_MAX_ITEMS:
+        return Response({
+            'status': 'error',
+            'message': f'El lote debe tener entre 1 y {settings.ASSESSMENT_BULK_MAX_ITEMS} valoraciones'
+        }, status=status.HTTP_400_BAD_REQUEST)
     
-    3. RECOMENDACIONES TERAPÉUTICAS:
-       - Modalidades de tratamiento sugeridas
-       - Frecuencia de sesiones recomendada
-       - Consideraciones para derivación a psiquiatría
+    try:
+        result = ingest_assessments(rows)
+    except Exception as e:
+        logger.error(f"Error en la ingesta masiva de valoraciones: {e}")
+        return Response({
+            'status': 'error',
+            'message': f'Error interno: {str(e)}'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
-    4. SEGUIMIENTO Y MONITOREO:
-       - Indicadores a vigilar en próximas sesiones
-       - Frecuencia de re-evaluación sugerida
-       - Señales de alerta para intervención de crisis
+    # 201 si se creó al menos una valoración; 400 si todas las filas fallaron
+    response_status = status.HTTP_201_CREATED if result['inserted'] else status.HTTP_400_BAD_REQUEST
+    return Response(result, status=response_status)
+
+
+@extend_schema(
+    responses={
+        200: {
+            'type': 'object',
+            'properties': {
+                'status': {'type': 'string'},
+                'patient_id': {'type': 'string'},
+                'trend_metrics': {
+                    'type': 'object',
+                    'properties': {
+                        'assessments_count': {'type': 'integer'},
+                        'first_date': {'type': 'string'},
+                        'last_date': {'type': 'string'},
+                        'weeks': {'type': 'number'},
+                        'first_score': {'type': 'integer'},
+                        'last_score': {'type': 'integer'},
+                        'change': {'type': 'integer'},
+                        'percent_change': {'type': 'number', 'nullable': True},
+                        'slope_per_week': {'type': 'number', 'nullable': True},
+                        'rolling_mean': {'type': 'array', 'items': {'type': 'number'}},
+                        'reliable_change_index': {'type': 'number'},
+                        'reliable_improvement': {'type': 'boolean'},
+                        'reliable_deterioration': {'type': 'boolean'},
+                        'response': {'type': 'boolean'},
+                        'remission': {'type': 'boolean'},
+                        'items': {'type': 'array', 'items': {'type': 'object'}},
+                        'change_points': {'type': 'array', 'items': {'type': 'object'}}
+                    }
+                }
+            }
+        }
+    },
+    description="Métricas longitudinales PHQ-9 del paciente calculadas localmente (pendiente semanal, media "
+                "móvil, índice de cambio confiable, respuesta, remisión, trayectoria por ítem y puntos de cambio), "
+                "sin llamar a Gemini AI"
+)
+@api_view(['GET'])
+def patient_trend_metrics(request, patient_id):
+    """
+    Métricas de tendencia de las valoraciones PHQ-9 de un paciente
+    """
+    paciente = get_document(Paciente, patient_id)
+    if not paciente:
+        return Response({
+            'status': 'error',
+            'message': 'El paciente especificado no existe'
+        }, status=status.HTTP_404_NOT_FOUND)
     
-    5. CONSIDERACIONES ADICIONALES:
-       - Aspectos psicoeducativos relevantes
-       - Recursos de apoyo recomendados
-       - Estrategias de autocuidado apropiadas
+    assessments = load_trend_assessments(patient_id, paciente, fields=['responses', 'date_created'])
+    if not assessments:
+        return Response({
+            'status': 'error',
+            'message': 'No se encontraron valoraciones para este paciente'
+        }, status=status.HTTP_404_NOT_FOUND)
     
-    Por favor, proporciona un análisis profesional, basado en evidencia y orientado a la práctica clínica.
+    return Response({
+        'status': 'success',
+        'patient_id': str(patient_id),
+        'trend_metrics': metrics_from_assessments(assessments)
+    }, status=status.HTTP_200_OK)
+
+
+@extend_schema(
+    parameters=[AssessmentExportSerializer],
+    responses={200: {'type': 'string', 'format': 'binary', 'description': 'Archivo NDJSON o CSV (gzip opcional)'}},
+    description="Exporta en streaming las valoraciones PHQ-9 con los datos del paciente. La descarga se genera "
+                "por lotes, sin construir la respuesta completa en memoria"
+)
+@api_view(['GET'])
+def export_assessments(request):
+    """
+    Exportación de valoraciones PHQ-9 (NDJSON o CSV)
     """
+    serializer = AssessmentExportSerializer(data=request.query_params)
+    if not serializer.is_valid():
+        return Response({
+            'status': 'error',
+            'message': 'Parámetros inválidos',
+            'errors': serializer.errors
+        }, status=status.HTTP_400_BAD_REQUEST)
     
-    return prompt
+    params = serializer.validated_data
+    rows = iter_assessment_rows(
+        date_from=params.get('date_from'),
+        date_to=params.get('date_to'),
+        severity=params.get('severity'),
+        patient_id=params.get('patient_id')
+    )
+    return export_response(rows, params['output'], ASSESSMENT_EXPORT_FIELDS, 'valoraciones', compress=params['compress'])
 
 
-def create_trend_analysis_prompt(assessments, paciente):
+@extend_schema(
+    request=AnalyzeAssessmentSerializer,
+    responses={200: {'type': 'string', 'description': 'Eventos SSE: meta, chunk, done | error'}},
+    description="Variante en streaming (Server-Sent Events) del análisis clínico de una valoración PHQ-9"
+)
+@api_view(['POST'])
+@renderer_classes([JSONRenderer, EventStreamRenderer])
+def analyze_phq9_with_gemini_stream(request):
     """
-    Crea un prompt para análisis de tendencias en múltiples valoraciones PHQ-9
+    Análisis de resultados PHQ-9 entregado por fragmentos a medida que Gemini los genera
     """
-    # Preparar datos de tendencias
-    scores_timeline = []
-    for assessment in assessments:
-        scores_timeline.append({
-            'fecha': assessment.date_created.strftime('%Y-%m-%d'),
-            'puntaje': assessment.total_score,
-            'nivel': get_severity_level(assessment.total_score)
-        })
-    
-    timeline_text = "\n".join([
-        f"- {item['fecha']}: {item['puntaje']}/27 ({item['nivel']})"
-        for item in scores_timeline
-    ])
-    
-    # Convertir a lista para poder usar índices negativos
-    assessments_list = list(assessments)
-    
-    prompt = f"""
-    ANÁLISIS DE TENDENCIAS PHQ-9 - EVOLUCIÓN CLÍNICA
-    
-    PACIENTE: {paciente.nombre} {paciente.apellido}
-    NÚMERO DE EVALUACIONES: {len(assessments_list)}
-    PERÍODO: {assessments_list[0].date_created.strftime('%Y-%m-%d')} a {assessments_list[-1].date_created.strftime('%Y-%m-%d')}
-    
-    EVOLUCIÓN DE PUNTAJES:
-    {timeline_text}
-    
-    Como psicólogo clínico especializado, analiza la evolución del paciente y proporciona:
-    
-    1. ANÁLISIS DE TENDENCIAS:
-       - Patrón de evolución (mejora, empeoramiento, estabilidad)
-       - Velocidad de cambio observada
-       - Fluctuaciones significativas identificadas
-    
-    2. INTERPRETACIÓN CLÍNICA:
-       - Posible respuesta al tratamiento actual
-       - Identificación de períodos críticos
-       - Factores que pueden influir en los cambios
-    
-    3. PRONÓSTICO:
-       - Expectativas realistas de evolución
-       - Factores que favorecen o dificultan la recuperación
-       - Tiempo estimado para objetivos terapéuticos
-    
-    4. AJUSTES TERAPÉUTICOS RECOMENDADOS:
-       - Modificaciones en el plan de tratamiento
-       - Intensidad de intervención sugerida
-       - Modalidades adicionales a considerar
-    
-    5. SEGUIMIENTO:
-       - Frecuencia óptima de re-evaluación
-       - Indicadores clave a monitorear
-       - Criterios para ajustar el tratamiento
-    
-    Proporciona un análisis longitudinal profesional basado en la evolución observada.
+    try:
+        # Validar parámetros de entrada
+        serializer = AnalyzeAssessmentSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response({
+                'status': 'error',
+                'message': 'Parámetros inválidos',
+                'errors': serializer.errors
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        metadata, chunks = stream_assessment_analysis(
+            serializer.validated_data['assessment_id'],
+            use_cache=not serializer.validated_data['bypass_cache']
+        )
+        return sse_response(metadata, chunks)
+        
+    except AnalysisError as e:
+        return Response({
+            'status': 'error',
+            'message': e.message
+        }, status=e.status_code)
+    except Exception as e:
+        logger.error(f"Error en el análisis PHQ-9 con Gemini (streaming): {e}")
+        return Response({
+            'status': 'error',
+            'message': f'Error interno: {str(e)}'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@extend_schema(
+    request=AnalyzeTrendsSerializer,
+    responses={200: {'type': 'string', 'description': 'Eventos SSE: meta, chunk, done | error'}},
+    description="Variante en streaming (Server-Sent Events) del análisis de tendencias PHQ-9"
+)
+@api_view(['POST'])
+@renderer_classes([JSONRenderer, EventStreamRenderer])
+def analyze_multiple_phq9_trends_stream(request):
     """
-    
-    return prompt
+    Análisis de tendencias PHQ-9 entregado por fragmentos a medida que Gemini los genera
+    """
+    try:
+        # Validar parámetros de entrada
+        serializer = AnalyzeTrendsSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response({
+                'status': 'error',
+                'message': 'Parámetros inválidos',
+                'errors': serializer.errors
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        metadata, chunks = stream_patient_trends(
+            serializer.validated_data['patient_id'],
+            use_cache=not serializer.validated_data['bypass_cache']
+        )
+        return sse_response(
+            metadata, chunks,
+            error_message='Error al generar el análisis de tendencias con Gemini AI'
+        )
+        
+    except AnalysisError as e:
+        return Response({
+            'status': 'error',
+            'message': e.message
+        }, status=e.status_code)
+    except Exception as e:
+        logger.error(f"Error en el análisis de tendencias PHQ-9 (streaming): {e}")
+        return Response({
+            'status': 'error',
+            'message': f'Error interno: {str(e)}'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+def job_accepted_response(request, job):
+    """
+    Respuesta 202 con el identificador del trabajo encolado
+    """
+    return Response({
+        'status': 'accepted',
+        'job_id': str(job.id),
+        'job_status': job.status,
+        'status_url': request.build_absolute_uri(reverse('analysis_job_status', args=[job.id]))
+    }, status=status.HTTP_202_ACCEPTED)
 
 
-def get_severity_level(score):
+@extend_schema(
+    responses={
+        200: {
+            'type': 'object',
+            'properties': {
+                'status': {'type': 'string'},
+                'job': {
+                    'type': 'object',
+                    'properties': {
+                        'id': {'type': 'string'},
+                        'job_type': {'type': 'string'},
+                        'status': {'type': 'string'},
+                        'attempts': {'type': 'integer'},
+                        'max_attempts': {'type': 'integer'},
+                        'result': {'type': 'object'},
+                        'error': {'type': 'string'},
+                        'date_created': {'type': 'string'},
+                        'date_started': {'type': 'string'},
+                        'date_finished': {'type': 'string'}
+                    }
+                }
+            }
+        }
+    },
+    description="Consulta el estado y el resultado de un trabajo de análisis asíncrono"
+)
+@api_view(['GET'])
+def analysis_job_status(request, job_id):
     """
-    Determina el nivel de severidad basado en el puntaje PHQ-9
+    Estado de un trabajo de análisis encolado con `run_async`
     """
-    if score >= 0 and score <= 4:
-        return "Mínimo"
-    elif score >= 5 and score <= 9:
-        return "Leve"
-    elif score >= 10 and score <= 14:
-        return "Moderado"
-    elif score >= 15 and score <= 19:
-        return "Moderadamente severo"
-    elif score >= 20 and score <= 27:
-        return "Severo"
-    else:
-        return "Desconocido"
+    job = AnalysisJob.objects(id=job_id).first()
+    if not job:
+        return Response({
+            'status': 'error',
+            'message': 'El trabajo de análisis especificado no existe'
+        }, status=status.HTTP_404_NOT_FOUND)
+    
+    return Response({
+        'status': 'success',
+        'job': serialize_job(job)
+    }, status=status.HTTP_200_OK)
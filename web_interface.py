@@ -2,6 +2,9 @@
 Vistas para la interfaz web de PsyBot
 """
 
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.utils.functional import cached_property
 from django.shortcuts import render, redirect
 from django.contrib import messages
 from django.http import JsonResponse
@@ -9,21 +12,26 @@ from django.views.generic import View
 from datetime import datetime, date
 from pacientes.models import Paciente
 from valoraciones.models import PHQ9Assessment
-from valoraciones.services import GeminiAnalysisService
+from valoraciones.analysis import (
+    AnalysisError,
+    analyze_assessment_web,
+    analyze_patient_trends_web,
+    stream_assessment_web,
+    stream_patient_trends_web,
+)
+from valoraciones.streaming import sse_response
+from valoraciones.jobs import enqueue_job
+from valoraciones.rollups import get_dashboard_stats
+from psybot.utils.identity_map import get_document
+from psybot.utils.mongo import get_write_concern
 
 
 class DashboardView(View):
     """Vista principal del dashboard"""
     
     def get(self, request):
-        # Obtener estadísticas básicas
-        total_pacientes = Paciente.objects.count()
-        total_valoraciones = PHQ9Assessment.objects.count()
-        
-        context = {
-            'total_pacientes': total_pacientes,
-            'total_valoraciones': total_valoraciones,
-        }
+        # Obtener estadísticas desde los rollups diarios (sin recorrer las colecciones)
+        context = get_dashboard_stats()
         return render(request, 'dashboard.html', context)
 
 
@@ -31,8 +39,11 @@ class PacientesView(View):
     """Vista para gestión de pacientes"""
     
     def get(self, request):
-        # Obtener lista de pacientes (sin paginación por ahora para simplificar)
-        pacientes = Paciente.objects.order_by('-fecha_creacion')
+        # Obtener lista de pacientes (sin paginación por ahora para simplificar); la
+        # plantilla solo lee campos, así que se usan los documentos crudos
+        pacientes = Paciente.objects.order_by('-fecha_creacion').only(
+            'nombre', 'apellido', 'identificacion', 'fecha_nacimiento', 'fecha_creacion', 'resumen'
+        ).as_pymongo()
         
         context = {
             'pacientes': pacientes,
@@ -69,47 +80,86 @@ class PacientesView(View):
             return redirect('pacientes')
 
 
+class QuerySetPaginator(Paginator):
+    """
+    Paginator para querysets de mongoengine
+    
+    Django solo usa `count()` si el método no recibe argumentos; el de
+    mongoengine recibe `with_limit_and_skip`, así que Paginator recurriría a
+    len() y cargaría toda la colección. Aquí el total se cuenta en el
+    servidor y cada página se lee con skip/limit.
+    """
+    
+    @cached_property
+    def count(self):
+        return self.object_list.count()
+
+
+def obtener_pagina(request, queryset):
+    """
+    Pagina un queryset según los parámetros `page` y `per_page` de la petición
+    
+    Returns:
+        Page: La página solicitada (la última si `page` excede el total)
+    """
+    try:
+        per_page = int(request.GET.get('per_page', settings.WEB_PAGE_SIZE))
+    except ValueError:
+        per_page = settings.WEB_PAGE_SIZE
+    per_page = max(1, min(per_page, settings.WEB_MAX_PAGE_SIZE))
+    
+    return QuerySetPaginator(queryset, per_page).get_page(request.GET.get('page'))
+
+
+def enriquecer_valoraciones(valoraciones):
+    """
+    Agrega el nombre y la identificación del paciente a cada valoración
+    
+    Los pacientes se obtienen con una sola consulta `$in` sobre los IDs
+    distintos, proyectando solo los campos que muestra la plantilla.
+    
+    Args:
+        valoraciones: Valoraciones PHQ-9 (una página, no la colección completa)
+        
+    Returns:
+        list: Diccionarios con los datos de la valoración y del paciente
+    """
+    valoraciones = list(valoraciones)
+    pacientes = {
+        paciente.id: paciente
+        for paciente in Paciente.objects(
+            id__in=list({valoracion.patient_id for valoracion in valoraciones})
+        ).only('id', 'nombre', 'apellido', 'identificacion')
+    }
+    
+    valoraciones_enriched = []
+    for valoracion in valoraciones:
+        paciente = pacientes.get(valoracion.patient_id)
+        valoraciones_enriched.append({
+            'id': valoracion.id,
+            'patient_id': valoracion.patient_id,
+            'total_score': valoracion.total_score,
+            'date_created': valoracion.date_created,
+            # Si el paciente no existe, mostramos la valoración con datos básicos
+            'paciente_nombre': f"{paciente.nombre} {paciente.apellido}" if paciente else 'Paciente no encontrado',
+            'paciente_identificacion': paciente.identificacion if paciente else 'N/A'
+        })
+    return valoraciones_enriched
+
+
 class ValoracionesView(View):
     """Vista para gestión de valoraciones"""
     
     def get(self, request):
-        # Obtener lista de valoraciones (sin paginación por ahora para simplificar)
-        valoraciones_raw = PHQ9Assessment.objects.order_by('-date_created')
-        
-        # Enriquecer valoraciones con información del paciente
-        valoraciones_enriched = []
-        for valoracion in valoraciones_raw:
-            try:
-                paciente = Paciente.objects.get(id=valoracion.patient_id)
-                valoracion_data = {
-                    'id': valoracion.id,
-                    'patient_id': valoracion.patient_id,
-                    'total_score': valoracion.total_score,
-                    'date_created': valoracion.date_created,
-                    'responses': valoracion.responses,
-                    'paciente_nombre': f"{paciente.nombre} {paciente.apellido}",
-                    'paciente_identificacion': paciente.identificacion
-                }
-                valoraciones_enriched.append(valoracion_data)
-            except Paciente.DoesNotExist:
-                # Si el paciente no existe, mostramos la valoración con datos básicos
-                valoracion_data = {
-                    'id': valoracion.id,
-                    'patient_id': valoracion.patient_id,
-                    'total_score': valoracion.total_score,
-                    'date_created': valoracion.date_created,
-                    'responses': valoracion.responses,
-                    'paciente_nombre': 'Paciente no encontrado',
-                    'paciente_identificacion': 'N/A'
-                }
-                valoraciones_enriched.append(valoracion_data)
-        
-        # Obtener lista de pacientes para el formulario
-        pacientes = Paciente.objects.order_by('nombre')
+        # Obtener una página de valoraciones (solo los campos que usa la tabla)
+        valoraciones_raw = PHQ9Assessment.objects.only(
+            'id', 'patient_id', 'total_score', 'date_created'
+        ).order_by('-date_created')
+        page_obj = obtener_pagina(request, valoraciones_raw)
         
         context = {
-            'valoraciones': valoraciones_enriched,
-            'pacientes': pacientes,
+            'valoraciones': enriquecer_valoraciones(page_obj),
+            'page_obj': page_obj,
         }
         return render(request, 'valoraciones.html', context)
     
@@ -132,9 +182,8 @@ class ValoracionesView(View):
                 messages.error(request, 'Debe seleccionar un paciente.')
                 return redirect('valoraciones')
             
-            try:
-                paciente = Paciente.objects.get(id=patient_id)
-            except Paciente.DoesNotExist:
+            paciente = get_document(Paciente, patient_id)
+            if not paciente:
                 messages.error(request, 'Paciente no encontrado.')
                 return redirect('valoraciones')
             
@@ -143,7 +192,7 @@ class ValoracionesView(View):
                 patient_id=patient_id,
                 responses=respuestas
             )
-            valoracion.save()
+            valoracion.save(write_concern=get_write_concern('assessment_create'))
             
             messages.success(request, f'Valoración PHQ-9 creada exitosamente para {paciente.nombre} {paciente.apellido}.')
             return redirect('valoraciones')
@@ -157,17 +206,8 @@ class AnalisisView(View):
     """Vista para análisis de valoraciones"""
     
     def get(self, request):
-        # Obtener lista de pacientes que tienen valoraciones
-        # MongoEngine no soporta values_list con flat=True, usamos una aproximación diferente
-        valoraciones_ids = [v.patient_id for v in PHQ9Assessment.objects.only('patient_id')]
-        pacientes_con_valoraciones = Paciente.objects.filter(
-            id__in=list(set(valoraciones_ids))
-        ).order_by('nombre')
-        
-        context = {
-            'pacientes': pacientes_con_valoraciones,
-        }
-        return render(request, 'analisis.html', context)
+        # Los pacientes se eligen con búsqueda incremental (GET /api/pacientes/search/)
+        return render(request, 'analisis.html')
 
 
 class AnalisisIndividualView(View):
@@ -180,31 +220,20 @@ class AnalisisIndividualView(View):
             if not valoracion_id:
                 return JsonResponse({'error': 'ID de valoración requerido'}, status=400)
             
-            # Obtener valoración
-            try:
-                valoracion = PHQ9Assessment.objects.get(id=valoracion_id)
-                paciente = Paciente.objects.get(id=valoracion.patient_id)
-            except PHQ9Assessment.DoesNotExist:
-                return JsonResponse({'error': 'Valoración no encontrada'}, status=404)
-            except Paciente.DoesNotExist:
-                return JsonResponse({'error': 'Paciente no encontrado'}, status=404)
+            use_cache = not request.POST.get('bypass_cache')
             
-            # Generar análisis con Gemini
-            service = GeminiAnalysisService()
-            analisis = service.analyze_single_assessment(str(valoracion.id))
+            # Modo asíncrono: encolar y devolver el ID del trabajo
+            if request.POST.get('run_async'):
+                job = enqueue_job('web_assessment_analysis', {
+                    'valoracion_id': valoracion_id,
+                    'use_cache': use_cache
+                })
+                return JsonResponse({'success': True, 'job_id': str(job.id), 'job_status': job.status}, status=202)
             
-            return JsonResponse({
-                'success': True,
-                'paciente': f'{paciente.nombre} {paciente.apellido}',
-                'valoracion': {
-                    'id': str(valoracion.id),
-                    'fecha': valoracion.date_created.strftime('%d/%m/%Y'),
-                    'total_score': valoracion.total_score,
-                    'responses': valoracion.responses
-                },
-                'analisis': analisis
-            })
+            return JsonResponse(analyze_assessment_web(valoracion_id, use_cache=use_cache))
             
+        except AnalysisError as e:
+            return JsonResponse({'error': e.message}, status=e.status_code)
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=500)
 
@@ -219,29 +248,64 @@ class AnalisisTendenciasView(View):
             if not patient_id:
                 return JsonResponse({'error': 'ID de paciente requerido'}, status=400)
             
-            # Obtener paciente
-            try:
-                paciente = Paciente.objects.get(id=patient_id)
-            except Paciente.DoesNotExist:
-                return JsonResponse({'error': 'Paciente no encontrado'}, status=404)
+            use_cache = not request.POST.get('bypass_cache')
             
-            # Obtener valoraciones del paciente
-            valoraciones = PHQ9Assessment.objects.filter(patient_id=patient_id).order_by('date_created')
+            # Modo asíncrono: encolar y devolver el ID del trabajo
+            if request.POST.get('run_async'):
+                job = enqueue_job('web_trend_analysis', {
+                    'patient_id': patient_id,
+                    'use_cache': use_cache
+                })
+                return JsonResponse({'success': True, 'job_id': str(job.id), 'job_status': job.status}, status=202)
             
-            if not valoraciones.count():
-                return JsonResponse({'error': 'No hay valoraciones para este paciente'}, status=400)
+            return JsonResponse(analyze_patient_trends_web(patient_id, use_cache=use_cache))
             
-            # Generar análisis de tendencias con Gemini
-            service = GeminiAnalysisService()
-            analisis = service.analyze_trends(patient_id)
+        except AnalysisError as e:
+            return JsonResponse({'error': e.message}, status=e.status_code)
+        except Exception as e:
+            return JsonResponse({'error': str(e)}, status=500)
+
+
+class AnalisisIndividualStreamView(View):
+    """Vista para análisis individual entregado en streaming (Server-Sent Events)"""
+    
+    def post(self, request):
+        try:
+            valoracion_id = request.POST.get('valoracion_id')
+            
+            if not valoracion_id:
+                return JsonResponse({'error': 'ID de valoración requerido'}, status=400)
+            
+            metadata, chunks = stream_assessment_web(
+                valoracion_id,
+                use_cache=not request.POST.get('bypass_cache')
+            )
+            return sse_response(metadata, chunks)
             
-            return JsonResponse({
-                'success': True,
-                'paciente': f'{paciente.nombre} {paciente.apellido}',
-                'total_valoraciones': valoraciones.count(),
-                'analisis': analisis
-            })
+        except AnalysisError as e:
+            return JsonResponse({'error': e.message}, status=e.status_code)
+        except Exception as e:
+            return JsonResponse({'error': str(e)}, status=500)
+
+
+class AnalisisTendenciasStreamView(View):
+    """Vista para análisis de tendencias entregado en streaming (Server-Sent Events)"""
+    
+    def post(self, request):
+        try:
+            patient_id = request.POST.get('patient_id')
+            
+            if not patient_id:
+                return JsonResponse({'error': 'ID de paciente requerido'}, status=400)
+            
+            metadata, chunks = stream_patient_trends_web(
+                patient_id,
+                use_cache=not request.POST.get('bypass_cache')
+            )
+            return sse_response(metadata, chunks)
             
+        except AnalysisError as e:
+            return JsonResponse({'error': e.message}, status=e.status_code)
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=500)
 
@@ -252,15 +316,18 @@ class ValoracionesPacienteView(View):
     def get(self, request, patient_id):
         try:
             # Obtener valoraciones del paciente
-            valoraciones = PHQ9Assessment.objects.filter(patient_id=patient_id).order_by('-date_created')
+            valoraciones = PHQ9Assessment.objects.filter(patient_id=patient_id).order_by('-date_created').only(
+                'id', 'date_created', 'total_score', 'responses'
+            ).as_pymongo()
             
+            # Documentos crudos: sin instanciar PHQ9Assessment por fila
             data = []
             for valoracion in valoraciones:
                 data.append({
-                    'id': str(valoracion.id),
-                    'fecha': valoracion.date_created.strftime('%d/%m/%Y'),
-                    'total_score': valoracion.total_score,
-                    'responses': valoracion.responses
+                    'id': str(valoracion['_id']),
+                    'fecha': valoracion['date_created'].strftime('%d/%m/%Y'),
+                    'total_score': valoracion.get('total_score'),
+                    'responses': valoracion.get('responses', [])
                 })
             
             return JsonResponse({'valoraciones': data})
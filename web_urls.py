@@ -19,6 +19,8 @@ urlpatterns = [
     path('analisis/', web_interface.AnalisisView.as_view(), name='analisis'),
     path('analisis/individual/', web_interface.AnalisisIndividualView.as_view(), name='analisis_individual'),
     path('analisis/tendencias/', web_interface.AnalisisTendenciasView.as_view(), name='analisis_tendencias'),
+    path('analisis/individual/stream/', web_interface.AnalisisIndividualStreamView.as_view(), name='analisis_individual_stream'),
+    path('analisis/tendencias/stream/', web_interface.AnalisisTendenciasStreamView.as_view(), name='analisis_tendencias_stream'),
     
     # API para obtener valoraciones de un paciente
     path('api/valoraciones-paciente/<str:patient_id>/', web_interface.ValoracionesPacienteView.as_view(), name='valoraciones_paciente'),